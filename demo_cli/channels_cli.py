@@ -6,6 +6,10 @@ from pprint import pprint
 from stxsdk import StxChannelClient
 from stxsdk.config.channels import CHANNELS
 
+from trading_bot.frame_queue import BLOCK, POLICIES, FramePipeline
+from trading_bot.instrumentation import METRICS, install_stats_signal, setup_logging
+from trading_bot.multiplexer import ChannelMultiplexer
+
 logger = logging.getLogger(__file__)
 
 CHANNEL_NAMES = list(CHANNELS)
@@ -29,7 +33,50 @@ async def on_open(message):
 async def on_message(message):
     # message passed by the listener of the async client when server send the message
     # you can perform any post operation on this event
-    print(message["data"][4])
+    # the message is formatted and written by the logging thread, so a large payload
+    # doesn't delay reading the next messages from the channel
+    logger.info("%s", message["data"][4])
+
+
+async def on_channel_message(channel, message):
+    # message passed by the multiplexer when any of the joined channels send the message
+    logger.info("%s: %s", channel, message["data"][4])
+
+
+async def report_rates(multiplexer, interval):
+    # logging the frame rates and the waiting messages of each channel every interval seconds
+    previous = {}
+    while True:
+        await asyncio.sleep(interval)
+        counters = METRICS.summary()["counters"]
+        depths, drops = multiplexer.depths(), multiplexer.drops()
+        for channel in multiplexer.channels:
+            count = counters.get(f"frames.{channel}.received", {}).get("count", 0)
+            logger.info(
+                "%s: %.2f frames/s, %d waiting, %d dropped",
+                channel,
+                (count - previous.get(channel, 0)) / interval,
+                depths.get(channel, 0),
+                drops.get(channel, 0),
+            )
+            previous[channel] = count
+
+
+async def multiplex(channels, args):
+    # all the channels are joined in the same event loop with the same authenticated client
+    multiplexer = ChannelMultiplexer(
+        CHANNEL_CLIENT,
+        {channel: on_channel_message for channel in channels},
+        queue_size=args.queue_size,
+        policy=args.policy,
+        workers=args.workers,
+        reconnect=args.reconnect,
+    )
+    reporter = asyncio.create_task(report_rates(multiplexer, args.stats_interval))
+    try:
+        await multiplexer.run()
+    finally:
+        reporter.cancel()
 
 
 async def default(message):
@@ -46,10 +93,41 @@ def get_arguments():
     parser.add_argument(
         "--channel",
         type=str,
-        help="Channel Name",
+        help="Channel Name, more than one channel names can be passed to join them together",
         required=True,
+        nargs="+",
         choices=CHANNEL_NAMES,
     )
+    parser.add_argument(
+        "--queue-size",
+        type=int,
+        default=1000,
+        help="Maximum number of the messages waiting for the consumer per channel",
+    )
+    parser.add_argument(
+        "--policy",
+        type=str,
+        default=BLOCK,
+        choices=POLICIES,
+        help="What to do with the received messages when the consumer can't keep up",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of the consumers per channel, the messages are consumed in order by one",
+    )
+    parser.add_argument(
+        "--reconnect",
+        action="store_true",
+        help="Join the channels again when they are disconnected",
+    )
+    parser.add_argument(
+        "--stats-interval",
+        type=float,
+        default=10,
+        help="Seconds between the frame rate reports when joining many channels",
+    )
     parser.add_argument(
         "--email",
         type=str,
@@ -64,8 +142,21 @@ def get_arguments():
 
 
 def main():
-    # initializing the arguments' parser to get the user inputs
-    args = get_arguments()
+    # the log records are written by a background thread, so the channel consumers
+    # don't block on the console output
+    listener = setup_logging(logging.INFO, fmt="%(message)s")
+    # the frame rates can be logged with `kill -USR1 <pid>`
+    install_stats_signal()
+    try:
+        listen(get_arguments())
+    except Exception as exc:
+        logging.error(exc)
+    finally:
+        METRICS.log_summary()
+        listener.stop()
+
+
+def listen(args):
     # taking email as input if user doesn't provide it as an argument
     email = args.email or input("Please enter email address: ")
     # taking password as input if user doesn't provide it as an argument
@@ -91,8 +182,14 @@ def main():
         login_response = CHANNEL_CLIENT.confirm2Fa(params={"code": str(code)})
     if not login_response["success"]:
         logger.error(f"Failed to authenticate with the response: {login_response}")
+    # removing the duplicates while keeping the order of the channels
+    channels = list(dict.fromkeys(args.channel))
+    if len(channels) > 1:
+        # joining all the channels together under the same login
+        asyncio.run(multiplex(channels, args))
+        return
     # creates method name with the provided channel name
-    method_name = f"{args.channel}_join"
+    method_name = f"{channels[0]}_join"
     # getting the method attribute from the client object
     method = getattr(CHANNEL_CLIENT, method_name)
     # running the channel method asynchronously using asyncio pool
@@ -105,13 +202,28 @@ def main():
     #                   generic method to be run as default you can pass as it with default kwarg
     # here you can see that am only passing functions for on_open and on_message events
     # with a default function to handle other events
-    asyncio.run(
-        method(
+    # the messages are passed to on_message through the bounded queue, so a slow consumer
+    # doesn't delay reading the channel
+    pipeline = FramePipeline(
+        on_message,
+        workers=args.workers,
+        maxsize=args.queue_size,
+        policy=args.policy,
+        name=f"frames.{channels[0]}",
+    )
+    asyncio.run(consume(method, pipeline))
+
+
+async def consume(method, pipeline):
+    try:
+        await method(
             on_open=on_open,
-            on_message=on_message,
+            on_message=pipeline,
             default=default,
         )
-    )
+    finally:
+        # consuming the waiting messages once the channel is closed
+        await pipeline.close()
 
 
 # It's the start of the file, this commands represents that this file will execute from here
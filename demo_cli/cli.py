@@ -1,28 +1,52 @@
 import argparse
 import logging
 import sys
+import threading
 from pprint import pprint
 
 from stxsdk import StxClient, Selection
+from stxsdk.utils import format_failure_response
+
+from trading_bot.bulk import LOOKUPS, bulk_lookup
+from trading_bot.exceptions import HistoryExportError, OrderValidationError
+from trading_bot.history import HISTORIES, HistoryExporter
+from trading_bot.lazy_markets import LazyMarketInfos
+from trading_bot.prepared_query import PreparedQuery
+from trading_bot.response_cache import CachedClient
+from trading_bot.snapshot import DEFAULT_SNAPSHOT_PATH, MarketSnapshot, load_snapshot
+from trading_bot.validation import OrderValidator
 
 logger = logging.getLogger(__file__)
 
-# globally initiated StxClient object
-CLIENT = StxClient()
+# globally initiated StxClient object, the read only operations like marketInfos or userProfile
+# are served from the cache when they are repeated with the same params, checkout CachedClient
+CLIENT = CachedClient(StxClient())
 
 # globally initiated a variable to store the markets data to reuse for market detail operation
 # checkout get_markets function for further details
 MARKETS = {}
+# the same markets by market id, used to validate the orders before they are sent
+MARKETS_BY_ID = {}
+# the open snapshot the saved markets are looked up in, it's closed once they are replaced
+SNAPSHOT = None
+# the background fetch replaces the markets while the menu may be looking them up,
+# so the markets are swapped and looked up under this lock, checkout swap_markets
+MARKETS_LOCK = threading.Lock()
 
+# the markets are saved to this snapshot file, so they are shown right away next time
+# while the fresh markets are fetched in the background
+SNAPSHOT_PATH = DEFAULT_SNAPSHOT_PATH
+# seconds after which the saved markets are too old to be shown
+SNAPSHOT_MAX_AGE = 3600
+# whether to keep the raw marketInfos response and decode a market only when it's looked up,
+# enabled with the --lazy-markets argument, checkout LazyMarketInfos
+LAZY_MARKETS = False
 
-# we have two separate functions for market, one for getting all the markets from API
-# and second for getting the details of the requested market
-# this function is responsible for executing the marketinfos API and store details in the
-# MARKET variable as short title to market details mapper.
-# eg. {"BHL @ MPH": {<detailed dictionary of the market>}}
-def get_markets():
-    # making selection object of the required response fields
-    selections = Selection(
+
+# the marketInfos query of the markets, it's compiled once and reused by every fetch
+MARKET_INFOS = PreparedQuery(
+    "marketInfos",
+    Selection(
         "title",
         "shortTitle",
         "marketId",
@@ -36,26 +60,101 @@ def get_markets():
         "price",
         bids=Selection("price", "quantity"),
         offers=Selection("price", "quantity"),
-    )
+        orderPriceRules=Selection("from", "inc", "to"),
+    ),
+)
+
+
+# we have two separate functions for market, one for getting all the markets from API
+# and second for getting the details of the requested market
+# this function is responsible for executing the marketinfos API and store details in the
+# MARKET variable as short title to market details mapper.
+# eg. {"BHL @ MPH": {<detailed dictionary of the market>}}
+def get_markets():
+    if LAZY_MARKETS:
+        # the snapshot would decode all the markets to save them
+        return fetch_lazy_markets()
+    # showing the markets saved by the previous fetch if they are available
+    snapshot = load_snapshot(SNAPSHOT_PATH, SNAPSHOT_MAX_AGE)
+    if snapshot is not None:
+        try:
+            markets = set_snapshot_markets(snapshot)
+        except Exception as exc:
+            logger.warning(f"Failed to load the saved markets: {exc}")
+            snapshot.close()
+        else:
+            # fetching the fresh markets in the background with its own client,
+            # the StxClient object can't be shared between the threads
+            threading.Thread(target=fetch_markets, args=(StxClient,), daemon=True).start()
+            return markets
+    return fetch_markets()
+
+
+def fetch_markets(client_factory=None):
+    client = client_factory() if client_factory else CLIENT
     # executing the marketinfos API with the generated selection object
-    market_data = CLIENT.marketInfos(selections=selections)
+    market_data = MARKET_INFOS(client)
     if not market_data["success"]:
         logger.error(f"Failed to get markets with error: {market_data['errors']}")
     else:
-        # clearing the MARKET in order to avoid duplication or expired data
-        MARKETS.clear()
-        markets = []
-        # generating the markets mapper as mentioned above and a
-        # list of market short titles to be sent in the response
-        for market in market_data["data"]["marketInfos"]:
-            MARKETS[market["shortTitle"]] = market
-            markets.append(market["shortTitle"])
-        return markets
+        market_data = market_data["data"]["marketInfos"]
+        # saving the markets for the next time
+        try:
+            MarketSnapshot.save(SNAPSHOT_PATH, market_data)
+        except OSError as exc:
+            logger.warning(f"Failed to save the markets: {exc}")
+        return set_markets(market_data)
+
+
+def fetch_lazy_markets():
+    # executing the marketinfos API without decoding its response
+    market_data = MARKET_INFOS.fetch_raw(CLIENT)
+    if not market_data["success"]:
+        logger.error(f"Failed to get markets with error: {market_data['errors']}")
+        return None
+    # the market is decoded when its details are requested or an order is created for it
+    markets = LazyMarketInfos.from_response(
+        market_data, key="shortTitle", index_fields=("marketId",)
+    )
+    swap_markets(markets, markets.by_field("marketId"))
+    return list(markets)
+
+
+def swap_markets(markets, markets_by_id, snapshot=None):
+    global MARKETS, MARKETS_BY_ID, SNAPSHOT
+    # the new maps are swapped in at once, the menu may be reading them while the background
+    # fetch replaces them, so they are never cleared and filled in place
+    with MARKETS_LOCK:
+        previous_snapshot = SNAPSHOT
+        MARKETS, MARKETS_BY_ID, SNAPSHOT = markets, markets_by_id, snapshot
+        # the replaced saved markets are not looked up anymore, unmapping and closing the file
+        if previous_snapshot is not None and previous_snapshot is not snapshot:
+            previous_snapshot.close()
+
+
+def set_snapshot_markets(snapshot):
+    # the saved markets are looked up in the memory mapped snapshot and decoded one by one,
+    # only their short titles are read to be listed, the snapshot is kept open till the
+    # fresh markets replace it
+    markets = snapshot.by_field("shortTitle")
+    swap_markets(markets, snapshot, snapshot)
+    return list(markets)
+
+
+def set_markets(market_data):
+    # generating the markets mapper as mentioned above and a
+    # list of market short titles to be sent in the response
+    markets = {market["shortTitle"]: market for market in market_data}
+    markets_by_id = {market["marketId"]: market for market in market_data}
+    # replacing the MARKET in order to avoid duplication or expired data
+    swap_markets(markets, markets_by_id)
+    return list(markets)
 
 
 def get_market_details():
     short_code = input("Enter Market Short Title: ")
-    return MARKETS.get(short_code, "Market with this Short Title not exist.")
+    with MARKETS_LOCK:
+        return MARKETS.get(short_code, "Market with this Short Title not exist.")
 
 
 def create_order():
@@ -82,6 +181,16 @@ def create_order():
     if order_type == "LIMIT":
         price = input("Enter Price: ")
         params["userOrder"]["price"] = price
+    # checking the order against the loaded markets, eg. the price is rounded to the market's
+    # price ticks and the order of a closed market is not sent, the markets are loaded by
+    # the option 2, otherwise only the quantity and the price are checked
+    with MARKETS_LOCK:
+        market = MARKETS_BY_ID.get(market_id)
+    try:
+        params = OrderValidator().validate_params(params, market)
+    except OrderValidationError as exc:
+        logger.error(f"Invalid order: {exc}")
+        return format_failure_response(errors=[str(exc)], message="Invalid order")
     return CLIENT.confirmOrder(params=params)
 
 
@@ -106,6 +215,46 @@ def cancel_order():
     return CLIENT.cancelOrder(params=params)
 
 
+def export_history():
+    # this function exports the orders, trades or settlements history to a file page by page,
+    # so the history of any size is exported without holding it in the memory, running it
+    # again with the same file continues the export from the last exported record
+    while True:
+        history = input(f"Enter History [{' | '.join(HISTORIES)}]: ")
+        if history in HISTORIES:
+            break
+        else:
+            logger.error(f"Invalid History, Please select one of {', '.join(HISTORIES)}")
+    path = input(f"Enter File Path [{history}.jsonl], .jsonl or .csv: ") or f"{history}.jsonl"
+    try:
+        exported = HistoryExporter(history, path).export()
+    except HistoryExportError as exc:
+        logger.error(f"Failed to export the history: {exc}")
+        return str(exc)
+    return f"Exported {exported} new {history} records to {path}"
+
+
+def bulk_lookups():
+    # this function takes many order or market ids at once and runs their lookups concurrently,
+    # the responses are printed as they are completed instead of one request after another
+    while True:
+        lookup = input(f"Enter Lookup [{' | '.join(LOOKUPS)}]: ")
+        if lookup in LOOKUPS:
+            break
+        else:
+            logger.error(f"Invalid Lookup, Please select one of {', '.join(LOOKUPS)}")
+    operation, param_name = LOOKUPS[lookup]
+    ids = [value.strip() for value in input("Enter Comma Separated IDs: ").split(",")]
+    ids = [value for value in ids if value]
+    failed = []
+    for value, response in bulk_lookup(operation, param_name, ids, timeout=30):
+        print(f"{param_name}: {value}")
+        pprint(response)
+        if not response["success"]:
+            failed.append(value)
+    return f"Completed {len(ids)} lookups, failed: {failed}"
+
+
 def exit_session():
     sys.exit()
 
@@ -123,7 +272,9 @@ METHOD_MAP = {
     "9": get_market_settlements,
     "10": cancel_order,
     "11": CLIENT.logout,
-    "12": exit_session,
+    "12": export_history,
+    "13": bulk_lookups,
+    "14": exit_session,
 }
 
 
@@ -142,7 +293,9 @@ def print_menu():
     9. Get Market Settlements
     10. Cancel Order
     11. Logout
-    12. Exit
+    12. Export History
+    13. Bulk Lookups
+    14. Exit
     """
     )
 
@@ -159,12 +312,19 @@ def get_arguments():
         type=str,
         help="Password",
     )
+    parser.add_argument(
+        "--lazy-markets",
+        action="store_true",
+        help="Decode the markets only when they are looked up, for the big market lists",
+    )
     return parser.parse_args()
 
 
 def main():
+    global LAZY_MARKETS
     # initializing the arguments' parser to get the user inputs
     args = get_arguments()
+    LAZY_MARKETS = args.lazy_markets
     # taking email as input if user doesn't provide it as an argument
     email = args.email or input("Please enter email address: ")
     # taking password as input if user doesn't provide it as an argument
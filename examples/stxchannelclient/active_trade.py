@@ -2,6 +2,7 @@ import asyncio
 from pprint import pprint
 
 from examples.stxchannelclient.init import channel_client
+from trading_bot.frame_queue import BLOCK, FramePipeline
 
 """
 What is Consumer?"
@@ -53,10 +54,22 @@ async def default(response):
 #                   generic method to be run as default you can pass as it with default kwarg
 # here you can see that am only passing functions for on_open and on_message events
 # with a default function to handle other events
-asyncio.run(
-    channel_client.active_trades_join(
-        on_open=on_open,
-        on_message=on_message,
-        default=default,
-    )
-)
+
+# the consumers run inline on the channel listener, so a slow consumer delays reading the
+# next messages, the FramePipeline puts the messages on a bounded queue instead and consumes
+# them in the background, with the block policy no message is lost, the socket is read only
+# as fast as the messages are consumed once the queue is full
+# checkout trading_bot.frame_queue for the other overflow policies
+async def main():
+    pipeline = FramePipeline(on_message, maxsize=1000, policy=BLOCK)
+    try:
+        await channel_client.active_trades_join(
+            on_open=on_open,
+            on_message=pipeline,
+            default=default,
+        )
+    finally:
+        await pipeline.close()
+
+
+asyncio.run(main())
@@ -0,0 +1,64 @@
+import asyncio
+
+from trading_bot.account_state import AccountState
+from trading_bot.instrumentation import Metrics
+
+
+def portfolio_message(event, payload):
+    return {"data": ["3", None, "portfolio:user", event, payload]}
+
+
+def receive(account, *messages):
+    async def run():
+        for message in messages:
+            await account.on_portfolio(message)
+
+    asyncio.run(run())
+
+
+def test_only_the_summary_updates_the_balance():
+    account = AccountState(metrics=Metrics())
+    receive(
+        account,
+        portfolio_message("phx_reply", {"status": "ok", "response": {}}),
+        portfolio_message("summary", {"available_balance": 1000, "escrow": 0}),
+        portfolio_message("other", {"available_balance": 1}),
+    )
+    assert account.summary == {"availableBalance": 1000, "escrow": 0}
+    assert account.available_balance == 1000
+
+
+def test_placed_orders_are_deducted_till_the_next_summary():
+    account = AccountState(metrics=Metrics())
+    receive(account, portfolio_message("summary", {"available_balance": 1000}))
+    account.reserve(600)
+    assert account.available_balance == 400
+    assert not account.can_afford(500)
+    account.release(200)
+    assert account.can_afford(500)
+    receive(account, portfolio_message("summary", {"available_balance": 900}))
+    assert account.available_balance == 900
+
+
+def test_quiet_portfolio_channel_leaves_the_orders_to_the_server():
+    # the summary is sent only when the balance changes, an idle account gets no messages
+    account = AccountState(max_age=60, metrics=Metrics())
+    receive(account, portfolio_message("summary", {"available_balance": 100}))
+    assert account.is_fresh and not account.is_stale
+    assert not account.can_afford(500)
+    account.summary_updated_at -= 61
+    assert account.is_stale and not account.is_fresh
+    assert account.age >= 61
+    for _ in range(3):
+        assert account.can_afford(500)
+    # the next summary is checked again
+    receive(account, portfolio_message("summary", {"available_balance": 100}))
+    assert not account.is_stale
+    assert not account.can_afford(500)
+
+
+def test_unknown_balance_leaves_the_orders_to_the_server():
+    account = AccountState(max_age=60, metrics=Metrics())
+    assert account.age is None
+    assert not account.is_stale
+    assert account.can_afford(10 ** 9)
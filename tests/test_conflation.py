@@ -0,0 +1,65 @@
+import asyncio
+
+from trading_bot.conflation import MarketUpdateConflator, merge_deltas
+from trading_bot.instrumentation import Metrics
+
+
+def market_message(*deltas, event="market_updated"):
+    market_updates = {delta["market_id"]: delta for delta in deltas}
+    return {"data": ["3", None, "market_info", event, market_updates]}
+
+
+def test_merge_deltas_keeps_the_fields_of_both_deltas():
+    pending = {"market_id": "m1", "unix_timestamp": 1, "price": 10}
+    merged = merge_deltas(pending, {"market_id": "m1", "unix_timestamp": 2, "offers": []})
+    assert merged == {"market_id": "m1", "unix_timestamp": 2, "price": 10, "offers": []}
+
+
+def test_merge_deltas_newer_fields_win():
+    pending = {"market_id": "m1", "unix_timestamp": 1, "price": 10}
+    merged = merge_deltas(pending, {"market_id": "m1", "unix_timestamp": 2, "price": 20})
+    assert merged["price"] == 20
+    assert merged["unix_timestamp"] == 2
+    # the pending delta is updated in place
+    assert merged is pending
+
+
+def test_merge_deltas_late_delta_fills_only_missing_fields():
+    pending = {"market_id": "m1", "unix_timestamp": 5, "price": 10}
+    late = {"market_id": "m1", "unix_timestamp": 3, "price": 7, "probability": 0.4}
+    merged = merge_deltas(pending, late)
+    assert merged == {"market_id": "m1", "unix_timestamp": 5, "price": 10, "probability": 0.4}
+    # neither of the deltas is changed when the late one is merged
+    assert pending == {"market_id": "m1", "unix_timestamp": 5, "price": 10}
+    assert late["price"] == 7
+
+
+def test_merge_deltas_without_timestamps_takes_the_received_delta():
+    merged = merge_deltas({"market_id": "m1", "price": 10}, {"market_id": "m1", "price": 11})
+    assert merged["price"] == 11
+
+
+def test_conflator_delivers_one_merged_update_per_market():
+    delivered = []
+
+    async def consumer(event, market_updates):
+        delivered.append((event, market_updates))
+
+    async def run():
+        conflator = MarketUpdateConflator(consumer, interval_ms=10, metrics=Metrics())
+        await conflator(market_message({"market_id": "m1", "unix_timestamp": 1, "price": 1}))
+        await conflator(market_message({"market_id": "m1", "unix_timestamp": 2, "bids": []}))
+        await conflator(market_message({"market_id": "m2", "unix_timestamp": 1, "price": 5}))
+        await asyncio.sleep(0.05)
+        await conflator.close()
+
+    asyncio.run(run())
+    assert delivered == [
+        (
+            "market_updated",
+            {
+                "m1": {"market_id": "m1", "unix_timestamp": 2, "price": 1, "bids": []},
+                "m2": {"market_id": "m2", "unix_timestamp": 1, "price": 5},
+            },
+        )
+    ]
@@ -0,0 +1,171 @@
+import asyncio
+
+import pytest
+
+from trading_bot.frame_queue import (
+    BLOCK,
+    CONFLATE,
+    DROP_OLDEST,
+    FramePipeline,
+    FrameQueue,
+    keep_latest,
+)
+from trading_bot.instrumentation import Metrics
+
+
+def market_message(market_id, event="market_updated", **fields):
+    market_updates = {market_id: {"market_id": market_id, **fields}}
+    return {"data": ["3", None, "market_info", event, market_updates]}
+
+
+async def drain(queue):
+    await queue.close()
+    messages = []
+    while True:
+        message = await queue.get()
+        if message is None:
+            return messages
+        messages.append(message)
+
+
+def test_unknown_policy_is_rejected():
+    with pytest.raises(ValueError):
+        FrameQueue(policy="drop_newest")
+
+
+def test_block_waits_for_the_free_space():
+    async def run():
+        queue = FrameQueue(maxsize=1, policy=BLOCK, metrics=Metrics())
+        await queue.put(market_message("m1"))
+        blocked = asyncio.create_task(queue.put(market_message("m2")))
+        await asyncio.sleep(0.01)
+        assert not blocked.done()
+        first = await queue.get()
+        await asyncio.wait_for(blocked, 1)
+        return first, await drain(queue), queue
+
+    first, rest, queue = asyncio.run(run())
+    assert list(first["data"][4]) == ["m1"]
+    assert [list(message["data"][4]) for message in rest] == [["m2"]]
+    assert queue.dropped == 0
+
+
+def test_drop_oldest_keeps_the_newest_messages():
+    async def run():
+        metrics = Metrics()
+        queue = FrameQueue(maxsize=2, policy=DROP_OLDEST, name="frames", metrics=metrics)
+        for market_id in ("m1", "m2", "m3"):
+            await queue.put(market_message(market_id))
+        return await drain(queue), queue, metrics
+
+    messages, queue, metrics = asyncio.run(run())
+    assert [list(message["data"][4]) for message in messages] == [["m2"], ["m3"]]
+    assert queue.dropped == 1
+    assert metrics.counters["frames.dropped"] == 1
+
+
+def test_conflate_merges_the_deltas_of_the_same_market():
+    async def run():
+        queue = FrameQueue(maxsize=10, policy=CONFLATE, metrics=Metrics())
+        waiting = market_message("m1", unix_timestamp=1, price=10)
+        await queue.put(waiting)
+        await queue.put(market_message("m2", unix_timestamp=1, price=20))
+        await queue.put(market_message("m1", unix_timestamp=2, offers=[]))
+        return await drain(queue), queue, waiting
+
+    messages, queue, waiting = asyncio.run(run())
+    # the conflated message keeps the position of the message it replaced
+    assert [list(message["data"][4]) for message in messages] == [["m1"], ["m2"]]
+    assert messages[0]["data"][4]["m1"] == {
+        "market_id": "m1", "unix_timestamp": 2, "price": 10, "offers": []
+    }
+    assert queue.conflated == 1
+    # the waiting message is not changed, a consumer might hold it
+    assert waiting["data"][4]["m1"] == {"market_id": "m1", "unix_timestamp": 1, "price": 10}
+
+
+def test_conflate_doesnt_merge_the_different_events():
+    async def run():
+        queue = FrameQueue(maxsize=10, policy=CONFLATE, metrics=Metrics())
+        await queue.put(market_message("m1", event="market_created", title="M1"))
+        await queue.put(market_message("m1", unix_timestamp=2, price=10))
+        return await drain(queue)
+
+    messages = asyncio.run(run())
+    assert [message["data"][3] for message in messages] == ["market_created", "market_updated"]
+
+
+def test_conflate_with_keep_latest_replaces_the_waiting_message():
+    async def run():
+        queue = FrameQueue(maxsize=10, policy=CONFLATE, merge=keep_latest, metrics=Metrics())
+        await queue.put(market_message("m1", price=10))
+        await queue.put(market_message("m1", offers=[]))
+        return await drain(queue)
+
+    messages = asyncio.run(run())
+    assert messages[0]["data"][4]["m1"] == {"market_id": "m1", "offers": []}
+
+
+def test_closed_queue_ignores_the_received_messages():
+    async def run():
+        queue = FrameQueue(metrics=Metrics())
+        await queue.put(market_message("m1"))
+        await queue.close()
+        await queue.put(market_message("m2"))
+        return await drain(queue)
+
+    messages = asyncio.run(run())
+    assert [list(message["data"][4]) for message in messages] == [["m1"]]
+
+
+def test_closed_queue_ignores_the_blocked_messages():
+    async def run():
+        queue = FrameQueue(maxsize=1, policy=BLOCK, metrics=Metrics())
+        await queue.put(market_message("m1"))
+        blocked = asyncio.create_task(queue.put(market_message("m2")))
+        await asyncio.sleep(0.01)
+        await queue.close()
+        # the space is freed after the queue is closed
+        first = await queue.get()
+        await asyncio.wait_for(blocked, 1)
+        return [first] + await drain(queue)
+
+    messages = asyncio.run(run())
+    assert [list(message["data"][4]) for message in messages] == [["m1"]]
+
+
+def test_conflate_merges_the_message_added_while_blocked():
+    async def run():
+        queue = FrameQueue(maxsize=1, policy=CONFLATE, metrics=Metrics())
+        await queue.put(market_message("m1", unix_timestamp=1, price=10))
+        # both messages of m2 wait for the free space
+        first = asyncio.create_task(queue.put(market_message("m2", unix_timestamp=1, price=20)))
+        await asyncio.sleep(0.01)
+        second = asyncio.create_task(queue.put(market_message("m2", unix_timestamp=2, bids=[])))
+        await asyncio.sleep(0.01)
+        await queue.get()
+        await asyncio.wait_for(asyncio.gather(first, second), 1)
+        return await drain(queue), queue
+
+    messages, queue = asyncio.run(run())
+    assert [message["data"][4] for message in messages] == [
+        {"m2": {"market_id": "m2", "unix_timestamp": 2, "price": 20, "bids": []}}
+    ]
+    assert queue.conflated == 1
+
+
+def test_pipeline_consumes_the_messages_in_order():
+    consumed = []
+
+    async def consumer(message):
+        consumed.append(next(iter(message["data"][4])))
+
+    async def run():
+        pipeline = FramePipeline(consumer, maxsize=2, policy=BLOCK, metrics=Metrics())
+        pipeline.start()
+        for market_id in ("m1", "m2", "m3", "m4"):
+            await pipeline(market_message(market_id))
+        await pipeline.close()
+
+    asyncio.run(run())
+    assert consumed == ["m1", "m2", "m3", "m4"]
@@ -0,0 +1,152 @@
+import csv
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from trading_bot import history
+from trading_bot.exceptions import HistoryExportError
+from trading_bot.history import HistoryExporter, read_export
+
+NOW = 1_700_000_000
+
+
+def order(index, second):
+    # the orders of the same second have the different fractions of the second
+    return {
+        "id": f"order-{index}",
+        "marketId": "market-1",
+        "status": "filled",
+        "insertedAt": index,
+        "time": f"2023-11-14T22:13:{second:02d}.{index:0{index % 3 + 1}d}Z",
+    }
+
+
+def settlement(index, inserted_at):
+    return {"id": f"settlement-{index}", "marketId": "market-1", "insertedAt": inserted_at}
+
+
+class Client:
+    # the client serving the pages of the records, the orders are sorted by the time
+    # and the settlements are filtered by the settledOn window
+    def __init__(self, records):
+        self.records = records
+        self.requests = []
+
+    def __getattr__(self, operation):
+        def method(params=None, selections=None):
+            self.requests.append(params)
+            records = self.records
+            settled_on = (params.get("filter") or {}).get("settledOn")
+            if settled_on is not None:
+                since = (NOW - settled_on["rollingWindow"]["value"]) * 10 ** 6
+                records = [record for record in records if record["insertedAt"] >= since]
+            page, limit = params["pagination"]["page"], params["pagination"]["limit"]
+            field = "settlements" if operation == "mySettlementsHistory" else "orders"
+            data = {field: records[page * limit:(page + 1) * limit], "totalCount": len(records)}
+            return {"success": True, "data": {operation: data}}
+
+        return method
+
+
+@pytest.fixture(autouse=True)
+def clock(monkeypatch):
+    monkeypatch.setattr(history, "time", SimpleNamespace(time=lambda: NOW))
+
+
+def export(name, path, client, **options):
+    return HistoryExporter(
+        name, str(path), client_factory=lambda: client, page_size=2, prefetch=0, **options
+    ).export()
+
+
+def exported_ids(path):
+    with open(path, newline="") as file:
+        if str(path).endswith(".csv"):
+            return [record["id"] for record in csv.DictReader(file)]
+        return [json.loads(line)["id"] for line in file]
+
+
+@pytest.mark.parametrize("file_format", ["jsonl", "csv"])
+def test_orders_are_resumed_from_the_time(tmp_path, file_format):
+    path = tmp_path / f"orders.{file_format}"
+    # the third and the fourth orders have the same time, the insertedAt is out of their order
+    orders = [order(0, 1), order(1, 2), order(2, 3), order(3, 3), order(4, 4)]
+    orders[2]["insertedAt"], orders[3]["insertedAt"] = 9, 8
+    orders[3]["time"] = orders[2]["time"]
+    assert export("orders", path, Client(orders[:3])) == 3
+    client = Client(orders)
+    assert export("orders", path, client) == 2
+    assert exported_ids(path) == [record["id"] for record in orders]
+    # the export is resumed from the page of the last exported order
+    assert [params["pagination"]["page"] for params in client.requests] == [1, 2]
+
+
+def test_watermark_is_the_newest_record(tmp_path):
+    path = tmp_path / "orders.jsonl"
+    orders = [order(0, 1), order(1, 2), order(2, 2)]
+    orders[2]["time"] = orders[1]["time"]
+    export("orders", path, Client(orders))
+    count, watermark, ids = read_export(str(path), "jsonl", "time")
+    assert count == 3
+    assert watermark.second == 2
+    assert ids == {"order-1", "order-2"}
+
+
+def test_settlements_are_resumed_from_the_watermark(tmp_path):
+    path = tmp_path / "settlements.jsonl"
+    hour_ago = (NOW - 3600) * 10 ** 6
+    # the settlements arrive in any order
+    settlements = [
+        settlement(0, hour_ago - 10 ** 6),
+        settlement(1, hour_ago),
+        settlement(2, hour_ago - 5 * 10 ** 6),
+    ]
+    client = Client(settlements)
+    # the fresh export has no filter
+    assert export("settlements", path, client) == 3
+    assert "filter" not in client.requests[0]
+    settlements[1:1] = [settlement(3, hour_ago), settlement(4, hour_ago + 10 ** 6)]
+    settlements.append(settlement(5, (NOW - 10 * 24 * 3600) * 10 ** 6))
+    client = Client(settlements)
+    assert export("settlements", path, client, params={"filter": {"marketIds": ["market-1"]}}) == 2
+    assert exported_ids(path) == [
+        "settlement-0", "settlement-1", "settlement-2", "settlement-3", "settlement-4"
+    ]
+    settled_on = client.requests[0]["filter"]
+    assert settled_on["marketIds"] == ["market-1"]
+    assert settled_on["settledOn"] == {
+        "type": "ROLLING_WINDOW",
+        "rollingWindow": {"increment": "SECONDS", "value": 3600 + history.SETTLED_ON_MARGIN},
+    }
+    assert not (tmp_path / "settlements.jsonl.partial").exists()
+
+
+def test_interrupted_settlements_export_is_not_added(tmp_path):
+    path = tmp_path / "settlements.csv"
+    export("settlements", path, Client([settlement(0, NOW * 10 ** 6)]))
+
+    class FailingClient(Client):
+        def __getattr__(self, operation):
+            method = super().__getattr__(operation)
+
+            def fail_after_the_first_page(params=None, selections=None):
+                if params["pagination"]["page"]:
+                    return {"success": False, "message": "failed"}
+                return method(params, selections)
+
+            return fail_after_the_first_page
+
+    settlements = [settlement(index, NOW * 10 ** 6) for index in range(1, 5)]
+    with pytest.raises(HistoryExportError):
+        export("settlements", path, FailingClient(settlements))
+    assert exported_ids(path) == ["settlement-0"]
+    assert export("settlements", path, Client(settlements)) == 4
+    assert exported_ids(path) == [f"settlement-{index}" for index in range(5)]
+
+
+def test_export_without_resume_replaces_the_file(tmp_path):
+    path = tmp_path / "orders.jsonl"
+    export("orders", path, Client([order(0, 1), order(1, 2)]))
+    assert export("orders", path, Client([order(2, 3)]), resume=False) == 1
+    assert exported_ids(path) == ["order-2"]
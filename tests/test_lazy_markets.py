@@ -0,0 +1,95 @@
+import json
+
+import pytest
+
+from trading_bot import lazy_markets
+from trading_bot.lazy_markets import LazyMarketInfos
+
+
+def market(index, **fields):
+    return {
+        "marketId": f"market-{index}",
+        "shortTitle": f"AAA @ B{index}",
+        "status": "open",
+        "bids": [{"price": 100 + index, "quantity": 2}],
+        "offers": [],
+        "orderPriceRules": [{"from": 1, "inc": 1, "to": 100}],
+        **fields,
+    }
+
+
+MARKETS = [
+    market(0),
+    # the brackets, the quotes and the field names inside the strings
+    market(1, title='The "[odd]" {market} "marketId": "fake"', shortTitle="Q\\R é"),
+    # a nested record having the key field as well
+    market(2, recentTrades=[{"marketId": "nested", "price": 5}]),
+    market(3, question=None, maxPrice=9900),
+]
+
+
+def raw_response(markets):
+    # the separators differ from the default ones of the JSON encoder
+    return json.dumps({"data": {"marketInfos": markets}}, indent=1).encode()
+
+
+@pytest.fixture(params=[True, False], ids=["pattern", "tokens"])
+def possessive(request, monkeypatch):
+    # the records are matched by the pattern since python 3.11, by the tokens before
+    if request.param and not lazy_markets.POSSESSIVE:
+        pytest.skip("the possessive quantifiers require python 3.11")
+    monkeypatch.setattr(lazy_markets, "POSSESSIVE", request.param)
+    return request.param
+
+
+def test_markets_are_keyed_and_decoded_on_lookup(possessive):
+    markets = LazyMarketInfos(raw_response(MARKETS))
+    assert list(markets) == [record["marketId"] for record in MARKETS]
+    assert "nested" not in markets
+    assert markets.decoded == 0
+    assert markets["market-1"] == MARKETS[1]
+    assert markets.decoded == 1
+    # the decoded record is cached
+    assert markets["market-1"] is markets["market-1"]
+    assert json.loads(markets.raw("market-2")) == MARKETS[2]
+
+
+def test_index_fields(possessive):
+    markets = LazyMarketInfos(
+        raw_response(MARKETS), key="shortTitle", index_fields=("marketId",)
+    )
+    assert markets["Q\\R é"]["marketId"] == "market-1"
+    assert markets.find("marketId", "market-3") == MARKETS[3]
+    assert markets.find("marketId", "missing") is None
+    by_id = markets.by_field("marketId")
+    assert len(by_id) == len(MARKETS)
+    assert by_id["market-0"] is markets["AAA @ B0"]
+
+
+def test_values_are_the_cached_records(possessive):
+    markets = LazyMarketInfos(raw_response(MARKETS))
+    looked_up = markets["market-0"]
+    values = markets.values()
+    assert values == MARKETS
+    assert values[0] is looked_up
+
+
+def test_deeply_nested_records_fall_back_to_the_tokens():
+    nested = [market(0, extra={"a": {"b": {"c": [1, {"marketId": "nested"}]}}}), market(1)]
+    markets = LazyMarketInfos(raw_response(nested))
+    assert list(markets) == ["market-0", "market-1"]
+    assert markets["market-0"] == nested[0]
+
+
+@pytest.mark.parametrize(
+    "raw",
+    [
+        b'{"data": {"marketInfos": null}}',
+        b'{"data": null, "errors": [{"message": "Unauthorized"}]}',
+        b'{"data": {"marketInfos": []}}',
+    ],
+)
+def test_responses_without_markets(raw):
+    markets = LazyMarketInfos(raw)
+    assert len(markets) == 0
+    assert markets.values() == []
@@ -0,0 +1,68 @@
+import pytest
+
+from trading_bot.market_store import (
+    MARKET_CREATED,
+    MARKET_UPDATED,
+    MarketStore,
+    channel_records,
+    to_microseconds,
+)
+
+MICROSECONDS = 1673974406324012
+
+
+def market(market_id="m1", timestamp=MICROSECONDS, **fields):
+    # the market record of the marketInfos API
+    return {"marketId": market_id, "shortTitle": "AAA @ BBB", "timestampInt": timestamp, **fields}
+
+
+@pytest.mark.parametrize(
+    "timestamp, microseconds",
+    [
+        (1673974406, 1673974406000000),
+        (1673974406.324012, MICROSECONDS),
+        (1673974406324, 1673974406324000),
+        (MICROSECONDS, MICROSECONDS),
+        (MICROSECONDS * 1000 + 999, MICROSECONDS),
+        ("1673974406324", 1673974406324000),
+        (None, None),
+    ],
+)
+def test_to_microseconds(timestamp, microseconds):
+    assert to_microseconds(timestamp) == microseconds
+
+
+def test_mixed_sources():
+    store = MarketStore()
+    store.load([market(price=10)])
+    # the channel delta in milliseconds, newer than the REST record
+    delta = {"market_id": "m1", "unix_timestamp": MICROSECONDS // 1000 + 1, "price": 20}
+    assert store.apply(MARKET_UPDATED, {"m1": delta}) == [store["m1"]]
+    assert store["m1"]["timestampInt"] == (MICROSECONDS // 1000 + 1) * 1000
+    # the older delta in seconds is ignored
+    late = {"market_id": "m1", "unix_timestamp": MICROSECONDS // 10 ** 6, "price": 5}
+    assert store.apply(MARKET_UPDATED, {"m1": late}) == []
+    # the resync response fetched before the delta doesn't overwrite it
+    assert store.sync([market(price=15)]) == []
+    assert store["m1"]["price"] == 20
+    # the newer resync response in seconds is merged
+    newer = market(timestamp=MICROSECONDS // 10 ** 6 + 10, price=30)
+    assert store.sync([newer]) == [store["m1"]]
+    assert store["m1"]["price"] == 30
+    assert store["m1"]["timestampInt"] == (MICROSECONDS // 10 ** 6 + 10) * 10 ** 6
+    # the synced record is a copy, the response is not changed
+    assert newer["timestampInt"] == MICROSECONDS // 10 ** 6 + 10
+
+
+def test_updates_of_unknown_markets():
+    store = MarketStore()
+    delta = {"market_id": "m2", "unix_timestamp": MICROSECONDS, "price": 10}
+    assert store.apply(MARKET_UPDATED, {"m2": delta}) == []
+    assert "m2" not in store
+    created = store.apply(MARKET_CREATED, {"m2": delta})
+    assert created == [{"marketId": "m2", "timestampInt": MICROSECONDS, "price": 10}]
+
+
+def test_channel_records_are_mapped():
+    message = {"data": ["3", None, "market_info", "updated", {"unix_timestamp": 1673974406}]}
+    assert channel_records(message) == [{"timestampInt": 1673974406000000}]
@@ -0,0 +1,133 @@
+import asyncio
+
+import pytest
+
+from trading_bot import order_tracker
+from trading_bot.instrumentation import Metrics
+from trading_bot.order_tracker import OrderTracker
+
+
+def response(status="open", filled=0, **fields):
+    # the order returned by the confirmOrder API
+    return {
+        "id": "order-1",
+        "clientOrderId": "client-1",
+        "marketId": "market-1",
+        "quantity": 5,
+        "status": status,
+        "filled": filled,
+        **fields,
+    }
+
+
+def update(status="open", filled=0, **fields):
+    # the order update of the active_orders channel
+    return {
+        "id": "order-1",
+        "clientOrderId": "client-1",
+        "status": status,
+        "filled": filled,
+        **fields,
+    }
+
+
+def deliver(tracker, order, updates, response_first):
+    # sending the order the same way the bot does, its channel updates are delivered
+    # before or after the confirmOrder response
+    tracker.expect(order["clientOrderId"])
+    if response_first:
+        tracked = tracker.track(order)
+    for order_update in updates:
+        tracker.apply_order(order_update)
+    if not response_first:
+        tracked = tracker.track(order)
+    return tracked
+
+
+@pytest.fixture(params=[True, False], ids=["response_first", "channel_first"])
+def response_first(request):
+    return request.param
+
+
+def test_filled_quantity_never_decreases(response_first):
+    tracker = OrderTracker(metrics=Metrics())
+    tracked = deliver(tracker, response(), [update(filled=3), update(filled=2)], response_first)
+    assert tracked["filled"] == 3
+    assert tracked["status"] == "open"
+    assert tracker.get("order-1") is tracked
+
+
+@pytest.mark.parametrize("final_status", ["CANCELLED", "filled"])
+def test_final_status_is_not_reopened(response_first, final_status):
+    tracker = OrderTracker(metrics=Metrics())
+    tracked = deliver(
+        tracker,
+        response(status="open"),
+        [update(status=final_status, filled=5), update(status="open", filled=1)],
+        response_first,
+    )
+    assert tracked["status"] == final_status.lower()
+    assert tracked["filled"] == 5
+    # the finished order is not tracked anymore
+    assert "order-1" not in tracker
+    assert tracker.open_orders() == []
+
+
+def test_update_before_the_response_is_matched_by_client_order_id():
+    tracker = OrderTracker(metrics=Metrics())
+    tracker.expect("client-1")
+    # the channel sends the order before its id is known to the bot
+    received = tracker.apply_order({"clientOrderId": "client-1", "status": "open", "filled": 1})
+    tracked = tracker.track(response(status="created"))
+    assert tracked is received
+    assert tracked["id"] == "order-1"
+    # the channel update is newer than the response
+    assert tracked["status"] == "open"
+    assert tracked["filled"] == 1
+    assert tracker.get_by_client_order_id("client-1") is tracked
+
+
+def test_trade_is_counted_once(response_first):
+    metrics = Metrics()
+    tracker = OrderTracker(metrics=metrics)
+    tracked = deliver(tracker, response(), [], response_first)
+    trade = {"id": "trade-1", "orderId": "order-1", "filled": 2}
+    message = {"data": ["3", None, "active_trades:user", "trade_created", trade]}
+    asyncio.run(tracker.on_active_trades(message))
+    asyncio.run(tracker.on_active_trades(message))
+    assert tracked["filled"] == 2
+    assert metrics.counters["orders.trades"] == 1
+    # the order update counts the same fill
+    tracker.apply_order(update(filled=2))
+    assert tracked["filled"] == 2
+    assert tracker.apply_trade({"id": "trade-2", "orderId": "order-1", "filled": 3}) is tracked
+    assert tracked["filled"] == 5
+    assert tracked["status"] == "filled"
+    assert "order-1" not in tracker
+
+
+def test_orders_of_others_are_ignored():
+    tracker = OrderTracker(metrics=Metrics())
+    assert tracker.apply_order(update()) is None
+    assert tracker.apply_trade({"id": "trade-1", "orderId": "order-1", "filled": 1}) is None
+    assert len(tracker) == 0
+
+
+def test_expected_orders_are_evicted(monkeypatch):
+    monkeypatch.setattr(order_tracker, "MAX_EXPECTED_ORDERS", 2)
+    tracker = OrderTracker(metrics=Metrics())
+    for index in range(3):
+        tracker.expect(f"client-{index}")
+    # the oldest order whose response never came is dropped
+    assert tracker.apply_order({"id": "order-0", "clientOrderId": "client-0"}) is None
+    assert tracker.apply_order({"id": "order-2", "clientOrderId": "client-2"}) is not None
+    assert "order-2" in tracker
+
+
+def test_forget():
+    tracker = OrderTracker(metrics=Metrics())
+    tracked = tracker.track(response())
+    tracker.forget(tracked)
+    assert "order-1" not in tracker
+    assert tracker.apply_order(update(filled=1)) is None
+    assert tracked["filled"] == 0
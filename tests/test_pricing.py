@@ -0,0 +1,70 @@
+import random
+
+import pytest
+
+from trading_bot.pricing import (
+    compute_price,
+    compute_prices,
+    round_to_rules,
+    round_to_rules_batch,
+    rules_arrays,
+)
+
+np = pytest.importorskip("numpy")
+
+RULES = [{"from": 1, "inc": 1, "to": 100}, {"from": 100, "inc": 5, "to": 9900}]
+# the rules with a gap between them and unsorted
+GAP_RULES = [{"from": 500, "inc": 10, "to": 1000}, {"from": 10, "inc": 2, "to": 100}]
+
+
+def test_round_to_rules():
+    assert round_to_rules(57, RULES) == 57
+    assert round_to_rules(103, RULES) == 100
+    assert round_to_rules(9999, RULES) == 9900
+    assert round_to_rules(0, RULES) == 1
+    assert round_to_rules(200, GAP_RULES) == 500
+    assert round_to_rules(42, None) == 42
+
+
+@pytest.mark.parametrize("rules", [RULES, GAP_RULES, [{"from": 3, "inc": 7, "to": 50}]])
+def test_round_to_rules_batch_matches_round_to_rules(rules):
+    prices = list(range(-5, 10050, 7))
+    expected = [round_to_rules(price, rules) for price in prices]
+    assert round_to_rules_batch(prices, [rules] * len(prices)).tolist() == expected
+
+
+def test_round_to_rules_batch_with_different_rules_per_market():
+    generator = random.Random(7)
+    markets_rules = [RULES, GAP_RULES, None, [], [{"from": 3, "inc": 7, "to": 50}]] * 200
+    prices = [generator.randint(-10, 11000) for _ in markets_rules]
+    expected = [round_to_rules(price, rules) for price, rules in zip(prices, markets_rules)]
+    assert round_to_rules_batch(prices, markets_rules).tolist() == expected
+    # the precomputed arrays give the same prices
+    assert round_to_rules_batch(prices, rules_arrays(markets_rules)).tolist() == expected
+
+
+def test_round_to_rules_batch_of_no_markets():
+    assert round_to_rules_batch([], []).tolist() == []
+
+
+def test_compute_prices_matches_compute_price():
+    generator = random.Random(11)
+    count = 500
+    probabilities = [generator.random() for _ in range(count)]
+    best_bids = [float(generator.randint(1, 10000)) for _ in range(count)]
+    max_prices = [float(generator.choice((5000, 9900, 10000))) for _ in range(count)]
+    caps = [generator.randrange(11) for _ in range(count)]
+    markets_rules = [generator.choice((RULES, GAP_RULES, None)) for _ in range(count)]
+    expected = [
+        compute_price(probability, best_bid, max_price, rules, cap)
+        for probability, best_bid, max_price, rules, cap in zip(
+            probabilities, best_bids, max_prices, markets_rules, caps
+        )
+    ]
+    prices = compute_prices(probabilities, best_bids, max_prices, markets_rules, np.array(caps))
+    assert prices.tolist() == expected
+
+
+def test_compute_prices_without_bids_or_max_price():
+    prices = compute_prices([0.5, 0.5], [float("nan"), 100.0], [float("nan"), float("nan")])
+    assert prices.tolist() == [-1, 50]
@@ -0,0 +1,155 @@
+import asyncio
+import json
+
+import pytest
+from stxsdk import Selection
+
+from trading_bot import response_cache
+from trading_bot.instrumentation import Metrics
+from trading_bot.response_cache import CachedClient, ResponseCache, request_key
+
+
+class Clock:
+    # the monotonic clock of the cache, moved forward by the tests
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(response_cache, "time", clock)
+    return clock
+
+
+def response(size=10, **data):
+    return {"success": True, "data": {"payload": "x" * size, **data}}
+
+
+def test_cached_response_is_a_copy():
+    cache = ResponseCache(metrics=Metrics())
+    cache.put("key", "marketInfos", response(markets=[{"price": 1}]))
+    cached = cache.get("key")
+    cached["data"]["markets"][0]["price"] = 2
+    assert cache.get("key")["data"]["markets"][0]["price"] == 1
+
+
+def test_ttl(clock):
+    cache = ResponseCache(ttls={"marketInfos": 60, "get_return_fields": None}, metrics=Metrics())
+    cache.put("markets", "marketInfos", response())
+    cache.put("fields", "get_return_fields", response())
+    clock.now += 59
+    assert cache.get("markets") is not None
+    clock.now += 1
+    assert cache.get("markets") is None
+    assert len(cache) == 1
+    # the responses without the ttl never expire
+    clock.now += 10 ** 6
+    assert cache.get("fields") is not None
+
+
+def test_lru_eviction_by_size():
+    metrics = Metrics()
+    blob_size = len(json.dumps(response()).encode())
+    cache = ResponseCache(max_bytes=blob_size * 3, metrics=metrics)
+    for key in ("a", "b", "c"):
+        cache.put(key, "marketInfos", response())
+    # "a" is used, so "b" is the least recently used one
+    assert cache.get("a") is not None
+    cache.put("d", "marketInfos", response())
+    assert cache.get("b") is None
+    assert [cache.get(key) is not None for key in ("a", "c", "d")] == [True, True, True]
+    assert cache.size == blob_size * 3
+    assert metrics.counters["cache.evicted"] == 1
+
+
+def test_response_bigger_than_the_cache_is_not_cached():
+    cache = ResponseCache(max_bytes=50, metrics=Metrics())
+    cache.put("key", "marketInfos", response(size=100))
+    assert cache.get("key") is None
+    assert cache.size == 0
+
+
+def test_put_replaces_the_response():
+    cache = ResponseCache(metrics=Metrics())
+    cache.put("key", "marketInfos", response(size=10))
+    cache.put("key", "marketInfos", response(size=20))
+    assert len(cache) == 1
+    assert cache.size == len(json.dumps(response(size=20)).encode())
+
+
+def test_invalidate():
+    cache = ResponseCache(metrics=Metrics())
+    cache.put("markets", "marketInfos", response())
+    cache.put("profile", "userProfile", response())
+    cache.invalidate("marketInfos")
+    assert cache.get("markets") is None
+    assert cache.get("profile") is not None
+    cache.invalidate()
+    assert len(cache) == 0
+    assert cache.size == 0
+
+
+def test_channel_message_invalidates_the_outdated_responses():
+    cache = ResponseCache(metrics=Metrics())
+    cache.put("markets", "marketInfos", response())
+    cache.put("profile", "userProfile", response())
+    asyncio.run(cache.on_channel_message({"data": ["3", None, "user_info:uid", "updated", {}]}))
+    assert cache.get("profile") is None
+    assert cache.get("markets") is not None
+    message = {"data": ["3", None, "market_info", "market_updated", {}]}
+    asyncio.run(cache.on_channel_message(message))
+    assert cache.get("markets") is None
+
+
+def test_request_key_is_canonical():
+    first = request_key("marketInfos", (), {"selections": Selection("title", "marketId")})
+    second = request_key("marketInfos", (), {"selections": Selection("marketId", "title")})
+    assert first == second
+    assert request_key("marketInfos", (), {}) == request_key("marketInfos", (), {"params": {}})
+    assert first != request_key("marketInfos", (), {"selections": Selection("title")})
+
+
+class Client:
+    # the client counting the requests of the operations
+    def __init__(self):
+        self.requests = []
+
+    def __getattr__(self, operation):
+        def method(params=None, selections=None):
+            self.requests.append(operation)
+            if operation == "userProfile" and (params or {}).get("fail"):
+                return {"success": False, "message": "failed"}
+            return response(operation=operation)
+
+        return method
+
+
+def test_cached_client():
+    client = Client()
+    cached = CachedClient(client, ResponseCache(metrics=Metrics()))
+    assert cached.marketInfos() == cached.marketInfos()
+    assert client.requests == ["marketInfos"]
+    # the other params are a different request
+    cached.marketInfos(params={"filter": "open"})
+    assert client.requests == ["marketInfos", "marketInfos"]
+    # the operations which change the state are never cached
+    cached.confirmOrder(params={})
+    cached.confirmOrder(params={})
+    assert client.requests.count("confirmOrder") == 2
+    # the failed responses are not cached
+    cached.userProfile(params={"fail": True})
+    cached.userProfile(params={"fail": True})
+    assert client.requests.count("userProfile") == 2
+
+
+def test_logout_clears_the_cache():
+    client = Client()
+    cached = CachedClient(client, ResponseCache(metrics=Metrics()))
+    cached.marketInfos()
+    cached.logout()
+    cached.marketInfos()
+    assert client.requests == ["marketInfos", "logout", "marketInfos"]
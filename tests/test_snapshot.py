@@ -0,0 +1,102 @@
+import pytest
+
+from trading_bot.exceptions import SnapshotError
+from trading_bot.snapshot import MarketSnapshot, load_snapshot
+
+
+def market(index):
+    return {
+        "marketId": f"market-{index}",
+        "shortTitle": f"AAA @ B{index}",
+        "title": f"Market é {index}",
+        "probability": index / 100,
+        "bids": [{"price": index, "quantity": 1}],
+    }
+
+
+MARKETS = [market(index) for index in range(50)]
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "markets.snapshot")
+
+
+def test_round_trip(path):
+    assert MarketSnapshot.save(path, MARKETS, saved_at=1000.0) == len(MARKETS)
+    with MarketSnapshot.open(path) as snapshot:
+        assert snapshot.saved_at == 1000.0
+        assert len(snapshot) == len(MARKETS)
+        assert snapshot.values() == MARKETS
+        assert list(snapshot) == [record["marketId"] for record in MARKETS]
+        for record in MARKETS:
+            assert snapshot[record["marketId"]] == record
+        assert "missing" not in snapshot
+        with pytest.raises(KeyError):
+            snapshot["missing"]
+
+
+def test_lookup_by_the_index_field(path):
+    MarketSnapshot.save(path, MARKETS)
+    with MarketSnapshot.open(path) as snapshot:
+        by_title = snapshot.by_field("shortTitle")
+        assert len(by_title) == len(MARKETS)
+        assert by_title["AAA @ B7"] == MARKETS[7]
+        assert "missing" not in by_title
+        with pytest.raises(SnapshotError):
+            snapshot.by_field("title")
+
+
+def test_duplicated_markets_are_saved_once(path):
+    updated = dict(MARKETS[0], probability=0.99)
+    assert MarketSnapshot.save(path, [MARKETS[0], MARKETS[1], updated]) == 2
+    with MarketSnapshot.open(path) as snapshot:
+        assert len(snapshot) == 2
+        assert snapshot["market-0"]["probability"] == 0.99
+
+
+def test_empty_snapshot(path):
+    MarketSnapshot.save(path, [])
+    with MarketSnapshot.open(path) as snapshot:
+        assert len(snapshot) == 0
+        assert snapshot.values() == []
+        assert len(snapshot.by_field("shortTitle")) == 0
+        with pytest.raises(KeyError):
+            snapshot["market-0"]
+
+
+def test_save_replaces_the_snapshot(path):
+    MarketSnapshot.save(path, MARKETS)
+    MarketSnapshot.save(path, MARKETS[:3])
+    with MarketSnapshot.open(path) as snapshot:
+        assert snapshot.values() == MARKETS[:3]
+
+
+@pytest.mark.parametrize("content", [b"", b"STXMKTS", b"not a snapshot" * 10])
+def test_corrupted_snapshot(path, content):
+    with open(path, "wb") as file:
+        file.write(content)
+    with pytest.raises(SnapshotError):
+        MarketSnapshot.open(path)
+    assert load_snapshot(path) is None
+
+
+def test_load_snapshot(path):
+    assert load_snapshot(path) is None
+    MarketSnapshot.save(path, MARKETS, saved_at=1000.0)
+    # too old
+    assert load_snapshot(path, max_age=60) is None
+    snapshot = load_snapshot(path)
+    assert snapshot is not None
+    with snapshot:
+        assert snapshot["market-3"] == MARKETS[3]
+
+
+def test_groups(path):
+    eligible = [record["marketId"] for record in MARKETS[::5]]
+    MarketSnapshot.save(path, MARKETS, groups={"eligible": eligible})
+    with MarketSnapshot.open(path) as snapshot:
+        assert snapshot.group("eligible") == eligible
+        assert [snapshot[market_id] for market_id in eligible] == MARKETS[::5]
+        with pytest.raises(SnapshotError):
+            snapshot.group("picked")
@@ -0,0 +1,180 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from trading_bot import order_gateway, supervisor
+from trading_bot.instrumentation import Metrics
+from trading_bot.order_gateway import OrderGateway
+from trading_bot.supervisor import ChannelSupervisor
+
+CONNECTED = {"closed": False, "message_received": True, "message": "Connected", "data": None}
+CLOSED = {"closed": True, "message_received": False, "message": "Closed", "data": None}
+
+
+class ChannelClient:
+    """
+    The channel client whose joins are connected or failed as scripted, every join returns
+    as soon as the scripted connection is closed
+    """
+
+    def __init__(self, connections):
+        # True for the join which connects, False for the one which fails
+        self.connections = list(connections)
+        self.joins = 0
+        self.supervisor = None
+
+    async def market_info_join(self, on_open=None, on_message=None, on_close=None, on_error=None):
+        connected = self.connections[self.joins]
+        self.joins += 1
+        if self.joins == len(self.connections):
+            self.supervisor.stop()
+        if connected:
+            await on_open(CONNECTED)
+            await on_message({"data": ["3", None, "market_info", "market_updated", {}]})
+            await on_close(CLOSED)
+        else:
+            await on_error({"closed": True, "message": "Failed", "data": None})
+
+
+@pytest.fixture
+def delays(monkeypatch):
+    # the delays are added to the fake clock instead of being waited,
+    # and the jitter gives the maximum delay
+    delays = []
+    clock = SimpleNamespace(now=0.0)
+
+    async def sleep(delay):
+        delays.append(delay)
+        clock.now += delay
+
+    monkeypatch.setattr(supervisor, "asyncio", SimpleNamespace(sleep=sleep))
+    monkeypatch.setattr(supervisor, "random", SimpleNamespace(uniform=lambda low, high: high))
+    monkeypatch.setattr(supervisor, "time", SimpleNamespace(monotonic=lambda: clock.now))
+    return delays
+
+
+def run_supervisor(connections, **options):
+    channel_client = ChannelClient(connections)
+    calls = []
+
+    async def on_message(response):
+        calls.append("message")
+
+    async def resync_markets():
+        calls.append("resync")
+
+    async def refresh_auth():
+        calls.append("refresh")
+        return {"success": True}
+
+    channel_supervisor = ChannelSupervisor(
+        channel_client,
+        "market_info",
+        on_message=on_message,
+        on_reconnect=resync_markets,
+        refresh_auth=refresh_auth,
+        metrics=Metrics(),
+        **options,
+    )
+    channel_client.supervisor = channel_supervisor
+    asyncio.run(channel_supervisor.run())
+    return channel_supervisor, channel_client, calls
+
+
+def test_backoff_is_jittered_and_capped():
+    channel_supervisor = ChannelSupervisor(
+        ChannelClient([]), "market_info", on_message=None, initial_delay=0.5, max_delay=4
+    )
+    for attempts in range(10):
+        cap = min(4, 0.5 * 2 ** attempts)
+        delays = [channel_supervisor.backoff(attempts) for _ in range(200)]
+        assert all(0 <= delay <= cap for delay in delays)
+        # the delays are spread over the range, not the same for every client
+        assert len(set(delays)) > 1
+
+
+def test_reconnects_with_the_backoff_and_resyncs(delays):
+    channel_supervisor, channel_client, calls = run_supervisor(
+        [True, False, False, True], initial_delay=0.5, max_delay=30
+    )
+    assert channel_client.joins == 4
+    # the attempts are counted from the last connection
+    assert delays == [0.5, 1, 2]
+    assert channel_supervisor.connections == 2
+    assert channel_supervisor.metrics.counters["reconnects.market_info"] == 1
+    # the token is refreshed before every join, the markets are resynced once reconnected
+    # and before any message of the new connection is consumed
+    assert calls == [
+        "refresh", "message",
+        "refresh",
+        "refresh",
+        "refresh", "resync", "message",
+    ]
+
+
+def test_gives_up_after_the_max_downtime(delays):
+    channel_supervisor, channel_client, calls = run_supervisor(
+        [True] + [False] * 20, initial_delay=1, max_delay=8, max_downtime=20
+    )
+    # 1 + 2 + 4 + 8 + 8 seconds of the downtime before the attempt which gives up
+    assert delays == [1, 2, 4, 8, 8]
+    assert channel_client.joins == 6
+    assert "resync" not in calls
+
+
+def test_failed_refresh_still_joins(delays):
+    channel_client = ChannelClient([True, True])
+    resyncs = []
+
+    async def refresh_auth():
+        raise RuntimeError("refresh failed")
+
+    async def resync_markets():
+        resyncs.append(True)
+
+    async def on_message(response):
+        pass
+
+    channel_supervisor = ChannelSupervisor(
+        channel_client,
+        "market_info",
+        on_message=on_message,
+        on_reconnect=resync_markets,
+        refresh_auth=refresh_auth,
+        metrics=Metrics(),
+    )
+    channel_client.supervisor = channel_supervisor
+    asyncio.run(channel_supervisor.run())
+    assert channel_client.joins == 2
+    assert resyncs == [True]
+
+
+def test_gateway_refreshes_the_token_one_at_a_time(monkeypatch):
+    running, peak, clients = [0], [0], set()
+
+    def check_auth(proxy_call):
+        running[0] += 1
+        peak[0] = max(peak[0], running[0])
+        clients.add(proxy_call)
+        time.sleep(0.01)
+        running[0] -= 1
+        return {"success": True}
+
+    monkeypatch.setattr(order_gateway, "check_auth", check_auth)
+    # every worker thread gets its own client
+    gateway = OrderGateway(
+        max_concurrency=4, client_factory=lambda: SimpleNamespace(userProfile=object())
+    )
+
+    async def refresh_all():
+        # eg. the supervisors of all the channels reconnecting at once
+        return await asyncio.gather(*(gateway.refresh_auth() for _ in range(5)))
+
+    try:
+        assert asyncio.run(refresh_all()) == [{"success": True}] * 5
+    finally:
+        gateway.shutdown()
+    assert peak == [1]
+    assert 1 <= len(clients) <= 4
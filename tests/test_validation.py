@@ -0,0 +1,114 @@
+import asyncio
+
+import pytest
+
+from trading_bot.account_state import AccountState
+from trading_bot.exceptions import OrderValidationError
+from trading_bot.validation import CLOSED_STATUSES, OrderValidator, closed_statuses
+
+MARKET = {
+    "marketId": "market-1",
+    "status": "open",
+    "maxPrice": 10000,
+    "orderPriceRules": [{"from": 1, "inc": 1, "to": 100}, {"from": 100, "inc": 5, "to": 9900}],
+}
+
+
+def funded_account(available_balance, max_age=None):
+    account = AccountState(max_age=max_age)
+    payload = {"available_balance": available_balance}
+    asyncio.run(account.on_portfolio({"data": ["3", None, "portfolio:user", "summary", payload]}))
+    return account
+
+
+def test_closed_statuses_are_read_from_the_schema():
+    assert CLOSED_STATUSES == {"cancelled", "closed", "resulted", "voided", "close"}
+    assert closed_statuses() == CLOSED_STATUSES
+
+
+def test_valid_order():
+    assert OrderValidator().validate(MARKET, "3", "250") == (3, 250)
+
+
+@pytest.mark.parametrize("quantity", ["0", "-1", "1.5", "abc", None])
+def test_invalid_quantity(quantity):
+    with pytest.raises(OrderValidationError):
+        OrderValidator().validate(MARKET, quantity, 100)
+
+
+@pytest.mark.parametrize("price", ["0", "-5", "abc"])
+def test_invalid_price(price):
+    with pytest.raises(OrderValidationError):
+        OrderValidator().validate(MARKET, 1, price)
+
+
+@pytest.mark.parametrize("status", ["CLOSED", "resulted", "voided", "cancelled", "close"])
+def test_closed_market(status):
+    with pytest.raises(OrderValidationError):
+        OrderValidator().validate(dict(MARKET, status=status), 1, 100)
+
+
+@pytest.mark.parametrize("status", ["OPEN", "pre_open"])
+def test_open_market(status):
+    assert OrderValidator().validate(dict(MARKET, status=status), 1, 100) == (1, 100)
+
+
+@pytest.mark.parametrize(
+    "price, valid_price",
+    [
+        # fractional price
+        (57.9, 57),
+        # off the ticks
+        (103, 100),
+        # over the max price
+        (20000, 9900),
+    ],
+)
+def test_price_is_snapped(price, valid_price):
+    assert OrderValidator().validate(MARKET, 1, price) == (1, valid_price)
+    with pytest.raises(OrderValidationError):
+        OrderValidator(snap=False).validate(MARKET, 1, price)
+
+
+def test_unknown_market_checks_only_the_numbers():
+    assert OrderValidator().validate(None, 2, 103.5) == (2, 103)
+
+
+def test_market_order_price_is_not_checked():
+    assert OrderValidator().validate(MARKET, 2, None, order_type="MARKET") == (2, None)
+
+
+def test_balance():
+    validator = OrderValidator(funded_account(1000))
+    assert validator.validate(MARKET, 10, 100) == (10, 100)
+    with pytest.raises(OrderValidationError):
+        validator.validate(MARKET, 11, 100)
+    # the cancelled order releases its cost
+    assert validator.validate(MARKET, 11, 100, released=100) == (11, 100)
+
+
+def test_stale_balance_leaves_the_order_to_the_server():
+    account = funded_account(1000, max_age=60)
+    account.summary_updated_at -= 61
+    assert OrderValidator(account).validate(MARKET, 20, 100) == (20, 100)
+
+
+def test_unknown_balance_allows_the_order():
+    assert OrderValidator(AccountState(max_age=60)).validate(MARKET, 1, 100) == (1, 100)
+
+
+def test_validate_params():
+    params = {
+        "userOrder": {
+            "marketId": "market-1",
+            "orderType": "LIMIT",
+            "action": "BUY",
+            "quantity": "2",
+            "price": "103",
+        }
+    }
+    validated = OrderValidator().validate_params(params, MARKET)
+    assert validated["userOrder"]["quantity"] == 2
+    assert validated["userOrder"]["price"] == 100
+    # the passed params are not changed
+    assert params["userOrder"]["price"] == "103"
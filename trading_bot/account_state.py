@@ -0,0 +1,151 @@
+import logging
+import time
+
+from trading_bot.instrumentation import METRICS
+from trading_bot.market_store import channel_records
+
+logger = logging.getLogger(__file__)
+
+# event of the portfolio channel messages carrying the account summary
+PORTFOLIO_SUMMARY = "summary"
+
+
+class AccountState:
+    """
+    This class is keeping the balance and the positions of the account up to date with
+    the portfolio and the active_positions channels, so the checks before placing an order
+    don't need the userProfile or accountMarketStats requests, eg.
+
+        account = AccountState()
+        await channel_client.portfolio_join(on_message=account.on_portfolio)
+        ...
+        if account.can_afford(price * quantity):
+            ...
+
+    The portfolio channel sends the summary of the account, eg. available_balance and
+    the order liabilities, the fields are kept with the API field names, eg. availableBalance.
+    The positions are kept per market id, the latest record of the market replaces the previous.
+
+    The balance is reduced locally by the orders placed after the latest summary, they are
+    counted in the next summary sent by the server.
+
+    The summary is sent only when the balance changes, so a quiet account has an old balance
+    which is still valid. The balance older than max_age, or not received yet, is not checked,
+    the order is left to the server, and it's logged once until the next summary. The callers
+    can check how old the balance is with age and is_stale.
+    """
+
+    def __init__(self, max_age=None, metrics=METRICS):
+        """
+        :param max_age: seconds after which the received balance is too old to be checked,
+                        None to check it whatever its age is
+        :param metrics: Metrics object the channel counters are recorded in
+        """
+        self.max_age = max_age
+        self.metrics = metrics
+        self.summary = {}
+        self.positions = {}
+        # monotonic times of the latest summary and position updates, None if not received yet
+        self.summary_updated_at = None
+        self.positions_updated_at = None
+        # cost of the orders placed after the latest summary
+        self.__reserved = 0
+        # whether the orders allowed without checking the balance were logged since the summary
+        self.__unchecked_logged = False
+
+    async def on_portfolio(self, response):
+        """
+        This function is the consumer of the portfolio channel messages
+        """
+        data = response.get("data")
+        # only the summary messages carry the balance, eg. not the channel replies
+        if not data or len(data) < 5 or data[3] != PORTFOLIO_SUMMARY:
+            return
+        for record in channel_records(response):
+            self.summary.update(record)
+            self.__reserved = 0
+            self.summary_updated_at = time.monotonic()
+            self.__unchecked_logged = False
+            self.metrics.increment("account.summaries")
+
+    async def on_active_positions(self, response):
+        """
+        This function is the consumer of the active_positions channel messages
+        """
+        for record in channel_records(response):
+            market_id = record.get("marketId")
+            if market_id is None:
+                continue
+            self.positions.setdefault(market_id, {}).update(record)
+            self.positions_updated_at = time.monotonic()
+            self.metrics.increment("account.positions")
+
+    @property
+    def age(self):
+        # seconds since the latest summary, None if it's not received yet
+        if self.summary_updated_at is None:
+            return None
+        return time.monotonic() - self.summary_updated_at
+
+    @property
+    def is_fresh(self):
+        age = self.age
+        return age is not None and (self.max_age is None or age <= self.max_age)
+
+    @property
+    def is_stale(self):
+        # the balance is received but it's too old to be relied on
+        age = self.age
+        return age is not None and self.max_age is not None and age > self.max_age
+
+    @property
+    def available_balance(self):
+        """
+        This function is returning the available balance less the cost of the orders
+        placed after the latest summary, None if the balance is not received yet
+        """
+        balance = self.summary.get("availableBalance")
+        if balance is None:
+            return None
+        return balance - self.__reserved
+
+    def position(self, market_id):
+        """
+        This function is returning the position of the account in the market, 0 if there is none
+        """
+        return (self.positions.get(market_id) or {}).get("position") or 0
+
+    def get_position(self, market_id, default=None):
+        # the latest position record of the market
+        return self.positions.get(market_id, default)
+
+    def can_afford(self, cost):
+        """
+        This function is checking if the available balance covers the cost of the order,
+        if the balance is too old or not received yet the order is allowed and left to the server
+        :param cost: price * quantity of the order
+        """
+        if not self.is_fresh or self.available_balance is None:
+            if not self.__unchecked_logged:
+                if self.is_stale:
+                    logger.info(
+                        "The balance is %.0f seconds old, the orders are left to the server",
+                        self.age,
+                    )
+                else:
+                    logger.info("The balance is not received yet, the orders are not checked")
+                self.__unchecked_logged = True
+            return True
+        return cost <= self.available_balance
+
+    def reserve(self, cost):
+        """
+        This function is reducing the available balance by the cost of the placed order
+        """
+        self.__reserved += cost
+
+    def release(self, cost):
+        """
+        This function is returning the cost of the cancelled order to the available balance
+        """
+        self.__reserved = max(self.__reserved - cost, 0)
@@ -0,0 +1,181 @@
+import argparse
+import json
+import logging
+import time
+import tracemalloc
+
+from trading_bot.bot import TradingBot
+from trading_bot.instrumentation import METRICS, format_seconds
+from trading_bot.order_gateway import OrderGateway
+from trading_bot.replay import (
+    ReplayChannelClient,
+    SimulatedClient,
+    load_frames,
+    markets_from_frames,
+    synthetic_feed,
+)
+
+logger = logging.getLogger(__file__)
+
+
+# The benchmark runs the trading bot offline against the replayed market info messages
+# and the simulated API, and reports its throughput, latencies and memory usage,
+# so any change to the bot can be checked for the regressions without the live feed.
+#
+#   python -m trading_bot.benchmark                       # synthetic feed, max speed
+#   python -m trading_bot.benchmark --frames feed.jsonl   # recorded feed
+#   python -m trading_bot.benchmark --json results.json   # saving the results to compare
+
+# histograms reported by the benchmark
+REPORTED_LATENCIES = ("latency.frame", "latency.tick", "latency.decision", "latency.requote")
+
+
+def get_arguments():
+    parser = argparse.ArgumentParser(description="Offline benchmark of the trading bot.")
+    parser.add_argument(
+        "--frames", help="JSON lines file of the recorded market_info channel messages"
+    )
+    parser.add_argument(
+        "--markets", help="JSON file of the recorded marketInfos records, "
+        "if not provided the markets are built from the messages"
+    )
+    parser.add_argument(
+        "--synthetic-markets", type=int, default=200,
+        help="number of the generated markets when the frames are not provided"
+    )
+    parser.add_argument(
+        "--synthetic-frames", type=int, default=20000,
+        help="number of the generated messages when the frames are not provided"
+    )
+    parser.add_argument("--seed", type=int, default=0, help="seed of the generated feed")
+    parser.add_argument(
+        "--speed", type=float, default=None,
+        help="replay speed multiplier of the recorded pace, max speed if not provided"
+    )
+    parser.add_argument(
+        "--latency", type=float, default=5.0, help="simulated API latency in milliseconds"
+    )
+    parser.add_argument(
+        "--jitter", type=float, default=2.0, help="maximum random milliseconds added to latency"
+    )
+    parser.add_argument("--markets-count", type=int, default=50, help="number of traded markets")
+    parser.add_argument("--max-concurrency", type=int, default=4, help="order request workers")
+    parser.add_argument(
+        "--conflate-ms", type=float, default=None,
+        help="merge the market updates delivered every conflate-ms, 0 while the bot is busy"
+    )
+    parser.add_argument("--json", dest="json_path", help="file the results are written to")
+    return parser.parse_args()
+
+
+def run_benchmark(
+    markets,
+    frames,
+    markets_count=50,
+    max_concurrency=4,
+    speed=None,
+    latency=0.005,
+    jitter=0.002,
+    conflate_ms=None,
+):
+    """
+    This function is running the trading bot over the provided feed and returns the results
+    :param markets: list of the marketInfos records
+    :param frames: list of the market_info channel messages
+    :param markets_count: number of the markets traded by the bot
+    :param max_concurrency: maximum number of the order requests running at the same time
+    :param speed: None to replay as fast as possible, or the multiplier of the recorded pace
+    :param latency: simulated API latency in seconds
+    :param jitter: maximum random seconds added to the simulated latency
+    :param conflate_ms: conflation interval of the market updates, None to process every message
+    :return: dict of the benchmark results
+    """
+    client = SimulatedClient(markets, latency=latency, jitter=jitter)
+    bot = TradingBot(
+        client=client,
+        channel_client=ReplayChannelClient(frames, speed=speed),
+        # every gateway thread shares the simulated client, it is thread safe
+        gateway=OrderGateway(max_concurrency=max_concurrency, client_factory=lambda: client),
+        markets_count=markets_count,
+        conflate_ms=conflate_ms,
+        # the replay is over once the channel is closed
+        reconnect=False,
+    )
+    METRICS.reset()
+    tracemalloc.start()
+    started_at = time.perf_counter()
+    try:
+        bot.initiate("benchmark@example.com", "benchmark")
+        elapsed = time.perf_counter() - started_at
+        _, peak_memory = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    summary = METRICS.summary()
+    frames_count = summary["counters"].get("frames.received", {}).get("count", 0)
+    return {
+        "frames": frames_count,
+        "markets": len(markets),
+        "traded_markets": len(bot.strategies),
+        "elapsed": elapsed,
+        "frames_per_second": frames_count / elapsed if elapsed else None,
+        "updates_dispatched": summary["counters"].get("updates.dispatched", {}).get("count", 0),
+        "peak_memory": peak_memory,
+        "requests": dict(client.requests),
+        "latencies": {
+            name: summary["histograms"][name]
+            for name in REPORTED_LATENCIES
+            if name in summary["histograms"]
+        },
+    }
+
+
+def print_results(results):
+    print(f"Frames: {results['frames']} over {results['elapsed']:.2f}s")
+    print(f"Throughput: {results['frames_per_second']:.0f} frames/s")
+    print(f"Markets: {results['markets']}, traded: {results['traded_markets']}")
+    print(f"Dispatched updates: {results['updates_dispatched']}")
+    print(f"Peak memory: {results['peak_memory'] / 1024 / 1024:.2f} MiB")
+    print("Requests: " + ", ".join(f"{k}={v}" for k, v in sorted(results["requests"].items())))
+    for name, histogram in results["latencies"].items():
+        print(
+            f"{name}: count={histogram['count']} "
+            + " ".join(
+                f"{key}={format_seconds(histogram[key])}"
+                for key in ("mean", "p50", "p90", "p99", "max")
+            )
+        )
+
+
+def main():
+    args = get_arguments()
+    # the bot logs are not needed here, and formatting them would skew the results
+    logging.basicConfig(level=logging.WARNING)
+    if args.frames:
+        frames = load_frames(args.frames)
+        if args.markets:
+            with open(args.markets) as file:
+                markets = json.load(file)
+        else:
+            markets = markets_from_frames(frames)
+    else:
+        markets, frames = synthetic_feed(
+            args.synthetic_markets, args.synthetic_frames, seed=args.seed
+        )
+    results = run_benchmark(
+        markets,
+        frames,
+        markets_count=args.markets_count,
+        max_concurrency=args.max_concurrency,
+        speed=args.speed,
+        latency=args.latency / 1000,
+        jitter=args.jitter / 1000,
+        conflate_ms=args.conflate_ms,
+    )
+    print_results(results)
+    if args.json_path:
+        with open(args.json_path, "w") as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,66 +1,179 @@
 import asyncio
-import contextlib
 import logging
-import random
 
 from stxsdk import StxClient, Selection, StxChannelClient
 from stxsdk.exceptions import AuthenticationFailedException
-from trading_bot.exceptions import MarketsNotFoundException, OrderCreationFailure
+from trading_bot.exceptions import MarketsNotFoundException, SnapshotError
+from trading_bot.account_state import AccountState
+from trading_bot.conflation import MarketUpdateConflator
+from trading_bot.dispatcher import MarketUpdateDispatcher
+from trading_bot.eligibility import EligibleMarkets
+from trading_bot.instrumentation import METRICS
+from trading_bot.market_store import MARKET_UPDATED, MarketStore
+from trading_bot.order_book import OrderBooks
+from trading_bot.order_batcher import OrderBatcher
+from trading_bot.order_gateway import OrderGateway
+from trading_bot.order_tracker import OrderTracker
+from trading_bot.prepared_query import PreparedQuery
+from trading_bot.snapshot import MarketSnapshot, load_snapshot
+from trading_bot.strategy import MarketStrategy
+from trading_bot.supervisor import ChannelSupervisor
 
 logger = logging.getLogger(__file__)
 
-# globally initiated StxClient object
-CLIENT = StxClient()
-
-# globally initiated StxChannelClient object
-CHANNEL_CLIENT = StxChannelClient()
-
 
 class TradingBot:
     """
     The objective of this bot is to perform the following routine:
      - Get all the available markets from the API.
-     - Pick a random market.
-     - Extract the probability of the selected market.
-     - Generate a random probability cap between 0 and 10 to add into
-       the market current probability.
-       probability = current_probability + (current_probability * random.choice(range(11)) / 100)
-     - Generate the price using the generated probability and market's current max price.
-       price = max market price * probability
-     - Pick random quantity between 1 and 10
-       quantity = random.choice(range(11))
-     - Place an order with market id, price and quantity
-     - Initiate market channel and check if price shifts 5% either up down for that market.
+     - Pick random markets, as many as requested.
+     - For each picked market:
+       - Extract the probability of the market.
+       - Generate a random probability cap between 0 and 10 to add into
+         the market current probability.
+         probability = current_probability + (current_probability * random.choice(range(11)) / 100)
+       - Generate the price using the generated probability and market's current max price.
+         price = max market price * probability
+       - Pick random quantity between 1 and 10
+         quantity = random.choice(range(11))
+       - Place an order with market id, price and quantity
+     - Initiate market channel and check if price shifts 5% either up down for the picked markets.
        - Cancel the created order.
        - Post new order with new price.
+
+    Each picked market is traded by its own MarketStrategy object having its own order state,
+    while all of them share the same authenticated session, the same market info channel
+    connection and the same order gateway, so a single bot can trade many markets at once.
     """
 
-    order = None
-    markets = {}
-    market = None
+    def __init__(
+        self,
+        client=None,
+        channel_client=None,
+        gateway=None,
+        markets_count=1,
+        max_concurrency=4,
+        market_filters=(),
+        batch_window_ms=20,
+        batch_size=50,
+        conflate_ms=None,
+        reconnect=True,
+        max_downtime=60,
+        snapshot_path=None,
+        snapshot_max_age=3600,
+        market_table=False,
+        track_orders=True,
+        track_account=True,
+        account_max_age=60,
+    ):
+        """
+        :param client: StxClient object, created if not provided
+        :param channel_client: StxChannelClient object, created if not provided
+        :param gateway: OrderGateway object, created with max_concurrency workers if not provided
+        :param markets_count: number of the random markets to be traded
+        :param max_concurrency: maximum number of the order requests running at the same time
+        :param market_filters: functions deciding which markets can be picked, by default
+                               the markets having bids and probability greater than 0,
+                               checkout trading_bot.eligibility for the available filters
+        :param batch_window_ms: milliseconds to collect the order cancellations to be sent together
+        :param batch_size: maximum number of the order cancellations sent together
+        :param conflate_ms: if provided, the market updates are merged per market and delivered
+                            once every conflate_ms milliseconds, or whenever the strategies are
+                            idle if it's 0, by default every channel message is processed
+        :param reconnect: whether to join the market info channel again when it's disconnected,
+                          the open orders are kept while the bot is reconnecting
+        :param max_downtime: seconds after which the bot stops reconnecting and
+                             cancels the orders, None to reconnect forever
+        :param snapshot_path: path of the markets snapshot file, if provided the bot starts with
+                              the saved markets and fetches the fresh markets in the background,
+                              the markets are saved there once the bot is done
+        :param snapshot_max_age: seconds after which the saved markets are too old to start with
+        :param market_table: whether to keep the NumPy MarketTable of the markets for the
+                             vectorized screens, checkout trading_bot.market_table
+        :param track_orders: whether to follow the fills and cancellations of the orders with
+                             the active orders and trades channels, so the filled orders are not
+                             replaced and the cancelled ones are not cancelled again
+        :param track_account: whether to follow the balance and the positions of the account
+                              with the portfolio and active positions channels, so the orders
+                              over the available balance are not sent
+        :param account_max_age: seconds after which the received balance is too old to be checked
+        """
+        # StxClient object used for the authentication and the markets population
+        self.client = client if client is not None else StxClient()
+        # StxChannelClient object used for the market info channel
+        self.channel_client = channel_client if channel_client is not None else StxChannelClient()
+        self.markets_count = markets_count
+        self.markets = MarketStore()
+        # the marketInfos query is compiled once and reused by the populate and resync requests
+        self.market_infos = PreparedQuery("marketInfos", self.__get_market_selections())
+        # index of the markets which can be picked, kept up to date by the market store
+        self.eligible_markets = EligibleMarkets(*market_filters)
+        self.markets.add_index(self.eligible_markets)
+        # sorted bids and offers of the markets, kept up to date by the market store
+        self.order_books = OrderBooks()
+        self.markets.add_index(self.order_books)
+        # columns of the market fields, kept up to date by the market store
+        self.market_table = None
+        if market_table:
+            # NumPy is imported only when the table is requested
+            from trading_bot.market_table import MarketTable
 
-    @staticmethod
-    def __authenticate(email, password):
+            self.market_table = MarketTable()
+            self.markets.add_index(self.market_table)
+        # routes the market info channel updates to the strategies of the updated markets
+        self.dispatcher = MarketUpdateDispatcher(self.markets)
+        # merges the market updates received while the previous ones are being processed
+        self.conflator = None
+        if conflate_ms is not None:
+            self.conflator = MarketUpdateConflator(self.__dispatch_updates, interval_ms=conflate_ms)
+        # executes the order requests of all the strategies in the background threads
+        self.gateway = gateway or OrderGateway(max_concurrency=max_concurrency)
+        # batches the order cancellations of the strategies into cancelOrders requests
+        self.orders = OrderBatcher(self.gateway, window_ms=batch_window_ms, max_batch=batch_size)
+        # marketId to MarketStrategy object map of the picked markets
+        self.strategies = {}
+        # latest state of the placed orders, fed by the active orders and trades channels
+        self.order_tracker = OrderTracker() if track_orders else None
+        # balance and positions of the account, fed by the portfolio and active positions channels
+        self.account = AccountState(max_age=account_max_age) if track_account else None
+        self.reconnect = reconnect
+        self.max_downtime = max_downtime
+        self.snapshot_path = snapshot_path
+        self.snapshot_max_age = snapshot_max_age
+        # whether the markets are loaded from the snapshot and the fresh ones should be fetched
+        self.__stale_markets = False
+        # keeps the market info channel connected and resyncs the markets after the reconnection
+        self.supervisor = None
+        if reconnect:
+            self.supervisor = ChannelSupervisor(
+                self.channel_client,
+                "market_info",
+                on_message=self.on_market_info_update,
+                on_reconnect=self.resync_markets,
+                on_close=self.on_market_close,
+                on_error=self.on_market_error,
+                max_downtime=max_downtime,
+                refresh_auth=self.gateway.refresh_auth,
+            )
+
+    def __authenticate(self, email, password):
         """
         This function is authenticating the client with the provided credentials,
         and will raise the exception if authentication fails
         """
-        print("Executing bot user authentication.")
+        logger.info("Executing bot user authentication.")
         # using StxClient object to initiate the login
-        login_response = CLIENT.login(params={"email": email, "password": password})
+        login_response = self.client.login(params={"email": email, "password": password})
         # if the provided credentials are not correct it would get success False flag in response
         # with relative error message
         if not login_response["success"]:
-            logger.error(f"Failed to authenticate with the response: {login_response}")
+            logger.error("Failed to authenticate with the response: %s", login_response)
             raise AuthenticationFailedException(login_response["message"])
 
-    def __populate_markets(self):
-        """
-        This function is populating the bot markets by executing the marketInfos API
-        """
-        print("Initiating to populate the market data")
+    @staticmethod
+    def __get_market_selections():
         # making selection object of the required response fields
-        selections = Selection(
+        return Selection(
             "title",
             "shortTitle",
             "marketId",
@@ -72,139 +185,189 @@ class TradingBot:
             "eventStatus",
             "position",
             "price",
+            "timestampInt",
             bids=Selection("price", "quantity"),
             offers=Selection("price", "quantity"),
+            orderPriceRules=Selection("from", "inc", "to"),
         )
-        # executing the marketinfos API with the generated selection object
-        print("Executing the marketinfos API.")
-        market_data = CLIENT.marketInfos(selections=selections)
+
+    @staticmethod
+    def __get_market_data(market_data):
+        """
+        This function is extracting the markets from the marketInfos API response
+        """
         if not market_data["success"]:
             # if for any reason market info API fails, raise the exception
             msg = f"Failed to get markets with error: {market_data['errors']}"
             logger.error(msg)
             raise MarketsNotFoundException(msg)
-        else:
-            self.markets.clear()
-            market_data = market_data["data"]["marketInfos"]
-            print(f"Received {len(market_data)} markets.")
-            # storing the markets in the bot object to be randomly picked from
-            # am making marketId to market data map for quick accessing the market
-            # you can define your own data structure or store in database
-            # depending on your use case, you can also filter out the markets based
-            # on your preferences and requirements
-            self.markets = {market["marketId"]: market for market in market_data}
+        market_data = market_data["data"]["marketInfos"]
+        logger.info("Received %d markets.", len(market_data))
+        return market_data
 
-    def __pick_random_market(self):
+    def __populate_markets(self):
         """
-        This function is randomly picking a market from the available markets
+        This function is populating the bot markets by executing the marketInfos API,
+        or from the snapshot of the previous run if it's available
         """
-        print("Picking random market with the bids.")
-        # infinitely looping to pick the random market with bids available
-        while True:
-            # random.choice picks any element from the list in uniformly distributed manner
-            market = random.choice(list(self.markets.values()))
-            # set the picked market to bot object for order creation
-            # only if the market has bids available, and probability greater than 0
-            # you can set any other conditions based on your requirements
-            if market.get("bids") and market.get("probability") > 0:
-                self.market = market
-                print(
-                    f"The picked market is {market['shortTitle']}, having id {market['marketId']}"
-                )
-                # breaks the loop when the market is picked
-                break
+        logger.info("Initiating to populate the market data")
+        if self.snapshot_path:
+            snapshot = load_snapshot(self.snapshot_path, self.snapshot_max_age)
+            if snapshot is not None:
+                try:
+                    # only the markets eligible on the previous run are decoded by their keys,
+                    # so the start doesn't depend on the number of all the saved markets,
+                    # the rest of them are added by the resync in the background
+                    with snapshot:
+                        self.markets.load(
+                            [snapshot[market_id] for market_id in snapshot.group("eligible")]
+                        )
+                        age = snapshot.age
+                except (SnapshotError, KeyError) as exc:
+                    # falling back to the marketInfos API
+                    logger.warning("Failed to load the saved markets: %s", exc)
+                else:
+                    if self.eligible_markets:
+                        logger.info(
+                            "Loaded %d eligible markets saved %.0f seconds ago.",
+                            len(self.markets),
+                            age,
+                        )
+                        # the markets are brought up to date before the first orders are priced
+                        self.__stale_markets = True
+                        return
+                    logger.info("None of the saved markets is eligible.")
+        # executing the marketinfos API with the generated selection object
+        logger.info("Executing the marketinfos API.")
+        market_data = self.__get_market_data(
+            self.market_infos(self.client)
+        )
+        # storing the markets in the bot object to be randomly picked from
+        # the market store is making marketId to market data map for quick accessing
+        # the market, and it keeps the markets up to date with the market info channel
+        # deltas, so the markets are fetched only once on the bot start
+        # you can define your own data structure or store in database
+        # depending on your use case, you can also filter out the markets based
+        # on your preferences and requirements
+        self.markets.load(market_data)
+        self.save_snapshot()
 
-    def __extract_market_probability(self):
+    def save_snapshot(self):
         """
-        This function is returning the probability of the selected market
+        This function is saving the current markets to the snapshot file, so the next run
+        can start with them without waiting for the marketInfos API
         """
-        print("Getting the market probability.")
-        # returns the market's probability
-        return self.market["probability"]
+        if not self.snapshot_path:
+            return
+        try:
+            count = MarketSnapshot.save(
+                self.snapshot_path,
+                self.markets.values(),
+                groups={"eligible": list(self.eligible_markets)},
+            )
+            logger.info("Saved %d markets to %s.", count, self.snapshot_path)
+        except OSError as exc:
+            logger.error("Failed to save the markets snapshot with exception: %s", exc)
 
-    def __compute_price(self):
+    async def resync_markets(self, market_ids=None):
         """
-        This function is computing the price using the market's current probability
-        on which the order would be placed.
+        This function is fetching the fresh markets, eg. after the market info channel
+        is connected again or when the bot is started with the saved markets, the missed updates
+        are merged into the stored markets and the price changes of the picked markets
+        are passed to their strategies
+        :param market_ids: ids of the markets to be fetched, all the markets by default
         """
-        # extract the current probability of the picked market
-        probability = self.__extract_market_probability()
-        print(
-            f"Computing the price for order creation, market current probability is {probability}"
-        )
-        # get random probability cap between 0 and 10 to add into the market current probability
-        probability_cap = random.choice(range(11))
-        # increasing the probability by the percent of the computed cap
-        probability += probability * probability_cap / 100
-        print(f"Generated probability is {probability}")
-        # get the max price of all the bids
-        max_market_price = max(bid["price"] for bid in self.market["bids"])
-        # price = integer type (max market price * computed probability)
-        # type casting to int, because following command will return as float
-        # and the price should be integer type
-        price = int(max_market_price * probability)
-        print(f"Computed price is {price}")
-        return price
+        query = self.market_infos
+        if market_ids is not None:
+            logger.info("Resyncing %d markets.", len(market_ids))
+            query = PreparedQuery(
+                "marketInfos",
+                self.__get_market_selections(),
+                params={"input": {"marketIds": list(market_ids)}},
+            )
+        else:
+            logger.info("Resyncing the markets.")
+        # the request runs on the gateway threads, so the event loop is not blocked
+        market_data = self.__get_market_data(await self.gateway.execute_query(query))
+        prices = {
+            market_id: self.markets[market_id].get("price") for market_id in self.strategies
+        }
+        for market in self.markets.sync(market_data):
+            market_id = market["marketId"]
+            strategy = self.strategies.get(market_id)
+            if strategy is not None and market.get("price") != prices[market_id]:
+                # same as the channel delta of the price change
+                await strategy.on_market_update(
+                    MARKET_UPDATED, {"market_id": market_id, "price": market.get("price")}
+                )
 
-    @staticmethod
-    def __get_quantity():
-        # returns random quantity between 1 and 10
-        return random.choice(range(1, 11))
+    async def __finish_resync(self):
+        """
+        This function is fetching all the markets after the bot is started with the saved ones,
+        the markets which are not eligible are added to the store by it
+        """
+        try:
+            await self.resync_markets()
+        except Exception as exc:
+            # the picked markets are already fresh, the rest are resynced on the next reconnection
+            logger.error("Failed to resync the markets with exception: %s", exc)
+        else:
+            self.__stale_markets = False
 
-    def __create_order(self, market_id, quantity, price):
+    def __pick_random_markets(self):
         """
-        This function is posting a new order with the provided details
-        :param market_id: unique ID of the market
-        :param quantity: quantity of the shares to be purchased
-        :param price: the price at which the shares would be purchased
+        This function is randomly picking the markets from the eligible markets
+        and creates the strategy objects for them
         """
-        print(
-            f"Initiating to create the order for market id: {market_id}, "
-            f"with price: {price} and quantity: {quantity}."
-        )
-        # generate the request params for order creation
-        params = {
-            "userOrder": {
-                "marketId": market_id,
-                "orderType": "LIMIT",
-                "action": "BUY",
-                "quantity": quantity,
-                "price": price,
-            }
-        }
-        # request the confirmOrder API to post the order
-        order_response = CLIENT.confirmOrder(params=params)
-        # if the response is not successful raise the exception
-        if not order_response["success"]:
-            msg = f"Order creating failed with error {order_response['message']}"
-            logger.error(msg)
-            raise OrderCreationFailure(msg)
-        # if order created successfully then set the order data to the bot object
-        order = order_response["data"]["confirmOrder"]['order']
-        order_total = order['quantity'] * order["price"]
-        print(
-            f"Order is created with id: {order['id']} and total price is {order_total}"
-        )
-        self.order = order
+        logger.info("Picking %d random markets with the bids.", self.markets_count)
+        # the eligible markets index raises MarketsNotFoundException if there is no eligible market
+        for market_id in self.eligible_markets.sample(self.markets_count):
+            market = self.markets[market_id]
+            logger.info(
+                "The picked market is %s, having id %s", market["shortTitle"], market_id
+            )
+            self.strategies[market_id] = MarketStrategy(
+                market,
+                self.orders,
+                self.order_books[market_id],
+                tracker=self.order_tracker,
+                account=self.account,
+            )
 
-    def __cancel_order(self):
+    async def __start_strategy(self, strategy):
         """
-        This function is cancelling the order using cancelOrder API
+        This function is posting the initial order of the market and subscribing
+        the strategy to the updates of its market
         """
-        if not self.order:
+        try:
+            await strategy.start()
+        except Exception as exc:
+            # if the initial order fails, the market is left out and the others keep trading
+            logger.error(
+                "Failed to start trading market %s with exception: %s", strategy.market_id, exc
+            )
+            await strategy.stop()
             return
-        print(f"Cancelling the order with id {self.order['id']}")
-        # generate the request params for cancelling the order
-        params = {"orderId": self.order["id"]}
-        CLIENT.cancelOrder(params=params)
-        # resetting the bot current order to None after cancelling the order
-        self.order = None
+        self.dispatcher.subscribe(strategy.market_id, strategy.on_market_update)
+
+    async def __stop_strategies(self):
+        """
+        This function is stopping all the strategies and cancels all the orders at once
+        """
+        for market_id in list(self.strategies):
+            self.dispatcher.unsubscribe(market_id)
+        await asyncio.gather(
+            *(strategy.stop(cancel=False) for strategy in self.strategies.values()),
+            return_exceptions=True,
+        )
+        # a single cancelAllOrders request instead of a cancelOrder request per market
+        await self.orders.cancel_all_orders()
 
     async def on_market_info_update(self, response):
         """
         This function will be called whenever there is an update to a market.
-        It checks if the update is happened to the market which we placed order for
-        If market id matches, checkout for the price shift, if the shift is 5% up or down.
+        It passes the updates of the markets which we placed orders for to their strategies,
+        the strategy checks for the price shift, if the shift is 5% up or down.
         Cancel the order and post new order with new price.
 
         Sample channel response:
@@ -234,78 +397,128 @@ class TradingBot:
         }
 
         the data key contains the server response
-        data is a list, where 3rd element is the message event for example when market gets updated
+        data is a list, where 4th element is the message event for example when market gets updated
         it will be 'market_updated', when new market created it will be 'market_created'
-        the 4th element is the market data, this market data will have mandatory
-        'market_id' and 'timestamp' fields indicating what market change and when with only the changed fields
+        the 5th element is the market data, a market_id to market data map that can have updates
+        of many markets at once, each market data will have mandatory 'market_id' and 'timestamp'
+        fields indicating what market change and when with only the changed fields
         """
         try:
-            data = response["data"]
-            market_response_type = data[3]
-            market_response_data = data[4]
-            # suppressing the StopIteration exception to pass the empty response data
-            with contextlib.suppress(StopIteration):
-                # getting the market data from the response, response is a dictionary
-                # using next with iter to get the first element of the response dict
-                # next raises StopIteration exception if empty iter is provided
-                # the above context is suppressing this case
-                market_data = market_response_data[next(iter(market_response_data))]
-                # checking if the server message is for market update
-                # also if the update happened for the market we placed order on
-                if (
-                    market_response_type == "market_updated"
-                    and market_data["market_id"] == self.market["marketId"]
-                ):
-                    print("The market has been updated.")
-                    # market data will only have those fields that are updated
-                    market_latest_price = market_data.get("price")
-                    # if the market data has price field, it means the market price is shifted
-                    if market_latest_price:
-                        order_price = self.order["price"]
-                        print(
-                            f"The market price is changed, old price: {order_price}, new price: {market_latest_price}"
-                        )
-                        # get the 5% max and min price cap of the order's price
-                        max_shift = order_price + (order_price * 5 / 100)
-                        min_shift = order_price - (order_price * 5 / 100)
-                        # checking if the latest price is between the price shift cap
-                        if max_shift > market_latest_price < min_shift:
-                            print("A price shift of 5% up/down is detected. Cancelling the order.")
-                            # cancel the order and post the new order with new price for the same market
-                            self.__cancel_order()
-                            quantity = self.__get_quantity()
-                            print("Posting the new order with the latest market price.")
-                            self.__create_order(
-                                self.market["marketId"], quantity, market_latest_price
-                            )
+            # the dispatcher merges every market update of the message into the stored markets
+            # and passes the update of each picked market to its strategy
+            METRICS.increment("frames.received")
+            if self.conflator is not None:
+                # the updates are merged and dispatched by the conflator
+                await self.conflator(response)
+                return
+            with METRICS.timer("latency.frame"):
+                dispatched = await self.dispatcher.dispatch(response)
+            METRICS.increment("updates.dispatched", dispatched)
         except Exception as exc:
-            # if any general exception occurs, cancel the order if any posted
-            print(f"The bot operation failed with exception: {exc}")
-            if self.order:
-                self.__cancel_order()
+            logger.exception("The bot operation failed with exception: %s", exc)
+
+    async def __dispatch_updates(self, event, market_updates):
+        """
+        This function is dispatching the merged market updates delivered by the conflator
+        """
+        with METRICS.timer("latency.tick"):
+            dispatched = await self.dispatcher.dispatch_updates(event, market_updates)
+        METRICS.increment("updates.dispatched", dispatched)
 
     async def on_market_close(self, response=None):
-        print(f"Market channel has been closed with response: {response}")
-        print("Cancelling the order.")
-        self.__cancel_order()
+        logger.info("Market channel has been closed with response: %s", response)
 
     async def on_market_error(self, response=None):
-        print(f"Faced an exception or error with response: {response}")
-        print("Cancelling the order.")
-        self.__cancel_order()
+        logger.error("Faced an exception or error with response: %s", response)
+
+    async def on_account_close(self, response=None):
+        logger.info("Account channel has been closed with response: %s", response)
 
-    def initiate_market_info_channel(self):
+    def __join_account_channels(self):
         """
-        This function is initiating the market info channel to check for the price shifts
-        here we are using asyncio for asynchronous communication with the server
+        This function is connecting with the channels of the account in the background,
+        the active orders and trades channels update the order tracker and
+        the portfolio and active positions channels update the account state
+        :return: list of the channel tasks, they are cancelled once the bot is done
         """
-        asyncio.run(
-            CHANNEL_CLIENT.market_info_join(
-                on_message=self.on_market_info_update,
-                on_close=self.on_market_close,
-                on_error=self.on_market_error,
+        consumers = {}
+        if self.order_tracker is not None:
+            consumers["active_orders"] = self.order_tracker.on_active_orders
+            consumers["active_trades"] = self.order_tracker.on_active_trades
+        if self.account is not None:
+            consumers["portfolio"] = self.account.on_portfolio
+            consumers["active_positions"] = self.account.on_active_positions
+        tasks = []
+        for channel_name, consumer in consumers.items():
+            if self.reconnect:
+                join = ChannelSupervisor(
+                    self.channel_client,
+                    channel_name,
+                    on_message=consumer,
+                    on_close=self.on_account_close,
+                    on_error=self.on_market_error,
+                    max_downtime=self.max_downtime,
+                    refresh_auth=self.gateway.refresh_auth,
+                ).run()
+            else:
+                join = getattr(self.channel_client, f"{channel_name}_join")(
+                    on_message=consumer,
+                    on_close=self.on_account_close,
+                    on_error=self.on_market_error,
+                )
+            tasks.append(asyncio.create_task(join))
+        return tasks
+
+    async def run(self):
+        """
+        This function is starting the strategies of the picked markets and connects with
+        the market info channel to check for the price shifts, once the channel
+        is closed all the strategies are stopped and their orders are cancelled
+        """
+        refresh_task = None
+        if self.__stale_markets:
+            # fetching the fresh picked markets while the account channels are joined
+            refresh_task = asyncio.create_task(self.resync_markets(list(self.strategies)))
+        # joined before the orders are posted, so their first updates are not missed
+        account_channels = self.__join_account_channels()
+        resync_task = None
+        try:
+            if refresh_task is not None:
+                # the saved markets can be up to snapshot_max_age old, the orders are never
+                # priced from them, the picked markets are updated in place by the resync
+                await refresh_task
+                # the rest of the markets are fetched while the strategies are trading
+                resync_task = asyncio.create_task(self.__finish_resync())
+            # posting the initial orders of all the markets concurrently
+            await asyncio.gather(
+                *(self.__start_strategy(strategy) for strategy in self.strategies.values())
             )
-        )
+            # connecting with the market info channel to look out for the price shift
+            if self.supervisor is not None:
+                # the channel is joined again whenever it's disconnected
+                await self.supervisor.run()
+            else:
+                await self.channel_client.market_info_join(
+                    on_message=self.on_market_info_update,
+                    on_close=self.on_market_close,
+                    on_error=self.on_market_error,
+                )
+        finally:
+            if self.conflator is not None:
+                # dispatching the updates received before the channel is closed
+                await self.conflator.close()
+            logger.info("Cancelling the orders.")
+            await self.__stop_strategies()
+            for task in account_channels:
+                task.cancel()
+            await asyncio.gather(*account_channels, return_exceptions=True)
+            for task in (refresh_task, resync_task):
+                if task is not None and not task.done():
+                    task.cancel()
+            if not self.__stale_markets:
+                # the markets are up to date with the channel deltas, saving them for the next run,
+                # unless they are still only the saved eligible ones
+                self.save_snapshot()
 
     def initiate(self, email, password):
         """
@@ -315,19 +528,14 @@ class TradingBot:
         self.__authenticate(email, password)
         # Populates the available markets using the market API.
         self.__populate_markets()
-        # Randomly pick a market to which the order will be placed
-        self.__pick_random_market()
-        # compute the price on which the order will be placed
-        price = self.__compute_price()
-        # get the quantity of the shares for the order
-        quantity = self.__get_quantity()
-        # Post the order with the generated quantity and price
+        # Randomly pick the markets to which the orders will be placed
+        self.__pick_random_markets()
         try:
-            self.__create_order(self.market["marketId"], quantity, price)
-            # connecting with the market info channel to look out for the price shift
-            self.initiate_market_info_channel()
+            # here we are using asyncio for asynchronous communication with the server
+            asyncio.run(self.run())
         except Exception as exc:
-            # if any general exception occurs, cancel the order if any posted
-            print(f"The bot operation failed with exception: {exc}")
-            if self.order:
-                self.__cancel_order()
+            logger.exception("The bot operation failed with exception: %s", exc)
+        finally:
+            # stopping the order gateway threads once the bot is done
+            self.gateway.shutdown()
+            METRICS.log_summary()
@@ -0,0 +1,130 @@
+import logging
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from stxsdk import StxClient
+from stxsdk.utils import format_failure_response
+
+from trading_bot.instrumentation import METRICS
+
+logger = logging.getLogger(__file__)
+
+# The lookups which take a single id, the name of the StxClient operation and of its id param
+LOOKUPS = {
+    "order_trades": ("myTradesForOrder", "orderId"),
+    "market_settlements": ("marketSettlements", "marketId"),
+}
+
+
+def bulk_lookup(
+    operation,
+    param_name,
+    ids,
+    max_concurrency=8,
+    timeout=None,
+    params=None,
+    selections=None,
+    client_factory=StxClient,
+):
+    """
+    This function is running the same lookup for many ids at once on a bounded thread pool
+    and yields the responses as they are completed, eg.
+
+        for order_id, response in bulk_lookup("myTradesForOrder", "orderId", order_ids):
+            ...
+
+    StxClient object is not safe to be shared between threads, so each worker thread creates
+    its own client object, they share the same authenticated session.
+    The response of the failed or timed out lookup is the failure response, so a single
+    failure doesn't stop the other lookups.
+    :param operation: name of the StxClient operation, eg. myTradesForOrder
+    :param param_name: name of the id param of the operation, eg. orderId
+    :param ids: iterable of the ids, the duplicates are looked up once
+    :param max_concurrency: maximum number of the requests running at the same time
+    :param timeout: seconds after which the running request is given up, None to wait forever
+    :param params: other params of the operation, the same for all the ids
+    :param selections: Selection object of the required response fields
+    :param client_factory: callable that creates the client object for the worker threads
+    :return: generator of the (id, response) tuples in the order of completion
+    """
+    local = threading.local()
+    # id to the time its request started, the timeout is counted from there,
+    # not from the time it's queued
+    started = {}
+
+    def lookup(value):
+        client = getattr(local, "client", None)
+        if client is None:
+            client = local.client = client_factory()
+        started[value] = time.monotonic()
+        METRICS.increment(f"requests.{operation}")
+        with METRICS.timer(f"latency.{operation}"):
+            return getattr(client, operation)(
+                params={**(params or {}), param_name: value}, selections=selections
+            )
+
+    pending_ids = iter(dict.fromkeys(ids))
+    executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="bulk-lookup")
+    # future to id map of the submitted lookups, at most max_concurrency of them, the next id
+    # is submitted once a lookup is completed, so the ids are not all queued at once
+    futures = {}
+
+    def submit():
+        value = next(pending_ids, None)
+        if value is not None:
+            futures[executor.submit(lookup, value)] = value
+
+    try:
+        for _ in range(max_concurrency):
+            submit()
+        while futures:
+            wait_timeout = None
+            if timeout is not None:
+                starts = [started[value] for value in futures.values() if value in started]
+                # the lookups still queued behind the timed out ones are checked again later
+                wait_timeout = max(min(starts) + timeout - time.monotonic(), 0) if starts else timeout
+            done, _ = wait(futures, timeout=wait_timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                value = futures.pop(future)
+                try:
+                    response = future.result()
+                except Exception as exc:
+                    logger.error("The %s lookup of %s failed with exception: %s", operation, value, exc)
+                    response = format_failure_response(errors=[str(exc)], message=str(exc))
+                submit()
+                yield value, response
+            if timeout is None:
+                continue
+            now = time.monotonic()
+            for future, value in list(futures.items()):
+                if value in started and now - started[value] >= timeout and not future.done():
+                    # the request can't be interrupted, its thread is released once it's completed
+                    del futures[future]
+                    METRICS.increment(f"timeouts.{operation}")
+                    message = f"The {operation} lookup of {value} timed out after {timeout} seconds."
+                    logger.error(message)
+                    submit()
+                    yield value, format_failure_response(errors=[message], message=message)
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def order_trades(order_ids, **options):
+    """
+    This function is looking up the trades of the orders with myTradesForOrder API,
+    checkout bulk_lookup for the options
+    :param order_ids: iterable of the order ids
+    :return: generator of the (order id, response) tuples in the order of completion
+    """
+    return bulk_lookup(*LOOKUPS["order_trades"], order_ids, **options)
+
+
+def market_settlements(market_ids, **options):
+    """
+    This function is looking up the settlements of the markets with marketSettlements API,
+    checkout bulk_lookup for the options
+    :param market_ids: iterable of the market ids
+    :return: generator of the (market id, response) tuples in the order of completion
+    """
+    return bulk_lookup(*LOOKUPS["market_settlements"], market_ids, **options)
@@ -0,0 +1,133 @@
+import asyncio
+import logging
+import time
+
+from trading_bot.instrumentation import METRICS
+from trading_bot.market_store import MARKET_CREATED
+
+logger = logging.getLogger(__file__)
+
+
+def merge_deltas(pending, delta):
+    """
+    This function is merging the market delta into the pending delta of the same market,
+    the fields of the newer delta win, so the merged delta has the latest value of every
+    field changed by any of them
+    :param pending: delta waiting to be delivered, it is updated in place
+    :param delta: received delta of the market
+    :return: the merged delta
+    """
+    if (delta.get("unix_timestamp") or 0) >= (pending.get("unix_timestamp") or 0):
+        pending.update(delta)
+        return pending
+    # the received delta is older than the pending one (eg. late delivery),
+    # so only its fields which are not changed by the pending delta are taken
+    merged = dict(delta)
+    merged.update(pending)
+    return merged
+
+
+class MarketUpdateConflator:
+    """
+    This class is conflating the market_info channel updates, so the consumer gets
+    at most one update per market in every delivery, no matter how many deltas of the
+    market were received in between.
+
+    The received deltas are merged per market_id into the pending updates. The pending
+    updates are delivered once per tick interval, or if the interval is 0, right away when
+    the consumer is idle, while the consumer is busy the new deltas keep merging and are
+    delivered together after it's done. So during bursts the work of the consumer
+    is bounded by the number of the updated markets rather than the message rate.
+
+    The conflator object is passed as on_message consumer of the market_info channel,
+    the consumer is called with the event and the market_id to merged update map,
+    the same as MarketUpdateDispatcher.dispatch_updates.
+    """
+
+    def __init__(self, consumer, interval_ms=0, metrics=METRICS):
+        """
+        :param consumer: async function called with the event and the market updates map
+        :param interval_ms: milliseconds between the deliveries, 0 to deliver
+                            whenever the consumer is idle
+        :param metrics: Metrics object the conflation counters are recorded in
+        """
+        self.consumer = consumer
+        self.interval = interval_ms / 1000
+        self.metrics = metrics
+        # market_id to [event, merged delta] of the updates waiting to be delivered
+        self.__pending = {}
+        self.__received = asyncio.Event()
+        self.__task = None
+        self.__closed = False
+
+    @property
+    def pending(self):
+        return len(self.__pending)
+
+    def start(self):
+        if self.__task is None:
+            self.__task = asyncio.create_task(self.__deliver())
+
+    async def __call__(self, response):
+        """
+        This function is merging the market updates of the channel message into the pending updates
+        :param response: message passed by the listener of the market info channel
+        """
+        data = response.get("data")
+        # only the market messages have the market updates as 5th element of the data
+        if not data or len(data) < 5 or not isinstance(data[4], dict):
+            return
+        self.start()
+        event, market_updates = data[3], data[4]
+        for market_id, delta in market_updates.items():
+            pending = self.__pending.get(market_id)
+            if pending is None:
+                # copying the delta, so merging doesn't change the received message
+                self.__pending[market_id] = [event, dict(delta)]
+                continue
+            # a created market stays created until it's delivered
+            if event == MARKET_CREATED:
+                pending[0] = event
+            pending[1] = merge_deltas(pending[1], delta)
+            self.metrics.increment("updates.conflated")
+        self.metrics.increment("updates.received", len(market_updates))
+        self.__received.set()
+
+    async def __deliver(self):
+        delivered_at = time.monotonic()
+        while True:
+            await self.__received.wait()
+            if self.interval:
+                # waiting for the rest of the tick, the deltas received meanwhile are merged
+                delay = self.interval - (time.monotonic() - delivered_at)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            self.__received.clear()
+            pending, self.__pending = self.__pending, {}
+            delivered_at = time.monotonic()
+            await self.__flush(pending)
+            if self.__closed and not self.__pending:
+                break
+
+    async def __flush(self, pending):
+        # grouping the updates by the event, the consumer is called once per event
+        events = {}
+        for market_id, (event, delta) in pending.items():
+            events.setdefault(event, {})[market_id] = delta
+        for event, market_updates in events.items():
+            try:
+                await self.consumer(event, market_updates)
+            except Exception as exc:
+                logger.exception("Failed to deliver the market updates with exception: %s", exc)
+
+    async def close(self):
+        """
+        This function is delivering the pending updates and stops the delivery task
+        """
+        self.__closed = True
+        if self.__task is None:
+            return
+        # waking up the delivery task, it finishes after delivering the pending updates
+        self.__received.set()
+        await self.__task
+        self.__task = None
@@ -0,0 +1,114 @@
+import logging
+
+from trading_bot.market_store import MARKET_CREATED, MARKET_UPDATED
+
+logger = logging.getLogger(__file__)
+
+
+class MarketUpdateDispatcher:
+    """
+    This class is routing the market_info channel messages to the consumers
+    which are subscribed to the updated markets.
+
+    A single channel message can carry updates of many markets at once,
+    the dispatcher walks every market update of the message once and passes it
+    to the handlers registered for that market_id. Handlers are kept in a
+    market_id to handlers index, so routing an update doesn't depend on how many
+    markets are being watched.
+
+    If a market store is provided, every update is merged into the store before
+    it is dispatched, and the updates which are older than the stored state are not dispatched.
+
+    A handler that raises is logged and the remaining handlers and updates of the message
+    are still dispatched, so one failing consumer can't stall the others.
+    """
+
+    def __init__(self, market_store=None):
+        """
+        :param market_store: optional MarketStore object to keep up to date with the updates
+        """
+        self.market_store = market_store
+        self.__handlers = {}
+
+    def subscribe(self, market_id, handler):
+        """
+        This function is registering the handler for the updates of the market
+        :param market_id: unique ID of the market
+        :param handler: async function that would be called with the message event and market update
+        """
+        handlers = self.__handlers.setdefault(market_id, [])
+        if handler not in handlers:
+            handlers.append(handler)
+
+    def unsubscribe(self, market_id, handler=None):
+        """
+        This function is removing the handler of the market, if the handler is not
+        provided then all the handlers of the market are removed
+        :param market_id: unique ID of the market
+        :param handler: previously subscribed handler
+        """
+        handlers = self.__handlers.get(market_id)
+        if not handlers:
+            return
+        if handler is None or handlers == [handler]:
+            del self.__handlers[market_id]
+        elif handler in handlers:
+            handlers.remove(handler)
+
+    @property
+    def market_ids(self):
+        return list(self.__handlers)
+
+    async def dispatch(self, response):
+        """
+        This function is dispatching all the market updates of the channel message
+        :param response: message passed by the listener of the market info channel
+        :return: number of the market updates that were dispatched to the handlers
+        """
+        data = response.get("data")
+        # only the market messages have the market updates as 5th element of the data
+        # eg. connection replies or the closing messages don't have the market data
+        if not data or len(data) < 5 or not isinstance(data[4], dict):
+            return 0
+        return await self.dispatch_updates(data[3], data[4])
+
+    async def dispatch_updates(self, event, market_updates):
+        """
+        This function is walking every market update and passing it to the market's handlers
+        :param event: channel message event, eg. market_updated or market_created
+        :param market_updates: market_id to changed fields map sent by the channel
+        :return: number of the market updates that were dispatched to the handlers
+        """
+        dispatched = 0
+        # only the market data deltas are merged into the store
+        merge = self.market_store is not None and event in (MARKET_UPDATED, MARKET_CREATED)
+        for market_id, market_update in market_updates.items():
+            # a malformed update or a failing handler is logged and skipped, it must not
+            # abort the rest of the updates of the message or end the channel listener
+            if merge:
+                try:
+                    # merging the update into the store, None means the update is stale
+                    # or its market is unknown
+                    if self.market_store.apply_update(market_update, event) is None:
+                        continue
+                except Exception as exc:
+                    logger.exception(
+                        "Failed to merge the update of the market %s: %s", market_id, exc
+                    )
+                    continue
+            handlers = self.__handlers.get(market_id)
+            if not handlers:
+                continue
+            # iterating over a copy because the handler may unsubscribe itself
+            for handler in tuple(handlers):
+                try:
+                    await handler(event, market_update)
+                except Exception as exc:
+                    logger.exception(
+                        "The handler %s failed on the update of the market %s: %s",
+                        getattr(handler, "__qualname__", handler),
+                        market_id,
+                        exc,
+                    )
+            dispatched += 1
+        return dispatched
@@ -0,0 +1,131 @@
+import logging
+import random
+
+from trading_bot.exceptions import MarketsNotFoundException
+
+logger = logging.getLogger(__file__)
+
+
+# following are the market filters, each filter is a function that takes the market record
+# and returns True if the market is eligible, you can pass your own functions as well
+
+
+def has_bids(market):
+    # only the markets having bids available
+    return bool(market.get("bids"))
+
+
+def positive_probability(market):
+    # only the markets having probability greater than 0
+    return (market.get("probability") or 0) > 0
+
+
+def status_in(*statuses):
+    """
+    This function is returning the filter of the markets having one of the provided statuses
+    eg. status_in("open", "pre_open")
+    """
+    statuses = frozenset(statuses)
+    return lambda market: market.get("status") in statuses
+
+
+def event_status_in(*statuses):
+    """
+    This function is returning the filter of the markets having one of the provided event statuses
+    """
+    statuses = frozenset(statuses)
+    return lambda market: market.get("eventStatus") in statuses
+
+
+def min_liquidity(quantity):
+    """
+    This function is returning the filter of the markets whose bids have at least
+    the provided quantity in total
+    """
+    return lambda market: sum(bid["quantity"] for bid in market.get("bids") or ()) >= quantity
+
+
+# the filters used by the trading bot if the filters are not provided
+DEFAULT_FILTERS = (has_bids, positive_probability)
+
+
+class EligibleMarkets:
+    """
+    This class is an index of the markets which pass all the provided filters.
+
+    The index is attached to the market store, it is rebuilt when the store is loaded
+    and every market is checked again whenever its data is updated, so the index
+    always has the currently eligible markets without scanning all the markets.
+
+    Eligible market ids are kept in a list along with market id to list position map,
+    so adding, removing and picking a random market are all O(1).
+    """
+
+    def __init__(self, *filters):
+        """
+        :param filters: market filter functions, if not provided DEFAULT_FILTERS are used
+        """
+        self.filters = filters or DEFAULT_FILTERS
+        self.__market_ids = []
+        self.__positions = {}
+
+    def is_eligible(self, market):
+        return all(market_filter(market) for market_filter in self.filters)
+
+    def rebuild(self, markets):
+        """
+        This function is rebuilding the index from the provided markets
+        :param markets: iterable of the market records
+        """
+        self.__market_ids = [
+            market["marketId"] for market in markets if self.is_eligible(market)
+        ]
+        self.__positions = {
+            market_id: position for position, market_id in enumerate(self.__market_ids)
+        }
+
+    def refresh(self, market):
+        """
+        This function is checking the updated market and adds it to or removes it from the index
+        :param market: updated market record
+        """
+        market_id = market["marketId"]
+        if self.is_eligible(market):
+            if market_id not in self.__positions:
+                self.__positions[market_id] = len(self.__market_ids)
+                self.__market_ids.append(market_id)
+        elif market_id in self.__positions:
+            # moving the last market id to the removed market's position to remove it in O(1)
+            position = self.__positions.pop(market_id)
+            last_market_id = self.__market_ids.pop()
+            if last_market_id != market_id:
+                self.__market_ids[position] = last_market_id
+                self.__positions[last_market_id] = position
+
+    def choice(self):
+        """
+        This function is returning the id of a random eligible market
+        """
+        return self.sample(1)[0]
+
+    def sample(self, count):
+        """
+        This function is returning the ids of the random eligible markets,
+        if there are less eligible markets than the count, all of them are returned
+        :param count: number of the markets to be picked
+        """
+        if not self.__market_ids:
+            msg = "No market is available with the required filters."
+            logger.error(msg)
+            raise MarketsNotFoundException(msg)
+        # random.sample picks unique elements from the list in uniformly distributed manner
+        return random.sample(self.__market_ids, min(count, len(self.__market_ids)))
+
+    def __contains__(self, market_id):
+        return market_id in self.__positions
+
+    def __iter__(self):
+        return iter(self.__market_ids)
+
+    def __len__(self):
+        return len(self.__market_ids)
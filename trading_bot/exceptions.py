@@ -7,3 +7,19 @@ class MarketsNotFoundException(BaseCustomException):
 
 class OrderCreationFailure(BaseCustomException):
     pass
+
+
+class SnapshotError(BaseCustomException):
+    pass
+
+
+class OrderValidationError(OrderCreationFailure):
+    pass
+
+
+class HistoryExportError(BaseCustomException):
+    pass
+
+
+class PreparedQueryError(BaseCustomException):
+    pass
@@ -0,0 +1,237 @@
+import asyncio
+import collections
+import logging
+
+from trading_bot.conflation import merge_deltas
+from trading_bot.instrumentation import METRICS
+
+logger = logging.getLogger(__file__)
+
+# overflow policies of the frame queue, deciding what happens with the received message:
+#    block        once the queue is full the listener waits for the free space, so the socket
+#                 is read only as fast as the messages are consumed, nothing is lost
+#    drop_oldest  once the queue is full the oldest waiting message is dropped to make space
+#                 for the received one
+#    conflate     whenever a message having the same key is waiting, full queue or not,
+#                 the received message is merged into it, eg. a single merged update of each
+#                 market is kept, the messages without the key and the messages with new keys
+#                 block when the queue is full
+BLOCK = "block"
+DROP_OLDEST = "drop_oldest"
+CONFLATE = "conflate"
+POLICIES = (BLOCK, DROP_OLDEST, CONFLATE)
+
+
+def market_key(message):
+    """
+    This function is the conflation key of the market_info channel messages,
+    the message updating a single market is keyed by its event and market id,
+    the other messages are not conflated
+    """
+    data = message.get("data")
+    if not data or len(data) < 5 or not isinstance(data[4], dict) or len(data[4]) != 1:
+        return None
+    return data[3], next(iter(data[4]))
+
+
+def keep_latest(waiting, received):
+    # merge of the conflated messages which are full states, the received message replaces
+    # the waiting one
+    return received
+
+
+def merge_market_messages(waiting, received):
+    """
+    This function is the default merge of the conflated market_info messages, the market
+    payloads are deltas having only the changed fields, so the received delta is merged
+    into the waiting one instead of replacing it, eg. the price changed by the waiting
+    delta is kept when the received delta changes only the offers
+    :param waiting: waiting message of the market, checkout market_key
+    :param received: received message of the same market
+    """
+    market_id, delta = next(iter(received["data"][4].items()))
+    # the waiting delta is copied, the consumers might hold the waiting message
+    merged = merge_deltas(dict(waiting["data"][4][market_id]), delta)
+    data = list(received["data"])
+    data[4] = {market_id: merged}
+    return {**received, "data": data}
+
+
+class FrameQueue:
+    """
+    This class is a bounded asyncio queue of the channel messages with the overflow policy.
+    The messages are returned in the order they are received, a conflated message keeps the
+    position of the message it replaced, so a busy key doesn't starve the others.
+    """
+
+    def __init__(
+        self,
+        maxsize=1000,
+        policy=BLOCK,
+        key=market_key,
+        merge=merge_market_messages,
+        name="frames",
+        metrics=METRICS,
+    ):
+        """
+        :param maxsize: maximum number of the waiting messages
+        :param policy: overflow policy, one of the POLICIES
+        :param key: function returning the conflation key of the message, or None if the
+                    message can't be conflated, it's used by the conflate policy only
+        :param merge: function merging the waiting message with the received message
+                      of the same key, by default the market deltas are merged, keep_latest
+                      replaces the waiting message with the received one
+        :param name: name of the queue used in the metric names, eg. frames.market_info.dropped
+        :param metrics: Metrics object the queue metrics are recorded in
+        """
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown overflow policy {policy}, available: {POLICIES}")
+        self.maxsize = maxsize
+        self.policy = policy
+        self.key = key
+        self.merge = merge
+        self.name = name
+        self.metrics = metrics
+        self.dropped = 0
+        self.conflated = 0
+        self.closed = False
+        # key to message map in the received order, the messages without the conflation key
+        # are stored with a unique object as the key
+        self.__messages = collections.OrderedDict()
+        self.__condition = asyncio.Condition()
+
+    @property
+    def depth(self):
+        return len(self.__messages)
+
+    def __len__(self):
+        return len(self.__messages)
+
+    async def put(self, message):
+        """
+        This function is adding the received message to the queue according to the policy,
+        the message received or waiting for the free space once the queue is closed is ignored
+        :param message: channel message
+        """
+        key = self.key(message) if self.policy == CONFLATE else None
+        async with self.__condition:
+            # checked again after every wait, the queue could be closed or the message
+            # of the same key could be added meanwhile
+            while True:
+                if self.closed:
+                    return
+                if key is not None and key in self.__messages:
+                    self.__messages[key] = self.merge(self.__messages[key], message)
+                    self.conflated += 1
+                    self.metrics.increment(f"{self.name}.conflated")
+                    return
+                if len(self.__messages) < self.maxsize:
+                    break
+                if self.policy == DROP_OLDEST:
+                    self.__messages.popitem(last=False)
+                    self.dropped += 1
+                    self.metrics.increment(f"{self.name}.dropped")
+                else:
+                    await self.__condition.wait()
+            self.__messages[object() if key is None else key] = message
+            self.metrics.observe(f"{self.name}.depth", len(self.__messages))
+            self.__condition.notify_all()
+
+    async def get(self):
+        """
+        This function is returning the oldest waiting message, it waits if there is none,
+        None is returned once the queue is closed and all the messages are taken
+        """
+        async with self.__condition:
+            while not self.__messages:
+                if self.closed:
+                    return None
+                await self.__condition.wait()
+            _, message = self.__messages.popitem(last=False)
+            # waking up the listener waiting for the free space
+            self.__condition.notify_all()
+            return message
+
+    async def close(self):
+        """
+        This function is closing the queue, the received messages are ignored
+        while the waiting messages are still returned
+        """
+        async with self.__condition:
+            self.closed = True
+            self.__condition.notify_all()
+
+
+class FramePipeline:
+    """
+    This class is decoupling receiving the channel messages from consuming them.
+    The pipeline object is passed as on_message consumer of the channel, it only puts the
+    messages on the FrameQueue, while the pool of worker tasks passes them to the consumer.
+    So a slow consumer, eg. printing a large payload, doesn't delay reading from the socket,
+    and the overflow policy decides what happens when the consumer can't keep up.
+
+    A single worker consumes the messages in the received order, with many workers
+    the messages are consumed concurrently and might finish out of order.
+    """
+
+    def __init__(self, consumer, workers=1, **queue_options):
+        """
+        :param consumer: async function called with every channel message
+        :param workers: number of the worker tasks consuming the messages
+        :param queue_options: FrameQueue parameters, eg. maxsize, policy and key
+        """
+        self.consumer = consumer
+        self.workers = workers
+        self.queue = FrameQueue(**queue_options)
+        self.__tasks = []
+
+    @property
+    def depth(self):
+        return self.queue.depth
+
+    @property
+    def dropped(self):
+        return self.queue.dropped
+
+    @property
+    def conflated(self):
+        return self.queue.conflated
+
+    @property
+    def metrics(self):
+        return self.queue.metrics
+
+    def start(self):
+        """
+        This function is starting the worker tasks, it's called on the first message
+        if the pipeline is not started before
+        """
+        if not self.__tasks:
+            self.__tasks = [asyncio.create_task(self.__work()) for _ in range(self.workers)]
+
+    async def __call__(self, message):
+        self.start()
+        self.metrics.increment(f"{self.queue.name}.received")
+        await self.queue.put(message)
+
+    async def __work(self):
+        while True:
+            message = await self.queue.get()
+            if message is None:
+                break
+            try:
+                await self.consumer(message)
+            except Exception as exc:
+                # a failing message is skipped, so it doesn't stop the worker
+                logger.exception("Consumer of %s failed with exception: %s", self.queue.name, exc)
+            self.metrics.increment(f"{self.queue.name}.consumed")
+
+    async def close(self):
+        """
+        This function is closing the pipeline and waits until the workers consume
+        all the waiting messages
+        """
+        await self.queue.close()
+        if self.__tasks:
+            await asyncio.gather(*self.__tasks)
+            self.__tasks = []
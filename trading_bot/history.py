@@ -0,0 +1,369 @@
+import csv
+import json
+import logging
+import math
+import os
+import shutil
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from stxsdk import Selection, StxClient
+
+from trading_bot.exceptions import HistoryExportError
+from trading_bot.instrumentation import METRICS
+
+logger = logging.getLogger(__file__)
+
+# The account histories which can be exported, each of them is a paginated API:
+#   operation   StxClient operation returning the page
+#   field       response field having the records of the page
+#   selections  fields of the exported records, they are the CSV columns as well
+#   sort_by     sorting of the records, the oldest records first, so the new records are
+#               added to the last pages and the export can be resumed where it stopped
+#   watermark   field the export is resumed from, the sort field of the sorted histories
+HISTORIES = {
+    "orders": {
+        "operation": "myOrderHistory",
+        "field": "orders",
+        "selections": Selection(
+            "id",
+            "clientOrderId",
+            "marketId",
+            "action",
+            "orderType",
+            "price",
+            "quantity",
+            "filled",
+            "avgPrice",
+            "totalValue",
+            "status",
+            "insertedAt",
+            "time",
+        ),
+        "sort_by": {"name": "TIME", "direction": "ASC"},
+        "watermark": "time",
+    },
+    "trades": {
+        "operation": "myTradesHistory",
+        "field": "trades",
+        "selections": Selection(
+            "id",
+            "orderId",
+            "marketId",
+            "action",
+            "price",
+            "filled",
+            "remaining",
+            "premium",
+            "grossPnl",
+            "insertedAt",
+            "time",
+        ),
+        "sort_by": {"name": "TIME", "direction": "ASC"},
+        "watermark": "time",
+    },
+    "settlements": {
+        "operation": "mySettlementsHistory",
+        "field": "settlements",
+        "selections": Selection(
+            "id",
+            "marketId",
+            "type",
+            "quantity",
+            "openingPrice",
+            "closingPrice",
+            "grossPnl",
+            "realizedPnl",
+            "fee",
+            "insertedAt",
+            "insertedAtIso",
+        ),
+        # the settlements can't be sorted, they are exported in the order of the API, so the
+        # resumed export requests only the settlements settled since the last exported one
+        "sort_by": None,
+        # UNIX microseconds timestamp
+        "watermark": "insertedAt",
+    },
+}
+
+FORMATS = ("jsonl", "csv")
+
+# seconds added to the settledOn window of the resumed settlements export, the window is
+# counted back from the server's clock, so it covers the clocks being apart as well
+SETTLED_ON_MARGIN = 60
+
+
+class HistoryPages:
+    """
+    This class is walking the pages of the account history and yields the records one by one,
+    so the history of any size is exported with the memory of a few pages, eg.
+
+        for order in HistoryPages("orders", page_size=500):
+            ...
+
+    The first page tells the total count of the records, then the next pages are requested
+    ahead on the worker threads while the records of the current page are consumed, at most
+    prefetch pages are held at once.
+
+    StxClient object is not safe to be shared between threads, so each worker thread creates
+    its own client object, they share the same authenticated session.
+    """
+
+    def __init__(
+        self,
+        history,
+        page_size=500,
+        prefetch=4,
+        start_page=0,
+        params=None,
+        client_factory=StxClient,
+    ):
+        """
+        :param history: name of the history, one of HISTORIES
+        :param page_size: number of the records per request
+        :param prefetch: number of the pages requested ahead, 0 to request them one by one
+        :param start_page: page to start with, eg. to resume the export
+        :param params: extra params of the API, eg. the filter of the market ids
+        :param client_factory: callable that creates the client object for the worker threads
+        """
+        if history not in HISTORIES:
+            raise HistoryExportError(f"Unknown history {history}, choose from {list(HISTORIES)}")
+        self.history = HISTORIES[history]
+        self.page_size = page_size
+        self.prefetch = prefetch
+        self.start_page = start_page
+        self.params = params or {}
+        self.client_factory = client_factory
+        self.__local = threading.local()
+        # total count of the records, known once the first page is received
+        self.total_count = None
+
+    @property
+    def client(self):
+        client = getattr(self.__local, "client", None)
+        if client is None:
+            client = self.__local.client = self.client_factory()
+        return client
+
+    def fetch_page(self, page):
+        """
+        This function is requesting a page of the history
+        :param page: page number starting from 0
+        :return: tuple of the records of the page and the total count of the records
+        """
+        operation = self.history["operation"]
+        params = {**self.params, "pagination": {"page": page, "limit": self.page_size}}
+        if self.history["sort_by"]:
+            params["sortBy"] = self.history["sort_by"]
+        METRICS.increment(f"requests.{operation}")
+        with METRICS.timer(f"latency.{operation}"):
+            response = getattr(self.client, operation)(
+                params=params, selections=self.history["selections"]
+            )
+        if not response["success"]:
+            raise HistoryExportError(
+                f"Failed to get the page {page} of {operation}: {response['message']}"
+            )
+        data = response["data"][operation] or {}
+        return data.get(self.history["field"]) or [], data.get("totalCount")
+
+    def __iter__(self):
+        records, self.total_count = self.fetch_page(self.start_page)
+        yield from records
+        if len(records) < self.page_size:
+            return
+        if self.total_count is None or not self.prefetch:
+            # the number of the pages is unknown, requesting them one by one till the last one
+            page = self.start_page + 1
+            while True:
+                records, _ = self.fetch_page(page)
+                yield from records
+                if len(records) < self.page_size:
+                    return
+                page += 1
+        last_page = math.ceil(self.total_count / self.page_size) - 1
+        pages = iter(range(self.start_page + 1, last_page + 1))
+        with ThreadPoolExecutor(
+            max_workers=self.prefetch, thread_name_prefix="history"
+        ) as executor:
+            # the pages are requested in order and yielded in order
+            pending = deque(
+                executor.submit(self.fetch_page, page) for _, page in zip(range(self.prefetch), pages)
+            )
+            try:
+                while pending:
+                    records, _ = pending.popleft().result()
+                    page = next(pages, None)
+                    if page is not None:
+                        pending.append(executor.submit(self.fetch_page, page))
+                    yield from records
+            finally:
+                # the consumer stopped early, eg. on error, skipping the requested pages
+                for future in pending:
+                    future.cancel()
+
+
+def record_watermark(record, field):
+    """
+    This function is returning the value of the watermark field of the record, so the records
+    can be compared with the last exported one, the ISO-8601 times are parsed, because their
+    fractions of the second can have different lengths
+    :param record: exported or received record, the values of the CSV records are strings
+    :param field: watermark field of the history, checkout HISTORIES
+    :return: datetime or int, None if the record has no value of the field
+    """
+    value = record.get(field)
+    if value is None or value == "":
+        return None
+    if field == "time":
+        # python before 3.11 doesn't parse the Z suffix
+        return datetime.fromisoformat(value.replace("Z", "+00:00"))
+    return int(value)
+
+
+def read_export(path, file_format, field):
+    """
+    This function is reading the previous export to find where it stopped, the file is read
+    line by line, so the memory doesn't depend on the size of the export
+    :param path: path of the exported file
+    :param file_format: jsonl or csv
+    :param field: watermark field of the history, checkout HISTORIES
+    :return: tuple of the number of the exported records, the watermark of the newest record
+             and the ids of the records exported with that watermark
+    """
+    count, last_watermark, last_ids = 0, None, set()
+    if not os.path.exists(path):
+        return count, last_watermark, last_ids
+    with open(path, newline="") as file:
+        if file_format == "csv":
+            records = csv.DictReader(file)
+        else:
+            records = (json.loads(line) for line in file if line.strip())
+        for record in records:
+            count += 1
+            watermark = record_watermark(record, field)
+            if watermark is None:
+                continue
+            # the records of the sorted histories are in order, the newest one is the last,
+            # while the records of the history which can't be sorted are in any order
+            if last_watermark is None or watermark > last_watermark:
+                last_watermark, last_ids = watermark, set()
+            if watermark == last_watermark:
+                last_ids.add(str(record.get("id")))
+    return count, last_watermark, last_ids
+
+
+def settled_since(params, inserted_at):
+    """
+    This function is adding the settledOn filter of the settlements settled since the
+    inserted_at, the filter is a rolling window back from now, so it's counted in seconds
+    :param params: params of the mySettlementsHistory API
+    :param inserted_at: UNIX microseconds timestamp of the last exported settlement
+    :return: params having the settledOn filter
+    """
+    seconds = max(0, math.ceil(time.time() - inserted_at / 10 ** 6)) + SETTLED_ON_MARGIN
+    settled_on = {
+        "type": "ROLLING_WINDOW",
+        "rollingWindow": {"increment": "SECONDS", "value": seconds},
+    }
+    return {**params, "filter": {**params.get("filter", {}), "settledOn": settled_on}}
+
+
+class HistoryExporter:
+    """
+    This class is exporting the account history to a JSONL or CSV file, eg.
+
+        exporter = HistoryExporter("trades", "trades.jsonl")
+        exported = exporter.export()
+
+    The records are written to the file as they are received, page by page, so the memory
+    stays the same whatever the size of the history. If the file exists the export is
+    resumed from the watermark, the sort field of the newest exported record, it starts
+    from the page of that record and skips the records exported already, so an interrupted
+    export can be run again with the same arguments.
+    The history which can't be sorted, eg. the settlements, is requested with the settledOn
+    filter of the settlements settled since the watermark, its records arrive in any order,
+    so they are written to the partial file and added to the export once all of them are
+    received, an interrupted export never has a newer record than the ones not exported yet.
+    """
+
+    def __init__(self, history, path, file_format=None, resume=True, **page_options):
+        """
+        :param history: name of the history, one of HISTORIES
+        :param path: path of the exported file
+        :param file_format: jsonl or csv, by default it's taken from the file extension
+        :param resume: whether to continue the existing export, otherwise the file is replaced
+        :param page_options: options of the HistoryPages, eg. page_size or prefetch
+        """
+        self.history = history
+        self.path = path
+        self.file_format = file_format or os.path.splitext(path)[1].lstrip(".").lower()
+        if self.file_format not in FORMATS:
+            raise HistoryExportError(
+                f"Unsupported format {self.file_format}, choose from {list(FORMATS)}"
+            )
+        self.resume = resume
+        self.page_options = page_options
+
+    def export(self):
+        """
+        This function is exporting the records which are not exported yet
+        :return: number of the exported records
+        """
+        history = HISTORIES[self.history]
+        field = history["watermark"]
+        count, watermark, watermark_ids = 0, None, set()
+        pages = HistoryPages(self.history, **self.page_options)
+        if self.resume:
+            count, watermark, watermark_ids = read_export(self.path, self.file_format, field)
+        if count:
+            if history["sort_by"] is not None:
+                # the records are sorted by time, so the exported records fill the first pages,
+                # starting from the page of the last exported record
+                pages.start_page = count // pages.page_size
+            elif watermark is not None:
+                pages.params = settled_since(pages.params, watermark)
+            logger.info(
+                "Resuming the %s export after %d records from page %d.",
+                self.history,
+                count,
+                pages.start_page,
+            )
+        unsorted = history["sort_by"] is None
+        path = f"{self.path}.partial" if unsorted else self.path
+        fields = list(history["selections"].values)
+        exported = 0
+        with open(path, "a" if count and not unsorted else "w", newline="") as file:
+            if self.file_format == "csv":
+                writer = csv.DictWriter(file, fieldnames=fields, extrasaction="ignore")
+                if not count:
+                    writer.writeheader()
+                write = writer.writerow
+            else:
+
+                def write(record):
+                    file.write(json.dumps(record) + "\n")
+
+            for record in pages:
+                if watermark is not None:
+                    record_mark = record_watermark(record, field)
+                    # only the ids of the records having the watermark are kept, the older
+                    # records are skipped by the watermark itself
+                    if record_mark is None or record_mark < watermark or (
+                        record_mark == watermark and str(record.get("id")) in watermark_ids
+                    ):
+                        continue
+                write(record)
+                exported += 1
+        if unsorted:
+            if count:
+                with open(path, newline="") as partial, open(self.path, "a", newline="") as file:
+                    shutil.copyfileobj(partial, file)
+                os.remove(path)
+            else:
+                os.replace(path, self.path)
+        logger.info("Exported %d %s records to %s.", exported, self.history, self.path)
+        return exported
@@ -0,0 +1,201 @@
+import contextlib
+import logging
+import logging.handlers
+import queue
+import signal
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__file__)
+
+
+class Histogram:
+    """
+    This class is recording the observed values, eg. latencies in seconds.
+    The count, total, min and max are kept for all the values while the percentiles
+    are computed from the most recent values only, so the memory is bounded.
+    """
+
+    __slots__ = ("count", "total", "min", "max", "recent")
+
+    def __init__(self, size=2048):
+        """
+        :param size: number of the most recent values kept for the percentiles
+        """
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+        self.recent = deque(maxlen=size)
+
+    def observe(self, value):
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None or value < self.min else self.min
+        self.max = value if self.max is None or value > self.max else self.max
+        self.recent.append(value)
+
+    def percentile(self, percent):
+        """
+        This function is returning the percentile of the recent values
+        :param percent: percentile between 0 and 100, eg. 99
+        """
+        if not self.recent:
+            return None
+        values = sorted(self.recent)
+        index = min(len(values) - 1, int(len(values) * percent / 100))
+        return values[index]
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else None,
+            "min": self.min,
+            "p50": self.percentile(50),
+            "p90": self.percentile(90),
+            "p99": self.percentile(99),
+            "max": self.max,
+        }
+
+
+class Metrics:
+    """
+    This class is collecting the counters and the latency histograms of the bot,
+    eg. number of the processed frames, sent orders, cancellation and requote latencies.
+    Recording a metric is a dictionary lookup and an addition, so it's cheap enough
+    to be used for every channel message.
+    """
+
+    def __init__(self):
+        self.counters = {}
+        self.histograms = {}
+        self.started_at = time.monotonic()
+        self.__lock = threading.Lock()
+
+    def increment(self, name, value=1):
+        """
+        This function is incrementing the counter
+        :param name: name of the counter, eg. frames.processed
+        :param value: value to be added to the counter
+        """
+        # metrics are recorded from the event loop and from the gateway threads as well
+        with self.__lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe(self, name, value):
+        """
+        This function is recording the value in the histogram
+        :param name: name of the histogram, eg. latency.cancelOrder
+        :param value: observed value, latencies are recorded in seconds
+        """
+        with self.__lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.observe(value)
+
+    @contextlib.contextmanager
+    def timer(self, name):
+        """
+        This function is recording the time spent in the context in the histogram
+        :param name: name of the histogram
+        """
+        started_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started_at)
+
+    def summary(self):
+        """
+        This function is returning the counters with their rates per second
+        and the histograms summaries
+        """
+        with self.__lock:
+            elapsed = time.monotonic() - self.started_at
+            return {
+                "elapsed": elapsed,
+                "counters": {
+                    name: {"count": count, "rate": count / elapsed if elapsed else None}
+                    for name, count in self.counters.items()
+                },
+                "histograms": {
+                    name: histogram.summary() for name, histogram in self.histograms.items()
+                },
+            }
+
+    def log_summary(self, level=logging.INFO):
+        """
+        This function is logging the summary of the collected metrics
+        """
+        summary = self.summary()
+        logger.log(level, "Stats after %.1f seconds:", summary["elapsed"])
+        for name, counter in sorted(summary["counters"].items()):
+            logger.log(level, "  %s: %d (%.2f/s)", name, counter["count"], counter["rate"] or 0)
+        for name, histogram in sorted(summary["histograms"].items()):
+            logger.log(
+                level,
+                "  %s: count=%d mean=%s p50=%s p90=%s p99=%s max=%s",
+                name,
+                histogram["count"],
+                *(format_seconds(histogram[key]) for key in ("mean", "p50", "p90", "p99", "max")),
+            )
+
+    def reset(self):
+        with self.__lock:
+            self.counters.clear()
+            self.histograms.clear()
+            self.started_at = time.monotonic()
+
+
+def format_seconds(value):
+    return "-" if value is None else f"{value * 1000:.2f}ms"
+
+
+# globally initiated Metrics object shared by all the bot components
+METRICS = Metrics()
+
+
+def setup_logging(level=logging.INFO, fmt="%(asctime)s %(levelname)s %(message)s"):
+    """
+    This function is configuring the logging to be non-blocking, the log records are
+    put on a queue by the callers and written to the stderr by a background thread,
+    so logging never blocks the event loop on the console output.
+    :param level: logging level, the messages below this level are not formatted at all
+    :param fmt: format of the log messages
+    :return: QueueListener object, it should be stopped on exit to flush the remaining records
+    """
+    log_queue = queue.SimpleQueue()
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(logging.Formatter(fmt))
+    listener = logging.handlers.QueueListener(log_queue, stream_handler)
+    root = logging.getLogger()
+    root.handlers = [logging.handlers.QueueHandler(log_queue)]
+    root.setLevel(level)
+    listener.start()
+    return listener
+
+
+def install_stats_signal(metrics=METRICS, signum=getattr(signal, "SIGUSR1", None)):
+    """
+    This function is installing the signal handler which logs the metrics summary,
+    eg. `kill -USR1 <pid>` to get the stats of the running bot.
+    The signal is not available on Windows, in that case nothing is installed.
+    :param metrics: Metrics object to be logged
+    :param signum: signal number
+    """
+    if signum is None:
+        return
+    requested = threading.Event()
+
+    def log_stats():
+        while True:
+            requested.wait()
+            requested.clear()
+            metrics.log_summary()
+
+    threading.Thread(target=log_stats, name="stats-signal", daemon=True).start()
+    # the handler runs on the main thread in between any two instructions, eg. while the main
+    # thread holds the metrics lock, so it only wakes up the thread logging the summary
+    signal.signal(signum, lambda *_: requested.set())
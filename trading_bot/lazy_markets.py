@@ -0,0 +1,261 @@
+import json
+import logging
+import re
+import sys
+from collections.abc import Mapping
+
+try:
+    # the faster JSON decoder is used if it's installed
+    import orjson
+
+    loads = orjson.loads
+except ImportError:  # pragma: no cover
+    loads = json.loads
+
+logger = logging.getLogger(__file__)
+
+# the start of the marketInfos list in the response
+MARKET_INFOS = re.compile(rb'"marketInfos"\s*:\s*(\[|null)')
+# the tokens needed to find the boundaries of the market records: the brackets and the strings,
+# the strings are matched as a whole, so the brackets inside them are skipped
+TOKENS = rb'[{}\[\]]|"(?:[^"\\]|\\.)*"'
+# the value of the key field of the record
+FIELD = rb'"(%s)"\s*:\s*("(?:[^"\\]|\\.)*")'
+# the separators between the market records
+SEPARATORS = b", \t\r\n"
+# the possessive quantifiers never backtrack into the matched tokens, they are supported
+# since python 3.11, the older versions scan the response token by token
+POSSESSIVE = sys.version_info >= (3, 11)
+# the JSON string, matched as a whole with the escaped quotes
+STRING = rb'"(?:[^"\\]++|\\.)*+"'
+
+
+def record_pattern(depth=2):
+    """
+    This function is returning the pattern of a JSON token nested at most depth levels deep,
+    the strings and the nested objects and lists are matched as a whole, so the market record
+    is matched in a single pass without decoding it
+    :param depth: maximum nesting of the objects and lists inside the market record
+    """
+    token = rb'(?:[^{}\[\]"]++|' + STRING + rb")"
+    for _ in range(depth):
+        token = rb'(?:[^{}\[\]"]++|%s|\{%s*+\}|\[%s*+\])' % (STRING, token, token)
+    return token
+
+
+def field_pattern(field):
+    """
+    This function is returning the pattern of the market record up to its top level field,
+    the fields of the nested records, eg. of the recent trades, are skipped
+    :param field: name of the string field
+    """
+    return rb'\{%s*?"%s"\s*+:\s*+(%s)' % (record_pattern(), re.escape(field.encode()), STRING)
+
+
+def decode_string(value):
+    # the JSON string value, only the escaped ones are decoded by the JSON decoder
+    return loads(value) if b"\\" in value else value[1:-1].decode()
+
+
+class LazyMarketInfos(Mapping):
+    """
+    This class is a read only key to market record map of the raw marketInfos response,
+    the response is scanned once to find where each market record starts and ends,
+    and a record is decoded only when it's looked up, eg.
+
+        response = MARKET_INFOS.fetch_raw(client)
+        markets = LazyMarketInfos(response["data"])
+        market = markets["d76112d8-2537-4c20-a376-37c74fbe7977"]
+
+    The catalogue of the markets with their bids, offers and trades is decoded into many
+    thousands of dicts, while the caller needs a few of them, eg. the picked market.
+    The raw bytes are kept instead and the decoded records are cached, so the same market
+    is decoded once and it's the same record object every time.
+    """
+
+    def __init__(self, raw, key="marketId", index_fields=()):
+        """
+        :param raw: bytes of the marketInfos response body
+        :param key: field of the market record the markets are keyed by
+        :param index_fields: other string fields the markets can be found by, checkout find
+        """
+        self.__raw = raw
+        self.key = key
+        # key to (start, end) offsets of the market record in the raw bytes
+        self.__offsets = {}
+        # field to value to key maps of the index fields
+        self.indexes = {field: {} for field in index_fields}
+        self.__decoded = {}
+        self.__array = None
+        self.__scan()
+
+    @classmethod
+    def from_response(cls, response, **options):
+        """
+        This function is creating the map from the response of PreparedQuery.fetch_raw
+        """
+        return cls(response["data"], **options)
+
+    def __scan(self):
+        match = MARKET_INFOS.search(self.__raw)
+        if match is None or match.group(1) == b"null":
+            # eg. the errors response, it's small enough to be decoded
+            errors = loads(self.__raw).get("errors") if self.__raw.strip() else None
+            logger.error("The response has no markets, errors: %s", errors)
+            return
+        start = match.end() - 1
+        if POSSESSIVE and self.__match_records(start):
+            return
+        # the records matched before the fallback are found again by the tokens
+        self.__offsets.clear()
+        for index in self.indexes.values():
+            index.clear()
+        self.__scan_tokens(start)
+
+    def __match_records(self, start):
+        """
+        This function is matching the market records one by one with a single pattern,
+        it's as fast as decoding the response, but nothing is decoded except the key fields
+        :param start: offset of the markets list
+        :return: False if the records are not matched, eg. they are nested too deep
+        """
+        record = re.compile(field_pattern(self.key) + record_pattern() + rb"*+\}|(\])")
+        fields = {field: re.compile(field_pattern(field)) for field in self.indexes}
+        position = start + 1
+        for match in record.finditer(self.__raw, position):
+            # only the separators are expected between the records, otherwise the pattern
+            # skipped a record it couldn't match and found the nested one
+            if self.__raw[position : match.start()].strip(SEPARATORS):
+                logger.debug("The market record at %d is not matched, scanning the tokens.", position)
+                return False
+            position = match.end()
+            if match.group(2) is not None:
+                self.__array = (start, position)
+                return True
+            values = {self.key: decode_string(match.group(1))}
+            for field, pattern in fields.items():
+                value = pattern.match(self.__raw, match.start(), position)
+                if value is not None:
+                    values[field] = decode_string(value.group(1))
+            self.__add(values, match.start(), position)
+        return False
+
+    def __scan_tokens(self, start):
+        """
+        This function is finding the market records by counting the brackets of the tokens
+        :param start: offset of the markets list
+        """
+        fields = [self.key, *self.indexes]
+        pattern = re.compile(
+            FIELD % b"|".join(re.escape(field.encode()) for field in fields) + b"|" + TOKENS
+        )
+        depth, record_start, values = 0, None, {}
+        for token in pattern.finditer(self.__raw, start):
+            first = self.__raw[token.start()]
+            if token.group(1) is not None:
+                # the key fields of the market record itself, not of its nested records
+                if depth == 2:
+                    values[token.group(1).decode()] = decode_string(token.group(2))
+            elif first == ord("{") or first == ord("["):
+                depth += 1
+                if depth == 2:
+                    record_start, values = token.start(), {}
+            elif first == ord("}") or first == ord("]"):
+                depth -= 1
+                if depth == 1 and record_start is not None:
+                    self.__add(values, record_start, token.end())
+                    record_start = None
+                elif depth == 0:
+                    self.__array = (start, token.end())
+                    break
+
+    def __add(self, values, start, end):
+        key = values.get(self.key)
+        if key is None:
+            return
+        self.__offsets[key] = (start, end)
+        for field, index in self.indexes.items():
+            if field in values:
+                index[values[field]] = key
+
+    def __getitem__(self, key):
+        market = self.__decoded.get(key)
+        if market is None:
+            start, end = self.__offsets[key]
+            market = self.__decoded[key] = loads(self.__raw[start:end])
+        return market
+
+    def find(self, field, value, default=None):
+        """
+        This function is returning the market having the value of the index field
+        :param field: one of the index fields, eg. shortTitle
+        :param value: value of the field
+        """
+        key = self.indexes[field].get(value)
+        return self[key] if key is not None else default
+
+    def by_field(self, field):
+        """
+        This function is returning the read only map of the markets by the index field, eg.
+        the markets by their short titles, the markets are decoded when they are looked up
+        :param field: one of the index fields
+        """
+        return LazyMarketIndex(self, field)
+
+    def raw(self, key):
+        # the undecoded bytes of the market record
+        start, end = self.__offsets[key]
+        return self.__raw[start:end]
+
+    def values(self):
+        # decoding all the records at once, it's much faster than the lookups by key
+        if self.__array is None:
+            return []
+        start, end = self.__array
+        markets = loads(self.__raw[start:end])
+        # keeping the records decoded already, so they are the same objects
+        return [
+            self.__decoded.setdefault(market.get(self.key), market) if self.key in market else market
+            for market in markets
+        ]
+
+    @property
+    def decoded(self):
+        # number of the decoded records
+        return len(self.__decoded)
+
+    def __iter__(self):
+        return iter(self.__offsets)
+
+    def __len__(self):
+        return len(self.__offsets)
+
+    def __contains__(self, key):
+        return key in self.__offsets
+
+
+class LazyMarketIndex(Mapping):
+    """
+    This class is the read only index field value to market map of the markets having the
+    field value to key indexes, eg. LazyMarketInfos or MarketSnapshot
+    """
+
+    def __init__(self, markets, field):
+        """
+        :param markets: LazyMarketInfos or MarketSnapshot object
+        :param field: one of its index fields
+        """
+        self.__markets = markets
+        self.__index = markets.indexes[field]
+
+    def __getitem__(self, value):
+        return self.__markets[self.__index[value]]
+
+    def __iter__(self):
+        return iter(self.__index)
+
+    def __len__(self):
+        return len(self.__index)
+
+    def __contains__(self, value):
+        return value in self.__index
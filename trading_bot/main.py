@@ -3,19 +3,29 @@ import logging
 from stxsdk.exceptions import AuthenticationFailedException
 
 from trading_bot.bot import TradingBot
+from trading_bot.instrumentation import install_stats_signal, setup_logging
+from trading_bot.snapshot import DEFAULT_SNAPSHOT_PATH
 
 logger = logging.getLogger(__file__)
 
 
 def initiate_bot():
+    # the log records are written by a background thread, so logging doesn't block the bot
+    # use logging.DEBUG level to see every market update and price computation
+    listener = setup_logging(logging.INFO)
+    # the stats of the running bot can be logged with `kill -USR1 <pid>`
+    install_stats_signal()
     try:
-        print("Initiating the Trading Bot.")
+        logger.info("Initiating the Trading Bot.")
         email = input("Please enter email address: ")
         password = input("Please enter password: ")
-        # creating the trading bot object
-        bot = TradingBot(email, password)
+        # number of the markets to be traded at the same time by the bot
+        markets_count = int(input("Please enter number of markets to trade [1]: ") or 1)
+        # creating the trading bot object, it starts with the markets saved by the previous run
+        # and fetches the fresh markets in the background
+        bot = TradingBot(markets_count=markets_count, snapshot_path=DEFAULT_SNAPSHOT_PATH)
         # initiating the bot to start the defined routines
-        bot.initiate()
+        bot.initiate(email, password)
     # the bot first authenticate the user then starts its defined routines
     # this handles the authentication failure exception in case if the
     # provided credentials are invalid
@@ -24,6 +34,9 @@ def initiate_bot():
     # it handles any other general exception raised during the process
     except Exception as exc:
         logger.exception(str(exc))
+    finally:
+        # flushing the remaining log records
+        listener.stop()
 
 
 # It's the start of the file, this commands represents that this file will execute from here
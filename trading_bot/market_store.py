@@ -0,0 +1,243 @@
+import functools
+import logging
+
+logger = logging.getLogger(__file__)
+
+# market_info channel events which carry the market data deltas
+MARKET_UPDATED = "market_updated"
+MARKET_CREATED = "market_created"
+
+# the channel sends the market fields in snake case while the marketInfos API returns them
+# in camel case, most of the fields are converted generically but few of them are named
+# differently in the API response, those are mapped here explicitly
+CHANNEL_FIELD_MAP = {
+    "market_id": "marketId",
+    "unix_timestamp": "timestampInt",
+}
+# the timestampInt of the marketInfos API is in microseconds, the timestamps of the other
+# units are told apart by their magnitude, eg. 1673974406 seconds, 1673974406324 milliseconds,
+# 1673974406324012 microseconds or 1673974406324012000 nanoseconds
+TIMESTAMP_UNITS = (
+    (10 ** 11, 10 ** 6),
+    (10 ** 14, 10 ** 3),
+    (10 ** 17, 1),
+)
+
+
+def to_microseconds(timestamp):
+    """
+    This function is converting the unix timestamp to microseconds, the unit of timestampInt,
+    so the timestamps of the channel deltas and of the marketInfos API can be compared
+    :param timestamp: unix timestamp in seconds, milliseconds, microseconds or nanoseconds
+    :return: int microseconds, or the timestamp as it is if it's missing
+    """
+    if not timestamp:
+        return timestamp
+    if not isinstance(timestamp, int):
+        # eg. the fractional seconds, the integers are kept exact
+        timestamp = float(timestamp)
+    for limit, multiplier in TIMESTAMP_UNITS:
+        if timestamp < limit:
+            return int(timestamp * multiplier)
+    return int(timestamp) // 1000
+
+
+def normalize_record(record):
+    """
+    This function is converting the timestampInt of the market record to microseconds in place
+    :param record: market record with the marketInfos field names
+    :return: the same record
+    """
+    if record.get("timestampInt"):
+        record["timestampInt"] = to_microseconds(record["timestampInt"])
+    return record
+
+
+@functools.lru_cache(maxsize=None)
+def to_record_field(field_name):
+    """
+    This function is converting the channel field name to the marketInfos field name
+    eg. max_price -> maxPrice, unix_timestamp -> timestampInt
+    the converted names are cached because the same few fields are repeated in every delta
+    :param field_name: snake case field name sent by the market_info channel
+    """
+    record_field = CHANNEL_FIELD_MAP.get(field_name)
+    if record_field is None:
+        head, *tail = field_name.split("_")
+        record_field = head + "".join(part.title() for part in tail)
+    return record_field
+
+
+def channel_records(response):
+    """
+    This function is extracting the records of the channel message, eg. the orders of the
+    active_orders channel or the summary of the portfolio channel, with their fields
+    converted to the API field names, eg. client_order_id -> clientOrderId.
+    The 5th element of the message data can be a single record, a list of the records
+    or an id to record map, all of them are returned as a list of the records
+    :param response: message passed by the listener of the channel
+    :return: list of the record dicts
+    """
+    data = response.get("data")
+    if not data or len(data) < 5:
+        return []
+    payload = data[4]
+    if isinstance(payload, dict):
+        values = list(payload.values())
+        if values and all(isinstance(value, dict) for value in values):
+            payload = values
+        elif len(values) == 1 and isinstance(values[0], list):
+            payload = values[0]
+        else:
+            payload = [payload]
+    if not isinstance(payload, list):
+        return []
+    return [
+        normalize_record(
+            {to_record_field(field_name): value for field_name, value in record.items()}
+        )
+        for record in payload
+        if isinstance(record, dict)
+    ]
+
+
+class MarketStore:
+    """
+    This class is holding the latest state of the markets in memory.
+    It is populated once with the marketInfos API response and afterwards it is kept
+    up to date by merging the market_updated/market_created deltas of the market_info
+    channel into the stored records, so the markets never have to be fetched again.
+
+    Records are stored as marketId to market data map, so the lookups are O(1),
+    and the stored dictionaries are updated in place, it means any reference to
+    a market record (eg. the bot's picked market) always sees the latest state.
+
+    Only the market_created messages add the markets, the deltas of the markets which are not
+    stored are ignored, they would make the partial records missing eg. the title or the rules.
+
+    Every delta carries a unix_timestamp, the store remembers the last applied timestamp
+    of each market (as timestampInt, same as the marketInfos field) and ignores
+    the deltas which are older than that, so late deltas can't overwrite the newer state.
+    The timestamps of both the deltas and the marketInfos records are stored in microseconds,
+    whatever unit they are received in, checkout to_microseconds.
+
+    Indexes over the markets (eg. EligibleMarkets) can be attached to the store,
+    they are rebuilt on load and refreshed with every updated market record.
+    """
+
+    def __init__(self):
+        self.__markets = {}
+        self.__indexes = []
+
+    def add_index(self, index):
+        """
+        This function is attaching the index to be kept up to date with the stored markets
+        :param index: object having rebuild(markets) and refresh(market) functions
+        """
+        self.__indexes.append(index)
+        index.rebuild(self.__markets.values())
+
+    def load(self, markets):
+        """
+        This function is replacing the stored markets with the marketInfos API response
+        :param markets: list of markets returned by the marketInfos API
+        """
+        self.__markets = {market["marketId"]: normalize_record(market) for market in markets}
+        for index in self.__indexes:
+            index.rebuild(self.__markets.values())
+
+    def sync(self, markets):
+        """
+        This function is merging the marketInfos API response into the stored markets,
+        it's used to fill the gap after the market info channel was disconnected.
+        Unlike load, the stored records are updated in place, so the references to them
+        stay valid, and the records already updated by newer deltas are kept as they are
+        :param markets: list of markets returned by the marketInfos API
+        :return: list of the market records that got updated or added
+        """
+        updated = []
+        for snapshot in markets:
+            market_id = snapshot["marketId"]
+            market = self.__markets.get(market_id)
+            snapshot = normalize_record(dict(snapshot))
+            if market is None:
+                market = self.__markets[market_id] = snapshot
+            else:
+                last_timestamp = market.get("timestampInt")
+                snapshot_timestamp = snapshot.get("timestampInt")
+                # the channel delivered a newer delta while the snapshot was being fetched
+                if last_timestamp and snapshot_timestamp and snapshot_timestamp < last_timestamp:
+                    continue
+                market.update(snapshot)
+            for index in self.__indexes:
+                index.refresh(market)
+            updated.append(market)
+        return updated
+
+    def apply(self, event, market_updates):
+        """
+        This function is merging the market_info channel deltas into the stored markets
+        :param event: channel message event, eg. market_updated or market_created
+        :param market_updates: market_id to changed fields map sent by the channel
+        :return: list of the market records that got updated
+        """
+        if event not in (MARKET_UPDATED, MARKET_CREATED):
+            return []
+        updated = []
+        for market_update in market_updates.values():
+            market = self.apply_update(market_update, event)
+            if market is not None:
+                updated.append(market)
+        return updated
+
+    def apply_update(self, market_update, event=MARKET_UPDATED):
+        """
+        This function is merging a single market delta into the stored market record
+        :param market_update: changed fields of the market with mandatory market_id and timestamp
+        :param event: channel message event, only market_created adds the market to the store
+        :return: the updated market record, or None if the delta is older than the stored state
+                 or the market is not stored
+        """
+        market_id = market_update["market_id"]
+        market = self.__markets.get(market_id)
+        if market is None:
+            # the delta of the market which is not stored has only the changed fields,
+            # the market is added by its market_created message or the next sync instead
+            if event != MARKET_CREATED:
+                logger.debug("Ignoring the update of the unknown market %s", market_id)
+                return None
+            market = self.__markets[market_id] = {}
+        else:
+            last_timestamp = market.get("timestampInt")
+            unix_timestamp = to_microseconds(market_update.get("unix_timestamp"))
+            # ignoring the late delivered delta, the stored state is already newer
+            if last_timestamp and unix_timestamp and unix_timestamp < last_timestamp:
+                logger.debug("Ignoring the stale update of the market %s", market_id)
+                return None
+        for field_name, value in market_update.items():
+            market[to_record_field(field_name)] = value
+        normalize_record(market)
+        for index in self.__indexes:
+            index.refresh(market)
+        return market
+
+    def get(self, market_id, default=None):
+        return self.__markets.get(market_id, default)
+
+    def values(self):
+        return self.__markets.values()
+
+    def clear(self):
+        self.load([])
+
+    def __getitem__(self, market_id):
+        return self.__markets[market_id]
+
+    def __contains__(self, market_id):
+        return market_id in self.__markets
+
+    def __len__(self):
+        return len(self.__markets)
+
+    def __iter__(self):
+        return iter(self.__markets)
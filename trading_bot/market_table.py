@@ -0,0 +1,183 @@
+import logging
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+from trading_bot.pricing import compute_prices, quote_batch, require_numpy
+
+logger = logging.getLogger(__file__)
+
+
+class MarketTable:
+    """
+    This class is holding the numeric fields of the markets in the columns, a NumPy array
+    per field with a row per market, so the screens and the bulk computations run vectorized
+    across all the markets at once instead of a Python loop over the market dicts, eg.
+
+        table = MarketTable.from_markets(response["data"]["marketInfos"])
+        # the markets with probability over 20% and the spread under 5 cents
+        market_ids = table.select((table.probability > 0.2) & (table.spread < 500))
+
+    The missing prices, eg. the best bid of a market without bids, are NaN.
+    The table can be attached to the market store as an index, then it is rebuilt on load
+    and its rows are refreshed with the market info channel deltas.
+
+    NumPy is an optional dependency of the trading bot, it's required by this class only.
+    """
+
+    # the numeric columns in the order of the row values
+    COLUMNS = (
+        "max_price",
+        "probability",
+        "price",
+        "best_bid",
+        "best_offer",
+        "bid_depth",
+        "offer_depth",
+    )
+
+    def __init__(self, markets=()):
+        """
+        :param markets: iterable of the marketInfos records
+        """
+        require_numpy("MarketTable")
+        self.rebuild(markets)
+
+    @classmethod
+    def from_markets(cls, markets):
+        return cls(markets)
+
+    @classmethod
+    def from_response(cls, response):
+        """
+        This function is creating the table from the marketInfos API response
+        :param response: response of the StxClient marketInfos function
+        """
+        return cls(response["data"]["marketInfos"])
+
+    @staticmethod
+    def __row(market):
+        bids = market.get("bids") or ()
+        offers = market.get("offers") or ()
+        return (
+            market.get("maxPrice") or np.nan,
+            market.get("probability") or 0.0,
+            market.get("price") or np.nan,
+            max((bid["price"] for bid in bids), default=np.nan),
+            min((offer["price"] for offer in offers), default=np.nan),
+            sum(bid["quantity"] for bid in bids),
+            sum(offer["quantity"] for offer in offers),
+        )
+
+    def rebuild(self, markets):
+        """
+        This function is building the columns from the markets
+        :param markets: iterable of the marketInfos records
+        """
+        markets = list(markets)
+        self.market_ids = [market["marketId"] for market in markets]
+        # marketId to row index map
+        self.rows = {market_id: row for row, market_id in enumerate(self.market_ids)}
+        self.status = np.array([market.get("status") or "" for market in markets], dtype=object)
+        columns = np.array([self.__row(market) for market in markets], dtype=np.float64)
+        columns = columns.reshape(len(markets), len(self.COLUMNS)).T
+        (
+            self.max_price,
+            self.probability,
+            self.price,
+            self.best_bid,
+            self.best_offer,
+            self.bid_depth,
+            self.offer_depth,
+        ) = (column.copy() for column in columns)
+
+    def refresh(self, market):
+        """
+        This function is updating the row of the market, a new market is appended to the table
+        :param market: updated market record
+        """
+        market_id = market["marketId"]
+        row = self.rows.get(market_id)
+        if row is None:
+            # appending copies the columns, but the new markets are rare compared to the updates
+            row = self.rows[market_id] = len(self.market_ids)
+            self.market_ids.append(market_id)
+            self.status = np.append(self.status, market.get("status") or "")
+            for name in self.COLUMNS:
+                setattr(self, name, np.append(getattr(self, name), np.nan))
+        self.status[row] = market.get("status") or ""
+        for name, value in zip(self.COLUMNS, self.__row(market)):
+            getattr(self, name)[row] = value
+
+    @property
+    def spread(self):
+        return self.best_offer - self.best_bid
+
+    @property
+    def mid(self):
+        return (self.best_offer + self.best_bid) / 2
+
+    def status_in(self, *statuses):
+        """
+        This function is returning the mask of the markets having one of the provided statuses
+        """
+        return np.isin(self.status, statuses)
+
+    def select(self, mask):
+        """
+        This function is returning the ids of the markets selected by the mask
+        :param mask: boolean array with a value per market, eg. table.probability > 0.5
+        """
+        return [self.market_ids[row] for row in np.flatnonzero(mask)]
+
+    def indices(self, market_ids):
+        """
+        This function is returning the row indices of the markets
+        :param market_ids: iterable of the market ids
+        """
+        return np.fromiter((self.rows[market_id] for market_id in market_ids), dtype=np.intp)
+
+    def compute_prices(self, probability_caps, rows=None, price_rules=None):
+        """
+        This function is computing the order prices of the markets at once,
+        the same as MarketStrategy.compute_price does for a single market
+        :param probability_caps: percents added to the probabilities, a value per market or
+                                 a single value for all of them
+        :param rows: row indices of the markets to be priced, all the markets by default
+        :param price_rules: optional orderPriceRules lists of the priced markets
+        :return: integer array of the prices, -1 for the markets without bids
+        """
+        rows = slice(None) if rows is None else rows
+        return compute_prices(
+            self.probability[rows],
+            self.best_bid[rows],
+            self.max_price[rows],
+            price_rules,
+            probability_caps,
+        )
+
+    def quote(self, rows=None, price_rules=None, generator=None):
+        """
+        This function is computing the order prices and the random quantities of the markets
+        at once, checkout trading_bot.pricing.quote_batch
+        :param rows: row indices of the markets to be quoted, all the markets by default
+        :param price_rules: optional orderPriceRules lists of the quoted markets
+        :param generator: numpy.random.Generator object or a seed
+        :return: tuple of the integer prices and quantities arrays
+        """
+        rows = slice(None) if rows is None else rows
+        return quote_batch(
+            self.probability[rows],
+            self.best_bid[rows],
+            self.max_price[rows],
+            price_rules,
+            generator,
+        )
+
+    def __len__(self):
+        return len(self.market_ids)
+
+    def __contains__(self, market_id):
+        return market_id in self.rows
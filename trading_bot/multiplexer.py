@@ -0,0 +1,122 @@
+import asyncio
+import functools
+import logging
+
+from trading_bot.frame_queue import BLOCK, FramePipeline
+from trading_bot.instrumentation import METRICS
+from trading_bot.supervisor import ChannelSupervisor
+
+logger = logging.getLogger(__file__)
+
+
+class ChannelMultiplexer:
+    """
+    This class is joining many channels at once in the same event loop with the same
+    authenticated channel client, so a single login is enough to watch eg. portfolio,
+    active_orders, active_trades and market_info together.
+
+    Every channel has its own FramePipeline, the channel listener only puts the received
+    messages on the bounded queue of the channel while its workers pass them to the consumer.
+    When a consumer can't keep up, the overflow policy is applied to that channel only,
+    eg. with the block policy the listener of the slow channel waits for the free space
+    before reading the next message from the socket while the other channels keep flowing.
+
+    The received and consumed messages are counted per channel, eg. frames.market_info.received,
+    so the per channel frame rates are available from the METRICS summary.
+    """
+
+    def __init__(
+        self,
+        channel_client,
+        consumers,
+        queue_size=1000,
+        policy=BLOCK,
+        workers=1,
+        reconnect=False,
+        metrics=METRICS,
+        **queue_options,
+    ):
+        """
+        :param channel_client: authenticated StxChannelClient object
+        :param consumers: channel name to consumer map, the consumer is an async function
+                          called with the channel name and the channel message,
+                          eg. {"market_info": on_market_info, "portfolio": on_portfolio}
+        :param queue_size: maximum number of the messages waiting for the consumer per channel
+        :param policy: overflow policy of the channel queues, checkout trading_bot.frame_queue
+        :param workers: number of the consumer tasks per channel
+        :param reconnect: whether to join the channels again when they are disconnected
+        :param metrics: Metrics object the frame counters are recorded in
+        :param queue_options: other FrameQueue parameters, eg. the conflation key
+        """
+        self.channel_client = channel_client
+        self.consumers = dict(consumers)
+        self.reconnect = reconnect
+        self.metrics = metrics
+        self.pipelines = {
+            channel: FramePipeline(
+                functools.partial(consumer, channel),
+                workers=workers,
+                maxsize=queue_size,
+                policy=policy,
+                name=f"frames.{channel}",
+                metrics=metrics,
+                **queue_options,
+            )
+            for channel, consumer in self.consumers.items()
+        }
+
+    @property
+    def channels(self):
+        return list(self.consumers)
+
+    def depths(self):
+        """
+        This function is returning the number of the messages waiting in the queue of each channel
+        """
+        return {channel: pipeline.depth for channel, pipeline in self.pipelines.items()}
+
+    def drops(self):
+        """
+        This function is returning the number of the dropped messages of each channel
+        """
+        return {channel: pipeline.dropped for channel, pipeline in self.pipelines.items()}
+
+    def __event_logger(self, channel):
+        async def on_event(message):
+            logger.info("Channel %s: %s", channel, message["message"])
+
+        return on_event
+
+    async def __join(self, channel, pipeline):
+        event_logger = self.__event_logger(channel)
+        pipeline.start()
+        try:
+            if self.reconnect:
+                await ChannelSupervisor(
+                    self.channel_client,
+                    channel,
+                    on_message=pipeline,
+                    on_close=event_logger,
+                    on_error=event_logger,
+                    metrics=self.metrics,
+                ).run()
+            else:
+                method = getattr(self.channel_client, f"{channel}_join")
+                await method(
+                    on_open=event_logger,
+                    on_message=pipeline,
+                    on_close=event_logger,
+                    on_error=event_logger,
+                )
+        finally:
+            # letting the workers finish the waiting messages before the channel is done
+            await pipeline.close()
+
+    async def run(self):
+        """
+        This function is joining all the channels and consuming their messages
+        until all the channel connections are closed
+        """
+        await asyncio.gather(
+            *(self.__join(channel, pipeline) for channel, pipeline in self.pipelines.items())
+        )
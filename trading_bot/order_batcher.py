@@ -0,0 +1,152 @@
+import asyncio
+import logging
+
+from stxsdk.utils import format_failure_response, format_success_response
+
+logger = logging.getLogger(__file__)
+
+# statuses of the cancelOrders results of the orders which are cancelled
+CANCELLED_STATUSES = frozenset(("cancelled", "canceled"))
+
+
+def order_cancel_response(order_id, results):
+    """
+    This function is returning the response of a single order of the cancelOrders response,
+    the cancelOrders request succeeds even if some of its orders are not cancelled, the result
+    of each order has the status of the order after the attempted cancellation
+    :param order_id: unique ID of the order
+    :param results: order id to BatchCancelOrdersResult map of the cancelOrders response
+    """
+    result = results.get(order_id)
+    if result is None:
+        message = f"The order {order_id} is missing in the cancelOrders response."
+        return format_failure_response(errors=[message], message=message)
+    status = str(result.get("status") or "").lower()
+    if status not in CANCELLED_STATUSES:
+        message = f"The order {order_id} is not cancelled, its status is {result.get('status')}."
+        return format_failure_response(errors=[message], message=message)
+    return format_success_response(data={"cancelOrders": [result]})
+
+
+class OrderBatcher:
+    """
+    This class is batching the order requests of the strategies in front of the order gateway.
+
+    When many markets are traded, a single market info message can make many strategies
+    cancel their orders at the same time. Instead of sending one cancelOrder request per order,
+    the batcher collects the cancellations for a short window, or until the batch is full,
+    and cancels all of them with a single cancelOrders request.
+    The new orders are sent right away, they already run in parallel on the gateway
+    and delaying them would only delay the quotes.
+
+    The batcher provides the same order functions as the OrderGateway,
+    so the strategies can use either of them.
+    """
+
+    def __init__(self, gateway, window_ms=20, max_batch=50):
+        """
+        :param gateway: OrderGateway object used for the order requests
+        :param window_ms: milliseconds to wait for more cancellations before sending the batch
+        :param max_batch: maximum number of the order ids in a single cancelOrders request
+        """
+        self.gateway = gateway
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        # (order id, future) pairs of the cancellations waiting for the batch to be sent
+        self.__cancels = []
+        self.__timer = None
+        self.__pending = set()
+
+    async def confirm_order(self, params, selections=None):
+        return await self.gateway.confirm_order(params, selections)
+
+    async def cancel_order(self, order_id, selections=None):
+        """
+        This function is adding the order to the cancellation batch and waits until the batch
+        is sent, the response of the order is returned, it fails if the order is not cancelled
+        even if the other orders of the batch are
+        :param order_id: unique ID of the order
+        :param selections: it's not used, cancelOrders response has its own fields
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.__cancels.append((order_id, future))
+        if len(self.__cancels) >= self.max_batch:
+            self.flush()
+        elif self.__timer is None:
+            self.__timer = loop.call_later(self.window, self.flush)
+        return await future
+
+    async def cancel_replace(self, order_id, params, selections=None):
+        """
+        This function is replacing the order with a new one, the new order is sent right away
+        while the cancellation goes with the next cancellation batch
+        :param order_id: unique ID of the order to be cancelled, None if there is no order
+        :param params: confirmOrder parameters of the new order
+        :param selections: Selection object of the required confirmOrder response fields
+        :return: tuple of the cancelOrders and confirmOrder responses
+        """
+        if order_id is None:
+            return None, await self.confirm_order(params, selections)
+        cancel_response, order_response = await asyncio.gather(
+            self.cancel_order(order_id), self.confirm_order(params, selections)
+        )
+        return cancel_response, order_response
+
+    def flush(self):
+        """
+        This function is sending the collected cancellations with cancelOrders API
+        """
+        if self.__timer is not None:
+            self.__timer.cancel()
+            self.__timer = None
+        if not self.__cancels:
+            return
+        batch, self.__cancels = self.__cancels, []
+        task = asyncio.create_task(self.__send_cancels(batch))
+        self.__pending.add(task)
+        task.add_done_callback(self.__pending.discard)
+
+    async def __send_cancels(self, batch):
+        order_ids = [order_id for order_id, _ in batch]
+        logger.info("Cancelling %d orders in a batch.", len(order_ids))
+        try:
+            response = await self.gateway.cancel_orders(order_ids)
+        except Exception as exc:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+        if not response["success"]:
+            logger.error("Failed to cancel the orders %s: %s", order_ids, response["message"])
+            for _, future in batch:
+                if not future.done():
+                    future.set_result(response)
+            return
+        results = {
+            result.get("orderId"): result
+            for result in (response["data"] or {}).get("cancelOrders") or []
+            if result
+        }
+        for order_id, future in batch:
+            if not future.done():
+                future.set_result(order_cancel_response(order_id, results))
+
+    async def cancel_all_orders(self):
+        """
+        This function is dropping the collected cancellations and cancels all the open orders
+        of the account with a single cancelAllOrders request, it's used on the shutdown
+        """
+        if self.__timer is not None:
+            self.__timer.cancel()
+            self.__timer = None
+        batch, self.__cancels = self.__cancels, []
+        # waiting for the batches in flight, so they don't race with the cancel all request
+        if self.__pending:
+            await asyncio.gather(*self.__pending, return_exceptions=True)
+        logger.info("Cancelling all the open orders.")
+        response = await self.gateway.cancel_all_orders()
+        for _, future in batch:
+            if not future.done():
+                future.set_result(response)
+        return response
@@ -0,0 +1,180 @@
+import itertools
+import logging
+
+logger = logging.getLogger(__file__)
+
+
+class PriceLevel:
+    """
+    A single price level of the order book with the quantity available at that price
+    """
+
+    __slots__ = ("price", "quantity")
+
+    def __init__(self, price, quantity):
+        self.price = price
+        self.quantity = quantity
+
+    def __repr__(self):
+        return f"PriceLevel(price={self.price}, quantity={self.quantity})"
+
+
+class OrderBook:
+    """
+    This class is holding the bids and offers of a market sorted by price,
+    bids from the highest price and offers from the lowest price, so the best prices
+    are always the first levels. The cumulative quantities are computed once when the
+    side is set, so the best prices, mid, spread and the depth at N levels are all O(1).
+
+    The market_info channel sends the whole bids or offers list of the market whenever
+    they change, so a side is always replaced as a whole.
+    """
+
+    __slots__ = ("market_id", "bids", "offers", "_bid_depths", "_offer_depths")
+
+    def __init__(self, market_id, bids=(), offers=()):
+        """
+        :param market_id: unique ID of the market
+        :param bids: list of the bid dicts having price and quantity
+        :param offers: list of the offer dicts having price and quantity
+        """
+        self.market_id = market_id
+        self.set_bids(bids)
+        self.set_offers(offers)
+
+    @classmethod
+    def from_market(cls, market):
+        """
+        This function is creating the order book from the marketInfos market record
+        :param market: market data having marketId, bids and offers
+        """
+        return cls(market["marketId"], market.get("bids") or (), market.get("offers") or ())
+
+    @staticmethod
+    def __levels(orders, highest_first):
+        levels = [PriceLevel(order["price"], order["quantity"]) for order in orders]
+        levels.sort(key=lambda level: level.price, reverse=highest_first)
+        return levels
+
+    def set_bids(self, bids):
+        self.bids = self.__levels(bids, highest_first=True)
+        self._bid_depths = list(itertools.accumulate(level.quantity for level in self.bids))
+
+    def set_offers(self, offers):
+        self.offers = self.__levels(offers, highest_first=False)
+        self._offer_depths = list(
+            itertools.accumulate(level.quantity for level in self.offers)
+        )
+
+    def update(self, market_update):
+        """
+        This function is updating the book with the changed fields of the market,
+        the sides which are not in the update are kept as they are
+        :param market_update: market data from marketInfos record or market_updated message
+        """
+        if "bids" in market_update:
+            self.set_bids(market_update["bids"] or ())
+        if "offers" in market_update:
+            self.set_offers(market_update["offers"] or ())
+
+    @property
+    def best_bid(self):
+        return self.bids[0].price if self.bids else None
+
+    @property
+    def best_offer(self):
+        return self.offers[0].price if self.offers else None
+
+    @property
+    def mid(self):
+        if not self.bids or not self.offers:
+            return None
+        return (self.bids[0].price + self.offers[0].price) / 2
+
+    @property
+    def spread(self):
+        if not self.bids or not self.offers:
+            return None
+        return self.offers[0].price - self.bids[0].price
+
+    def bid_depth(self, levels):
+        """
+        This function is returning the total quantity of the best bid levels
+        :param levels: number of the price levels
+        """
+        return self.__depth(self._bid_depths, levels)
+
+    def offer_depth(self, levels):
+        """
+        This function is returning the total quantity of the best offer levels
+        :param levels: number of the price levels
+        """
+        return self.__depth(self._offer_depths, levels)
+
+    @staticmethod
+    def __depth(depths, levels):
+        if levels <= 0 or not depths:
+            return 0
+        return depths[min(levels, len(depths)) - 1]
+
+    def __repr__(self):
+        return (
+            f"OrderBook(market_id={self.market_id}, best_bid={self.best_bid}, "
+            f"best_offer={self.best_offer})"
+        )
+
+
+class OrderBooks:
+    """
+    This class is an index of the market order books, it is attached to the market store,
+    so the books are built on load and updated whenever the bids or offers of a market change.
+    A book object of a market is never replaced, it is updated in place, so the
+    references held by the strategies always have the latest levels.
+    """
+
+    def __init__(self):
+        self.__books = {}
+        # market id to the (bids, offers) lists the book was last built from,
+        # the market records keep the same list objects until a new side is received
+        self.__sources = {}
+
+    def rebuild(self, markets):
+        books, self.__books = self.__books, {}
+        self.__sources = {}
+        for market in markets:
+            market_id = market["marketId"]
+            # reusing the existing book objects, they might be referenced by the strategies
+            book = books.get(market_id)
+            if book is not None:
+                book.update({"bids": market.get("bids"), "offers": market.get("offers")})
+                self.__books[market_id] = book
+                self.__sources[market_id] = (market.get("bids"), market.get("offers"))
+            else:
+                self.refresh(market)
+
+    def refresh(self, market):
+        market_id = market["marketId"]
+        bids, offers = market.get("bids"), market.get("offers")
+        book = self.__books.get(market_id)
+        if book is None:
+            self.__books[market_id] = OrderBook(market_id, bids or (), offers or ())
+        else:
+            # rebuilding only the sides which are changed by the update
+            source_bids, source_offers = self.__sources[market_id]
+            if source_bids is not bids:
+                book.set_bids(bids or ())
+            if source_offers is not offers:
+                book.set_offers(offers or ())
+        self.__sources[market_id] = (bids, offers)
+
+    def get(self, market_id, default=None):
+        return self.__books.get(market_id, default)
+
+    def __getitem__(self, market_id):
+        return self.__books[market_id]
+
+    def __contains__(self, market_id):
+        return market_id in self.__books
+
+    def __len__(self):
+        return len(self.__books)
@@ -0,0 +1,174 @@
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from stxsdk import StxClient
+from stxsdk.services.authentication import AuthService
+from stxsdk.utils import format_success_response
+
+from trading_bot.instrumentation import METRICS
+
+logger = logging.getLogger(__file__)
+
+
+@AuthService.authenticate
+def check_auth(proxy_call):
+    """
+    This function is refreshing the auth token of the user if it's expired, the token is
+    checked and refreshed by the authentication the same way as before the client operations
+    :param proxy_call: any operation of the authenticated client, eg. client.userProfile
+    """
+    return format_success_response(data=None)
+
+
+class OrderGateway:
+    """
+    This class is providing awaitable order operations for the async channel consumers.
+
+    StxClient operations are synchronous HTTP requests, calling them directly inside
+    a channel consumer blocks the event loop, and the channel messages pile up until
+    the request is completed. The gateway runs these requests on a bounded thread pool,
+    so the event loop keeps processing the channel messages while the orders are in flight.
+    The number of the concurrent requests is capped by the number of the pool workers,
+    the requests over the cap wait in the pool's queue.
+
+    StxClient object is not safe to be shared between threads because it keeps the request
+    state in the client object, so each worker thread creates its own client object.
+    The user is a singleton object in the SDK, so all the worker clients share the same
+    authenticated session and there is no need to login again.
+    """
+
+    def __init__(self, max_concurrency=4, client_factory=StxClient):
+        """
+        :param max_concurrency: maximum number of the order requests running at the same time
+        :param client_factory: callable that creates the client object for the worker threads
+        """
+        self.max_concurrency = max_concurrency
+        self.client_factory = client_factory
+        self.__local = threading.local()
+        # created on the first refresh, so it belongs to the running event loop
+        self.__auth_lock = None
+        self.__executor = ThreadPoolExecutor(
+            max_workers=max_concurrency, thread_name_prefix="order-gateway"
+        )
+
+    @property
+    def client(self):
+        """
+        This function is returning the client object of the current worker thread
+        """
+        client = getattr(self.__local, "client", None)
+        if client is None:
+            client = self.__local.client = self.client_factory()
+        return client
+
+    def __execute(self, operation, params, selections):
+        # executed in the worker thread
+        method = getattr(self.client, operation)
+        METRICS.increment(f"requests.{operation}")
+        with METRICS.timer(f"latency.{operation}"):
+            return method(params=params, selections=selections)
+
+    async def execute(self, operation, params=None, selections=None):
+        """
+        This function is running the client operation on the worker thread and returns
+        the operation's response once the request is completed
+        :param operation: name of the StxClient operation, eg. confirmOrder
+        :param params: parameters of the operation
+        :param selections: Selection object of the required response fields
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.__executor, self.__execute, operation, params, selections
+        )
+
+    def __execute_query(self, query):
+        # executed in the worker thread
+        METRICS.increment(f"requests.{query.operation}")
+        with METRICS.timer(f"latency.{query.operation}"):
+            return query(self.client)
+
+    async def execute_query(self, query):
+        """
+        This function is running the PreparedQuery on the worker thread, its document is
+        compiled once and shared by the clients of all the worker threads
+        :param query: PreparedQuery object
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.__executor, self.__execute_query, query)
+
+    async def refresh_auth(self):
+        """
+        This function is refreshing the expired auth token of the user, eg. before the channels
+        are joined again, the channels connect with the token of the user shared by all the
+        clients. The refreshes are done one at a time, the concurrent callers find the token
+        refreshed already, so the refresh token is used once and the failed refresh, which
+        logs the user out, is not raced by the others
+        :return: the success response, or the failure response if the token can't be refreshed
+        """
+        if self.__auth_lock is None:
+            self.__auth_lock = asyncio.Lock()
+        async with self.__auth_lock:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.__executor, self.__check_auth)
+
+    def __check_auth(self):
+        # executed in the worker thread with its own client
+        return check_auth(self.client.userProfile)
+
+    async def confirm_order(self, params, selections=None):
+        """
+        This function is posting a new order with confirmOrder API
+        :param params: confirmOrder parameters with the userOrder details
+        :param selections: Selection object of the required response fields
+        """
+        return await self.execute("confirmOrder", params, selections)
+
+    async def cancel_order(self, order_id, selections=None):
+        """
+        This function is cancelling the order with cancelOrder API
+        :param order_id: unique ID of the order
+        :param selections: Selection object of the required response fields
+        """
+        return await self.execute("cancelOrder", {"orderId": order_id}, selections)
+
+    async def cancel_orders(self, order_ids, selections=None):
+        """
+        This function is cancelling multiple orders with a single cancelOrders API request
+        :param order_ids: list of the unique IDs of the orders
+        :param selections: Selection object of the required response fields
+        """
+        return await self.execute("cancelOrders", {"orderIds": list(order_ids)}, selections)
+
+    async def cancel_all_orders(self, selections=None):
+        """
+        This function is cancelling all the open orders of the account with cancelAllOrders API
+        :param selections: Selection object of the required response fields
+        """
+        return await self.execute("cancelAllOrders", None, selections)
+
+    async def cancel_replace(self, order_id, params, selections=None):
+        """
+        This function is replacing the order with a new one in a single step,
+        the cancellation and the new order are sent at the same time instead of
+        waiting for the cancellation response before posting the new order,
+        so replacing an order costs a single round trip
+        :param order_id: unique ID of the order to be cancelled, None if there is no order
+        :param params: confirmOrder parameters of the new order
+        :param selections: Selection object of the required confirmOrder response fields
+        :return: tuple of the cancelOrder and confirmOrder responses
+        """
+        if order_id is None:
+            return None, await self.confirm_order(params, selections)
+        cancel_response, order_response = await asyncio.gather(
+            self.cancel_order(order_id), self.confirm_order(params, selections)
+        )
+        return cancel_response, order_response
+
+    def shutdown(self, wait=True):
+        """
+        This function is shutting down the worker threads
+        :param wait: if True, waits for the in flight requests to be completed
+        """
+        self.__executor.shutdown(wait=wait)
@@ -0,0 +1,237 @@
+import logging
+import time
+from collections import OrderedDict
+
+from trading_bot.instrumentation import METRICS
+from trading_bot.market_store import channel_records
+
+logger = logging.getLogger(__file__)
+
+# order statuses of the orders which can still be filled or cancelled
+OPEN_STATUSES = frozenset(("created", "requested", "accepted", "open", "delayed"))
+FILLED = "filled"
+CANCELLED = "cancelled"
+# number of the sent orders whose confirmOrder response can be awaited at once
+MAX_EXPECTED_ORDERS = 1000
+
+
+def is_open(order):
+    """
+    This function is checking if the order can still be filled or cancelled,
+    an order without the status (eg. just created) is considered open
+    """
+    status = order.get("status")
+    return status is None or status in OPEN_STATUSES
+
+
+def remaining(order):
+    """
+    This function is returning the quantity of the order which is not filled yet
+    """
+    return max((order.get("quantity") or 0) - (order.get("filled") or 0), 0)
+
+
+class OrderTracker:
+    """
+    This class is keeping the latest state of the bot's orders, fed by the active_orders
+    and the active_trades channels, so the strategies know about the fills and the external
+    cancellations without requesting myOrderHistory or myTradesForOrder.
+
+    The orders are indexed by their id and clientOrderId, the channel may send the updates
+    of an order before the confirmOrder response is received, those are matched by the
+    clientOrderId sent with the order. The order records are updated in place, so the
+    strategy's order always has the latest status and filled quantity.
+
+    The filled quantity never goes back, an order update and the trades of the order
+    are both counting the fills, the higher of them is kept. The final status, eg. filled
+    or cancelled, is not changed by a late delivered update of the open order.
+
+    Only the bot's own orders are tracked, the updates of the orders which were neither
+    tracked nor expected (eg. the orders placed outside of the bot, or the ones that were
+    already forgotten) are ignored. An order is dropped from the tracker once it's filled or
+    cancelled, the record held by the strategy still gets the final status.
+    """
+
+    def __init__(self, metrics=METRICS):
+        """
+        :param metrics: Metrics object the channel counters are recorded in
+        """
+        self.metrics = metrics
+        self.__orders = {}
+        self.__client_orders = {}
+        # clientOrderId of the sent orders to their record, None till an update is received,
+        # the channel may deliver the order before its confirmOrder response
+        self.__expected = OrderedDict()
+        # order id to ids of the trades already counted in its filled quantity
+        self.__trades = {}
+        # monotonic time of the last channel update, None if none is received yet
+        self.updated_at = None
+
+    def __index(self, order):
+        if order.get("id"):
+            self.__orders[order["id"]] = order
+        if order.get("clientOrderId"):
+            self.__client_orders[order["clientOrderId"]] = order
+
+    def __unindex(self, order):
+        if self.__orders.get(order.get("id")) is order:
+            del self.__orders[order["id"]]
+        if self.__client_orders.get(order.get("clientOrderId")) is order:
+            del self.__client_orders[order["clientOrderId"]]
+        self.__trades.pop(order.get("id"), None)
+
+    def __find(self, order_id=None, client_order_id=None):
+        order = self.__orders.get(order_id) if order_id else None
+        if order is None and client_order_id:
+            order = self.__client_orders.get(client_order_id)
+        if order is None and client_order_id:
+            order = self.__expected.get(client_order_id)
+        return order
+
+    def __update_index(self, order):
+        if is_open(order):
+            self.__index(order)
+            return
+        # the finished order is not followed anymore, unless its confirmOrder response is
+        # still awaited, then it's kept to be returned by track
+        self.__unindex(order)
+        if order.get("clientOrderId") in self.__expected:
+            self.__expected[order["clientOrderId"]] = order
+
+    def expect(self, client_order_id):
+        """
+        This function is registering the order which is being sent, so its channel updates
+        received before the confirmOrder response are tracked as well
+        :param client_order_id: clientOrderId sent with the order
+        """
+        self.__expected[client_order_id] = None
+        # the orders whose response never came, eg. the failed requests, are dropped
+        while len(self.__expected) > MAX_EXPECTED_ORDERS:
+            self.__expected.popitem(last=False)
+
+    @staticmethod
+    def __merge(order, update):
+        filled = max(order.get("filled") or 0, update.get("filled") or 0)
+        final_status = None if is_open(order) else order["status"]
+        order.update(update)
+        order["filled"] = filled
+        if order.get("status"):
+            order["status"] = str(order["status"]).lower()
+        # a late update of the open order doesn't reopen the finished one
+        if final_status and is_open(order):
+            order["status"] = final_status
+
+    def track(self, order):
+        """
+        This function is starting to track the order created by the confirmOrder API
+        :param order: order returned by the confirmOrder API
+        :return: the tracked order record, it's updated in place with the channel updates
+        """
+        tracked = self.__find(order.get("id"), order.get("clientOrderId"))
+        self.__expected.pop(order.get("clientOrderId"), None)
+        if tracked is None:
+            tracked = {}
+            self.__merge(tracked, order)
+        else:
+            # the channel updates received before the response are newer than the response
+            received = dict(tracked)
+            self.__merge(tracked, order)
+            self.__merge(tracked, received)
+        self.__update_index(tracked)
+        return tracked
+
+    def apply_order(self, update):
+        """
+        This function is merging the order update of the active_orders channel
+        :param update: order fields with the API field names
+        :return: the updated order record, or None if the order is not tracked
+        """
+        order_id = update.get("id") or update.get("orderId")
+        client_order_id = update.get("clientOrderId")
+        order = self.__find(order_id, client_order_id)
+        if order is None:
+            if client_order_id not in self.__expected:
+                logger.debug("Ignoring the update of the not tracked order %s", order_id)
+                return None
+            # the order is received before its confirmOrder response
+            order = self.__expected[client_order_id] = {}
+        self.__merge(order, update)
+        self.__update_index(order)
+        return order
+
+    def apply_trade(self, trade):
+        """
+        This function is adding the trade of the active_trades channel to the filled
+        quantity of its order, the same trade is counted once
+        :param trade: trade fields with the API field names, having orderId and filled
+        :return: the updated order record, or None if the trade was already counted
+            or its order is not tracked
+        """
+        order_id = trade.get("orderId")
+        if not order_id:
+            return None
+        order = self.__orders.get(order_id)
+        if order is None:
+            # the fills of the order received before its confirmOrder response are counted
+            # by the order updates, they carry the filled quantity as well
+            logger.debug("Ignoring the trade of the not tracked order %s", order_id)
+            return None
+        trade_ids = self.__trades.setdefault(order_id, set())
+        if trade.get("id") in trade_ids:
+            return None
+        if trade.get("id"):
+            trade_ids.add(trade["id"])
+        order["tradedQuantity"] = (order.get("tradedQuantity") or 0) + (trade.get("filled") or 0)
+        order["filled"] = max(order.get("filled") or 0, order["tradedQuantity"])
+        if order.get("quantity") and order["filled"] >= order["quantity"]:
+            order["status"] = FILLED
+            self.__update_index(order)
+        return order
+
+    async def on_active_orders(self, response):
+        """
+        This function is the consumer of the active_orders channel messages
+        """
+        for update in channel_records(response):
+            if self.apply_order(update) is not None:
+                self.metrics.increment("orders.updates")
+        self.updated_at = time.monotonic()
+
+    async def on_active_trades(self, response):
+        """
+        This function is the consumer of the active_trades channel messages
+        """
+        for trade in channel_records(response):
+            if self.apply_trade(trade) is not None:
+                self.metrics.increment("orders.trades")
+        self.updated_at = time.monotonic()
+
+    def get(self, order_id, default=None):
+        return self.__orders.get(order_id, default)
+
+    def get_by_client_order_id(self, client_order_id, default=None):
+        return self.__client_orders.get(client_order_id, default)
+
+    def open_orders(self, market_id=None):
+        """
+        This function is returning the open orders, of the market if the market id is provided
+        """
+        return [
+            order
+            for order in self.__orders.values()
+            if is_open(order) and (market_id is None or order.get("marketId") == market_id)
+        ]
+
+    def forget(self, order):
+        """
+        This function is stopping to track the order, eg. once it's replaced by a new order
+        :param order: tracked order record
+        """
+        self.__unindex(order)
+        self.__expected.pop(order.get("clientOrderId"), None)
+
+    def __contains__(self, order_id):
+        return order_id in self.__orders
+
+    def __len__(self):
+        return len(self.__orders)
@@ -0,0 +1,218 @@
+import json
+import logging
+
+import requests
+from gql.dsl import dsl_gql
+from graphql import print_ast
+from stxsdk.services.authentication import AuthService
+from stxsdk.services.proxy import ProxyCall, call_type_mapper
+from stxsdk.utils import format_failure_response, format_success_response
+
+from trading_bot.exceptions import PreparedQueryError
+from trading_bot.instrumentation import METRICS
+from trading_bot.response_cache import CachedClient, request_key, selection_key
+
+logger = logging.getLogger(__file__)
+
+
+@AuthService.authenticate
+def execute_document(proxy_call, document=None):
+    """
+    This function is executing the compiled document with the client of the operation,
+    it's authenticated the same way as the client operations, eg. the expired token is refreshed
+    :param proxy_call: client operation object, eg. client.marketInfos
+    :param document: compiled DocumentNode of the operation
+    """
+    try:
+        return format_success_response(data=proxy_call.client.execute(document))
+    except Exception as exc:
+        # normalizing the errors the same way as the client operations do
+        errors = ProxyCall.normalize_errors(exc.errors) if hasattr(exc, "errors") else []
+        return format_failure_response(errors=errors, message=errors[0] if errors else str(exc))
+
+
+@AuthService.authenticate
+def fetch_document(proxy_call, query=None, timeout=None):
+    """
+    This function is sending the query with the transport of the client of the operation and
+    returns the raw response body, it's not decoded, checkout trading_bot.lazy_markets
+    :param proxy_call: client operation object, eg. client.marketInfos
+    :param query: printed query of the compiled document
+    :param timeout: seconds to wait for the response, None to wait forever
+    """
+    transport = proxy_call.client.transport
+    try:
+        response = requests.post(
+            transport.url,
+            data=json.dumps({"query": query}),
+            # the authorization header is set by the authentication
+            headers={**(transport.headers or {}), "Content-Type": "application/json"},
+            cookies=transport.cookies,
+            verify=transport.verify,
+            timeout=timeout,
+        )
+        response.raise_for_status()
+    except requests.RequestException as exc:
+        return format_failure_response(errors=[str(exc)], message=str(exc))
+    return format_success_response(data=response.content)
+
+
+def unknown_fields(selections, return_fields, prefix=""):
+    """
+    This function is returning the selected fields which are not in the return fields
+    :param selections: Selection object
+    :param return_fields: fields returned by the client's get_return_fields
+    """
+    unknown = [f"{prefix}{name}" for name in selections.values if name not in return_fields]
+    for name, nested in selections.nested_values.items():
+        if isinstance(return_fields.get(name), dict):
+            unknown += unknown_fields(nested, return_fields[name], f"{prefix}{name}.")
+        else:
+            unknown.append(f"{prefix}{name}")
+    return unknown
+
+
+class PreparedQuery:
+    """
+    This class is the operation compiled with its params and selections once and executed
+    many times, eg. in the polling loops, instead of building the same query on every call.
+
+    The client builds the query tree of the Selection object, serializes and validates
+    it against the schema for every request. The prepared query does it on its first
+    execution and keeps the compiled document, the next executions only send it, eg.
+
+        MARKET_INFOS = PreparedQuery("marketInfos", Selection("marketId", "price"))
+        response = MARKET_INFOS(client)
+
+    The prepared query is immutable and hashable, equal queries have the same key,
+    which is used by the CachedClient as the key of the cached response.
+    The clients which are not the StxClient, eg. the simulated client, are called as usual.
+    """
+
+    def __init__(self, operation, selections=None, params=None):
+        """
+        :param operation: name of the client operation, eg. marketInfos
+        :param selections: Selection object of the required response fields, all by default
+        :param params: parameters of the operation
+        """
+        self.__operation = operation
+        self.__selections = selections
+        # kept serialized, so the params can't be changed after the query is compiled
+        self.__params = json.dumps(params or {}, sort_keys=True)
+        self.__key = request_key(operation, (), {"params": params or {}, "selections": selections})
+        self.__document = None
+        self.__query = None
+
+    @property
+    def operation(self):
+        return self.__operation
+
+    @property
+    def selections(self):
+        return self.__selections
+
+    @property
+    def params(self):
+        return json.loads(self.__params)
+
+    @property
+    def key(self):
+        return self.__key
+
+    @property
+    def is_compiled(self):
+        return self.__document is not None
+
+    def validate(self, client):
+        """
+        This function is checking the selected fields against the operation's return fields
+        :param client: StxClient object
+        """
+        if self.__selections is None:
+            return
+        fields = unknown_fields(self.__selections, client.get_return_fields(self.__operation))
+        if fields:
+            raise PreparedQueryError(
+                f"The {self.__operation} operation doesn't return the fields: {', '.join(fields)}"
+            )
+
+    def compile(self, client):
+        """
+        This function is validating the query and compiling it into the document
+        :param client: StxClient object
+        """
+        self.validate(client)
+        proxy_call = getattr(client, self.__operation)
+        if self.__selections is not None:
+            selections = proxy_call.generate_schema_selections(self.__selections)
+        else:
+            selections = proxy_call.get_all_schema_selections()
+        # building the request on a new field of the operation, the operation object of the
+        # client keeps the nodes of its last request and they are changed by its next request
+        root_type = str(proxy_call.method.parent_type)
+        method = getattr(getattr(client.dsl_schema, root_type), self.__operation)
+        request = method(**self.params).select(*selections)
+        document = dsl_gql(call_type_mapper[root_type](request))
+        # the newer gql versions wrap the document into the request object
+        document_node = getattr(document, "document", document)
+        proxy_call.validate_document_schema(document_node)
+        self.__document = document
+        self.__query = print_ast(document_node)
+        METRICS.increment(f"queries.compiled.{self.__operation}")
+        return self.__document
+
+    def execute(self, client):
+        """
+        This function is executing the query with the client
+        :param client: StxClient object
+        :return: response of the operation
+        """
+        proxy_call = getattr(client, self.__operation)
+        if not isinstance(proxy_call, ProxyCall):
+            return proxy_call(params=self.params or None, selections=self.__selections)
+        if self.__document is None:
+            self.compile(client)
+        return execute_document(proxy_call, document=self.__document)
+
+    def fetch_raw(self, client, timeout=None):
+        """
+        This function is executing the query and returns the response body as it's received,
+        the big responses can be parsed lazily then, eg. LazyMarketInfos of the marketInfos.
+        The raw responses are never cached, the CachedClient's client is used instead.
+        The GraphQL errors are in the body, the response fails only if the request fails
+        :param client: StxClient or CachedClient object
+        :param timeout: seconds to wait for the response, None to wait forever
+        :return: response with the bytes of the JSON body as its data
+        """
+        if isinstance(client, CachedClient):
+            client = client.client
+        proxy_call = getattr(client, self.__operation)
+        if not isinstance(proxy_call, ProxyCall):
+            # eg. the simulated client, its response is encoded the same way as the API body
+            response = self.execute(client)
+            if response["success"]:
+                response["data"] = json.dumps({"data": response["data"]}).encode()
+            return response
+        if self.__document is None:
+            self.compile(client)
+        METRICS.increment(f"queries.raw.{self.__operation}")
+        return fetch_document(proxy_call, query=self.__query, timeout=timeout)
+
+    def __call__(self, client):
+        """
+        This function is executing the query, through the client's cache if it has one
+        :param client: StxClient or CachedClient object
+        """
+        execute_query = getattr(client, "execute_query", None)
+        if execute_query is not None:
+            return execute_query(self)
+        return self.execute(client)
+
+    def __eq__(self, other):
+        return isinstance(other, PreparedQuery) and self.__key == other.key
+
+    def __hash__(self):
+        return hash(self.__key)
+
+    def __repr__(self):
+        return f"PreparedQuery({self.__operation}, {selection_key(self.__selections)}, {self.__params})"
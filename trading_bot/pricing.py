@@ -0,0 +1,187 @@
+import logging
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+logger = logging.getLogger(__file__)
+
+# the percents randomly added to the market probability, and the random order quantities
+PROBABILITY_CAPS = range(11)
+QUANTITIES = range(1, 11)
+
+
+# The price of an order is computed from the market's current probability and its best bid:
+#     price = int(best bid * (probability + probability * probability cap / 100))
+# the price can't be over the market's max price, and it's rounded down to the price
+# increments of the market's orderPriceRules, eg. with the rules
+#     [{"from": 1, "inc": 1, "to": 100}, {"from": 100, "inc": 5, "to": 9900}]
+# the prices 1, 2, .., 100, 105, 110, .., 9900 are valid.
+# The same computation is available for a single market and for many markets at once,
+# the batch functions require NumPy and give the same results as the single market ones.
+
+
+def round_to_rules(price, price_rules):
+    """
+    This function is rounding the price down to the closest valid price of the rules,
+    the prices under the rules are raised to the lowest valid price and the prices over
+    the rules are lowered to the highest valid price
+    :param price: integer price
+    :param price_rules: list of the orderPriceRules dicts having from, inc and to,
+                        if there are no rules the price is returned as it is
+    """
+    if not price_rules:
+        return price
+    rules = sorted(price_rules, key=lambda rule: rule["from"])
+    for rule in rules:
+        if price <= rule["to"]:
+            if price < rule["from"]:
+                # the prices between the rules are raised to the next valid price
+                return rule["from"]
+            return rule["from"] + (price - rule["from"]) // rule["inc"] * rule["inc"]
+    last = rules[-1]
+    return last["from"] + (last["to"] - last["from"]) // last["inc"] * last["inc"]
+
+
+def compute_price(probability, best_bid, max_price=None, price_rules=None, probability_cap=0):
+    """
+    This function is computing the order price of a single market
+    :param probability: current probability of the market
+    :param best_bid: the highest bid price of the market
+    :param max_price: max price of the market, the price can't be over it
+    :param price_rules: orderPriceRules of the market
+    :param probability_cap: percent added to the probability, eg. random.choice(PROBABILITY_CAPS)
+    :return: integer price
+    """
+    # increasing the probability by the percent of the cap
+    probability += probability * probability_cap / 100
+    # type casting to int, because the price should be integer type
+    price = int(best_bid * probability)
+    if max_price is not None:
+        price = min(price, int(max_price))
+    return round_to_rules(price, price_rules)
+
+
+def require_numpy(feature="The batch pricing"):
+    """
+    This function is raising the ImportError if NumPy is not installed, NumPy is an optional
+    dependency used only by the vectorized features, eg. the batch pricing or the MarketTable
+    :param feature: name of the feature in the error message
+    """
+    if np is None:
+        raise ImportError(f"{feature} requires numpy, install it with `pip install numpy`")
+
+
+def rules_arrays(price_rules):
+    """
+    This function is converting the rules of the markets into (from, inc, to) arrays having
+    a row per market and a column per rule sorted by from, the missing rules are padded
+    with the ranges ending at -inf, so they never match a price
+    :param price_rules: list of the orderPriceRules lists, a list per market
+    :return: tuple of the from, inc and to arrays, and the number of the rules per market
+    """
+    require_numpy()
+    counts = np.array([len(rules or ()) for rules in price_rules], dtype=np.intp)
+    width = max(int(counts.max()) if len(counts) else 0, 1)
+    rules = np.full((len(price_rules), width, 3), np.inf)
+    rules[:, :, 2] = -np.inf
+    for row, market_rules in enumerate(price_rules):
+        for column, rule in enumerate(sorted(market_rules or (), key=lambda rule: rule["from"])):
+            rules[row, column] = rule["from"], rule["inc"], rule["to"]
+    return rules[:, :, 0], rules[:, :, 1], rules[:, :, 2], counts
+
+
+def round_to_rules_batch(prices, price_rules):
+    """
+    This function is the vectorized round_to_rules of many markets at once
+    :param prices: integer array of the prices, a price per market
+    :param price_rules: list of the orderPriceRules lists, a list per market, or the arrays
+                        returned by rules_arrays if the same rules are used many times
+    :return: integer array of the rounded prices
+    """
+    require_numpy()
+    starts, increments, ends, counts = (
+        price_rules if isinstance(price_rules, tuple) else rules_arrays(price_rules)
+    )
+    prices = np.asarray(prices, dtype=np.int64)
+    rows = np.arange(len(prices))
+    # the first rule whose range ends at or over the price
+    matches = prices[:, None] <= ends
+    matched = matches.any(axis=1)
+    column = matches.argmax(axis=1)
+    start, increment = starts[rows, column], increments[rows, column]
+    with np.errstate(invalid="ignore"):
+        rounded = np.where(
+            prices < start, start, start + (prices - start) // increment * increment
+        )
+        # the prices over the rules are lowered to the highest valid price of the last rule
+        last = np.maximum(counts - 1, 0)
+        last_start, last_increment = starts[rows, last], increments[rows, last]
+        highest = last_start + (ends[rows, last] - last_start) // last_increment * last_increment
+        rounded = np.where(matched, rounded, highest)
+    # the markets without rules keep their prices
+    return np.where(counts > 0, rounded, prices).astype(np.int64)
+
+
+def compute_prices(
+    probabilities, best_bids, max_prices=None, price_rules=None, probability_caps=0
+):
+    """
+    This function is the vectorized compute_price of many markets at once
+    :param probabilities: array of the market probabilities
+    :param best_bids: array of the highest bid prices, NaN for the markets without bids
+    :param max_prices: optional array of the market max prices, NaN for the unknown ones
+    :param price_rules: optional list of the orderPriceRules lists, a list per market
+    :param probability_caps: array of the percents added to the probabilities, or a single value
+    :return: integer array of the prices, -1 for the markets without bids
+    """
+    require_numpy()
+    probabilities = np.asarray(probabilities, dtype=np.float64)
+    best_bids = np.asarray(best_bids, dtype=np.float64)
+    probabilities = probabilities + probabilities * np.asarray(probability_caps) / 100
+    prices = best_bids * probabilities
+    missing = np.isnan(prices)
+    prices = np.trunc(np.where(missing, 0, prices)).astype(np.int64)
+    if max_prices is not None:
+        max_prices = np.asarray(max_prices, dtype=np.float64)
+        # the markets without the max price are not limited
+        limited = np.minimum(prices, np.nan_to_num(max_prices, nan=0).astype(np.int64))
+        prices = np.where(np.isnan(max_prices), prices, limited)
+    if price_rules is not None:
+        prices = round_to_rules_batch(prices, price_rules)
+    return np.where(missing, -1, prices)
+
+
+def draw_quotes(generator, count):
+    """
+    This function is drawing the random probability caps and quantities of the markets,
+    the caps are drawn first and the quantities after them, so the same seeded generator
+    always gives the same quotes
+    :param generator: numpy.random.Generator object
+    :param count: number of the markets
+    :return: tuple of the probability caps and the quantities arrays
+    """
+    probability_caps = generator.integers(PROBABILITY_CAPS.start, PROBABILITY_CAPS.stop, count)
+    quantities = generator.integers(QUANTITIES.start, QUANTITIES.stop, count)
+    return probability_caps, quantities
+
+
+def quote_batch(probabilities, best_bids, max_prices, price_rules=None, generator=None):
+    """
+    This function is computing the order prices and quantities of many markets in one call,
+    eg. to quote thousands of markets on every tick
+    :param probabilities: array of the market probabilities
+    :param best_bids: array of the highest bid prices, NaN for the markets without bids
+    :param max_prices: array of the market max prices
+    :param price_rules: optional list of the orderPriceRules lists, a list per market
+    :param generator: numpy.random.Generator object or a seed, the same seed gives the
+                      same quotes, a random generator is used if not provided
+    :return: tuple of the integer prices and quantities arrays, the price is -1
+             for the markets without bids
+    """
+    require_numpy()
+    generator = np.random.default_rng(generator)
+    probability_caps, quantities = draw_quotes(generator, len(probabilities))
+    prices = compute_prices(probabilities, best_bids, max_prices, price_rules, probability_caps)
+    return prices, quantities
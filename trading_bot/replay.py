@@ -0,0 +1,323 @@
+import asyncio
+import itertools
+import json
+import logging
+import random
+import threading
+import time
+
+from stxsdk.config.channels import CHANNELS
+from stxsdk.utils import format_failure_response, format_success_response
+
+from trading_bot.market_store import MARKET_UPDATED, to_record_field
+
+logger = logging.getLogger(__file__)
+
+
+# The replay module provides local stand-ins for StxClient and StxChannelClient, so the
+# trading bot can be run without credentials and live feed, eg. for the benchmarks.
+# The recorded channel messages are stored as JSON lines, one channel response per line,
+# in the same format as they are passed to the channel consumers:
+#   {"closed": false, "message_received": true, "message": "Message received",
+#    "data": [null, null, "market_info", "market_updated", {"<market_id>": {...}}]}
+
+
+def load_frames(path):
+    """
+    This function is loading the recorded channel messages from the JSON lines file
+    :param path: path of the recorded messages file
+    :return: list of the channel messages
+    """
+    with open(path) as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+
+class FrameRecorder:
+    """
+    This class is a channel consumer that records the received messages to the JSON lines file,
+    it can be passed as on_message consumer of any *_join function to record a live feed,
+    or wrap another consumer to record the messages while they are processed.
+    """
+
+    def __init__(self, path, consumer=None):
+        """
+        :param path: path of the file the messages are appended to
+        :param consumer: optional consumer the messages are passed to after recording
+        """
+        self.file = open(path, "a")
+        self.consumer = consumer
+
+    async def __call__(self, response):
+        self.file.write(json.dumps(response) + "\n")
+        if self.consumer is not None:
+            await self.consumer(response)
+
+    def close(self):
+        self.file.close()
+
+
+def frame_timestamp(response):
+    """
+    This function is returning the latest unix_timestamp (microseconds) of the message updates
+    """
+    data = response.get("data")
+    if not data or len(data) < 5 or not isinstance(data[4], dict):
+        return None
+    timestamps = [
+        update.get("unix_timestamp")
+        for update in data[4].values()
+        if isinstance(update, dict) and update.get("unix_timestamp")
+    ]
+    return max(timestamps) if timestamps else None
+
+
+def markets_from_frames(frames):
+    """
+    This function is building the marketInfos records of the markets seen in the messages,
+    it's used when the markets snapshot is not recorded along with the messages.
+    The first update of each market is used, the missing fields are filled with defaults.
+    """
+    markets = {}
+    for response in frames:
+        data = response.get("data") or ()
+        if len(data) < 5 or not isinstance(data[4], dict):
+            continue
+        for market_id, update in data[4].items():
+            if market_id in markets:
+                continue
+            market = {
+                "marketId": market_id,
+                "shortTitle": market_id,
+                "title": market_id,
+                "status": "open",
+                "maxPrice": 10000,
+                "bids": [],
+                "offers": [],
+            }
+            market.update({to_record_field(field): value for field, value in update.items()})
+            market.setdefault("probability", (market.get("price") or 0) / market["maxPrice"])
+            markets[market_id] = market
+    return list(markets.values())
+
+
+def synthetic_feed(markets_count=100, frames_count=10000, markets_per_frame=5, seed=0):
+    """
+    This function is generating the random markets and the market_updated messages
+    moving their prices, it's used when there is no recorded feed
+    :param markets_count: number of the markets
+    :param frames_count: number of the channel messages
+    :param markets_per_frame: number of the market updates in each message
+    :param seed: seed of the random generator, the same seed gives the same feed
+    :return: tuple of the marketInfos records and the channel messages
+    """
+    generator = random.Random(seed)
+    markets = []
+    for index in range(markets_count):
+        price = generator.randint(1000, 9000)
+        markets.append(
+            {
+                "marketId": f"market-{index}",
+                "shortTitle": f"M{index}",
+                "title": f"Market {index}",
+                "status": "open",
+                "eventStatus": "scheduled",
+                "maxPrice": 10000,
+                "price": float(price),
+                "probability": price / 10000,
+                "timestampInt": 0,
+                "bids": [{"price": price - 100, "quantity": generator.randint(1, 50)}],
+                "offers": [{"price": price + 100, "quantity": generator.randint(1, 50)}],
+                "orderPriceRules": [{"from": 1, "inc": 1, "to": 9999}],
+            }
+        )
+    prices = {market["marketId"]: market["price"] for market in markets}
+    unix_timestamp = 1673974406324012
+    frames = []
+    for _ in range(frames_count):
+        updates = {}
+        for market in generator.sample(markets, min(markets_per_frame, markets_count)):
+            market_id = market["marketId"]
+            # random walk of the price, with the occasional jumps triggering the requotes
+            step = generator.choice((-1, 1)) * generator.choice((10, 20, 50, 500))
+            prices[market_id] = min(9900.0, max(100.0, prices[market_id] + step))
+            unix_timestamp += generator.randint(100, 5000)
+            price = int(prices[market_id])
+            updates[market_id] = {
+                "market_id": market_id,
+                "price": prices[market_id],
+                "bids": [{"price": price - 100, "quantity": generator.randint(1, 50)}],
+                "offers": [{"price": price + 100, "quantity": generator.randint(1, 50)}],
+                "timestamp": "",
+                "unix_timestamp": unix_timestamp,
+            }
+        frames.append(
+            {
+                "closed": False,
+                "message_received": True,
+                "message": "Message received",
+                "data": [None, None, "market_info", MARKET_UPDATED, updates],
+            }
+        )
+    return markets, frames
+
+
+class SimulatedClient:
+    """
+    This class is a local stand-in of the StxClient, it answers the operations used by
+    the trading bot from memory with the simulated network latency.
+    The responses have the same structure as the StxClient responses.
+    It's safe to be shared by the order gateway threads.
+    """
+
+    def __init__(self, markets, latency=0.0, jitter=0.0, seed=0):
+        """
+        :param markets: list of the marketInfos records returned by the marketInfos operation
+        :param latency: seconds every request takes
+        :param jitter: maximum random seconds added to the latency
+        :param seed: seed of the jitter random generator
+        """
+        self.markets = markets
+        self.latency = latency
+        self.jitter = jitter
+        self.open_orders = {}
+        self.requests = {}
+        self.__ids = itertools.count(1)
+        self.__random = random.Random(seed)
+        self.__lock = threading.Lock()
+
+    def __request(self, operation):
+        with self.__lock:
+            self.requests[operation] = self.requests.get(operation, 0) + 1
+            delay = self.latency + self.__random.uniform(0, self.jitter)
+        if delay:
+            time.sleep(delay)
+
+    def login(self, params=None, selections=None):
+        self.__request("login")
+        return format_success_response(data={"login": {}})
+
+    def confirm2Fa(self, params=None, selections=None):
+        self.__request("confirm2Fa")
+        return format_success_response(data={"confirm2Fa": {}})
+
+    def marketInfos(self, params=None, selections=None):
+        self.__request("marketInfos")
+        return format_success_response(data={"marketInfos": self.markets})
+
+    def confirmOrder(self, params=None, selections=None):
+        self.__request("confirmOrder")
+        user_order = params["userOrder"]
+        if int(user_order.get("quantity") or 0) <= 0:
+            return format_failure_response(errors=["invalid quantity"], message="invalid quantity")
+        with self.__lock:
+            order = dict(user_order, id=f"order-{next(self.__ids)}", status="open", filled=0)
+            self.open_orders[order["id"]] = order
+        return format_success_response(data={"confirmOrder": {"order": order, "errors": None}})
+
+    def cancelOrder(self, params=None, selections=None):
+        self.__request("cancelOrder")
+        with self.__lock:
+            order = self.open_orders.pop(params["orderId"], None)
+        status = "cancelled" if order else "not_found"
+        return format_success_response(data={"cancelOrder": {"status": status}})
+
+    def cancelOrders(self, params=None, selections=None):
+        self.__request("cancelOrders")
+        results = []
+        with self.__lock:
+            for order_id in params["orderIds"]:
+                order = self.open_orders.pop(order_id, None)
+                results.append(
+                    {"orderId": order_id, "status": "cancelled" if order else "not_found"}
+                )
+        return format_success_response(data={"cancelOrders": results})
+
+    def cancelAllOrders(self, params=None, selections=None):
+        self.__request("cancelAllOrders")
+        with self.__lock:
+            results = [
+                {"orderId": order_id, "status": "cancelled"} for order_id in self.open_orders
+            ]
+            self.open_orders.clear()
+        return format_success_response(data={"cancelAllOrders": results})
+
+
+class ReplayChannelClient:
+    """
+    This class is a local stand-in of the StxChannelClient, its *_join functions pass
+    the recorded messages of the channel to the consumers instead of connecting with the server.
+
+    The messages are replayed as fast as possible, or paced by their unix_timestamp
+    like they were received, the speed multiplies the recorded pace, eg. 10 replays 10x faster.
+    Once all the messages are replayed, the on_close consumer is called like the
+    connection is terminated.
+    """
+
+    def __init__(self, frames, speed=None):
+        """
+        :param frames: list of the recorded channel messages
+        :param speed: None to replay as fast as possible, or the multiplier of the recorded pace
+        """
+        self.frames = frames
+        self.speed = speed
+        # injecting the join functions of all the channels like the StxChannelClient does
+        for channel_name in CHANNELS:
+            setattr(self, f"{channel_name}_join", self.__join_function(channel_name))
+
+    def __join_function(self, channel_name):
+        async def join(**consumers):
+            await self.join(channel_name, **consumers)
+
+        return join
+
+    def login(self, params):
+        return format_success_response(data={"login": {}})
+
+    def confirm2Fa(self, params):
+        return format_success_response(data={"confirm2Fa": {}})
+
+    async def join(
+        self,
+        channel_name,
+        *,
+        on_open=None,
+        on_message=None,
+        on_close=None,
+        on_error=None,
+        default=None,
+    ):
+        """
+        This function is replaying the recorded messages of the channel to the consumers
+        :param channel_name: name of the channel, eg. market_info
+        """
+        consumer = on_open or default
+        if consumer:
+            await consumer(
+                {"closed": False, "message_received": True,
+                 "message": "Connection Initiated", "data": None}
+            )
+        consumer = on_message or default
+        started_at, first_timestamp = time.monotonic(), None
+        for response in self.frames:
+            data = response.get("data") or ()
+            # the topic of the user channels is suffixed with the user id, eg. portfolio:<uid>
+            if len(data) < 3 or str(data[2]).split(":")[0] != channel_name:
+                continue
+            if self.speed:
+                timestamp = frame_timestamp(response)
+                if timestamp is not None:
+                    first_timestamp = first_timestamp or timestamp
+                    due = (timestamp - first_timestamp) / 1_000_000 / self.speed
+                    delay = due - (time.monotonic() - started_at)
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+            if consumer:
+                await consumer(response)
+            # giving the other tasks (eg. strategies) a chance to run between the messages
+            await asyncio.sleep(0)
+        consumer = on_close or default
+        if consumer:
+            await consumer(
+                {"closed": True, "message_received": False,
+                 "message": "Connection Terminated", "data": None}
+            )
@@ -0,0 +1,212 @@
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from trading_bot.instrumentation import METRICS
+
+logger = logging.getLogger(__file__)
+
+# seconds the responses of the read only operations are cached for, None to cache them
+# until they are invalidated or evicted, the operations not listed here are never cached
+DEFAULT_TTLS = {
+    "marketInfos": 60,
+    "marketFilterTree": 300,
+    "userProfile": 300,
+    # the return fields are computed from the schema, they never change
+    "get_return_fields": None,
+}
+
+# the cached operations whose responses are outdated by the messages of the channel
+CHANNEL_INVALIDATIONS = {
+    "market_info": ("marketInfos", "marketFilterTree"),
+    "user_info": ("userProfile",),
+}
+
+
+def selection_key(selections):
+    """
+    This function is returning the canonical form of the Selection object, the same fields
+    give the same key whatever order they are listed in
+    :param selections: Selection object, None for all the fields
+    """
+    if selections is None:
+        return None
+    return (
+        tuple(sorted(selections.values)),
+        tuple(sorted((name, selection_key(nested)) for name, nested in selections.nested_values.items())),
+    )
+
+
+def request_key(operation, args, kwargs):
+    """
+    This function is returning the cache key of the operation call, the hash of the operation
+    name, its params and the canonical form of its selections
+    """
+    kwargs = dict(kwargs)
+    selections = selection_key(kwargs.pop("selections", None))
+    # the call without params is the same as the call with the empty params
+    kwargs["params"] = kwargs.get("params") or {}
+    payload = json.dumps([operation, args, kwargs, selections], sort_keys=True, default=str)
+    return hashlib.blake2b(payload.encode(), digest_size=16).hexdigest()
+
+
+class ResponseCache:
+    """
+    This class is the LRU cache of the responses with the time to live per operation, its size
+    is bounded by the bytes of the cached responses, the least recently used responses are
+    evicted once it's over the limit.
+
+    The responses are kept serialized, so every hit returns a new copy of the response and
+    the callers can modify it, eg. the market store updates the markets in place.
+    It's safe to be shared between threads.
+    """
+
+    def __init__(self, max_bytes=16 * 1024 * 1024, ttls=None, metrics=METRICS):
+        """
+        :param max_bytes: maximum size of the cached responses
+        :param ttls: operation to time to live map, checkout DEFAULT_TTLS
+        :param metrics: Metrics object the cache hits and misses are recorded in
+        """
+        self.max_bytes = max_bytes
+        self.ttls = DEFAULT_TTLS if ttls is None else ttls
+        self.metrics = metrics
+        # key to (operation, expiry time, serialized response) map, the most recent last
+        self.__entries = OrderedDict()
+        self.__lock = threading.Lock()
+        self.size = 0
+
+    def is_cached(self, operation):
+        return operation in self.ttls
+
+    def get(self, key):
+        """
+        This function is returning the cached response, None if it's not cached or expired
+        """
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if entry is None:
+                return None
+            operation, expires_at, blob = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                self.__remove(key)
+                return None
+            self.__entries.move_to_end(key)
+        return json.loads(blob)
+
+    def put(self, key, operation, response):
+        """
+        This function is caching the response, the response bigger than the cache is not cached
+        """
+        blob = json.dumps(response, default=str).encode()
+        if len(blob) > self.max_bytes:
+            return
+        ttl = self.ttls.get(operation)
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        with self.__lock:
+            if key in self.__entries:
+                self.__remove(key)
+            self.__entries[key] = (operation, expires_at, blob)
+            self.size += len(blob)
+            while self.size > self.max_bytes:
+                self.__remove(next(iter(self.__entries)))
+                self.metrics.increment("cache.evicted")
+
+    def __remove(self, key):
+        _, _, blob = self.__entries.pop(key)
+        self.size -= len(blob)
+
+    def invalidate(self, *operations):
+        """
+        This function is removing the cached responses of the operations, all of them by default
+        """
+        with self.__lock:
+            for key, (operation, _, _) in list(self.__entries.items()):
+                if not operations or operation in operations:
+                    self.__remove(key)
+
+    async def on_channel_message(self, response):
+        """
+        This function is invalidating the responses outdated by the channel message,
+        it can be passed as the on_message of the channels, checkout CHANNEL_INVALIDATIONS
+        """
+        data = response.get("data")
+        if not data or len(data) < 3 or not isinstance(data[2], str):
+            return
+        operations = CHANNEL_INVALIDATIONS.get(data[2].split(":")[0])
+        if operations:
+            self.invalidate(*operations)
+
+    def __len__(self):
+        return len(self.__entries)
+
+
+class CachedClient:
+    """
+    This class is the read through cache in front of the StxClient object, eg.
+
+        client = CachedClient(StxClient())
+        # the first call requests the markets, the next calls are served from the cache
+        client.marketInfos(selections=selections)
+
+    The read only operations of the cache's ttls are cached by their params and selections,
+    the failed responses are not cached. All the other operations, eg. confirmOrder,
+    cancelOrder or logout, are passed to the client as they are, and logout clears the cache,
+    because the cached responses belong to the logged out user.
+    """
+
+    def __init__(self, client, cache=None):
+        """
+        :param client: StxClient object
+        :param cache: ResponseCache object, created with the default ttls if not provided
+        """
+        self.client = client
+        self.cache = cache if cache is not None else ResponseCache()
+
+    def __getattr__(self, operation):
+        method = getattr(self.client, operation)
+        if operation == "logout":
+            return self.__logout(method)
+        if not self.cache.is_cached(operation):
+            return method
+
+        def cached_method(*args, **kwargs):
+            key = request_key(operation, args, kwargs)
+            response = self.cache.get(key)
+            if response is not None:
+                self.cache.metrics.increment(f"cache.hits.{operation}")
+                return response
+            self.cache.metrics.increment(f"cache.misses.{operation}")
+            response = method(*args, **kwargs)
+            # the API responses have the success flag, get_return_fields returns the fields
+            if not isinstance(response, dict) or response.get("success", True):
+                self.cache.put(key, operation, response)
+            return response
+
+        return cached_method
+
+    def execute_query(self, query):
+        """
+        This function is executing the PreparedQuery, its response is cached by the query's key
+        :param query: PreparedQuery object
+        """
+        if not self.cache.is_cached(query.operation):
+            return query.execute(self.client)
+        response = self.cache.get(query.key)
+        if response is not None:
+            self.cache.metrics.increment(f"cache.hits.{query.operation}")
+            return response
+        self.cache.metrics.increment(f"cache.misses.{query.operation}")
+        response = query.execute(self.client)
+        if response["success"]:
+            self.cache.put(query.key, query.operation, response)
+        return response
+
+    def __logout(self, method):
+        def logout(*args, **kwargs):
+            self.cache.invalidate()
+            return method(*args, **kwargs)
+
+        return logout
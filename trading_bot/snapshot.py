@@ -0,0 +1,262 @@
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+import time
+from collections.abc import Mapping
+
+from trading_bot.exceptions import SnapshotError
+from trading_bot.lazy_markets import LazyMarketIndex
+
+logger = logging.getLogger(__file__)
+
+# default location of the markets snapshot, next to the current working directory
+DEFAULT_SNAPSHOT_PATH = ".stx_markets.snapshot"
+# fields the saved markets can be looked up by, besides their marketId, checkout by_field
+DEFAULT_INDEX_FIELDS = ("shortTitle",)
+
+# The snapshot file stores the marketInfos records keyed by marketId:
+#   header   magic, version, saved-at unix time, number of the markets and of the hash slots,
+#            offset of the field indexes
+#   slots    open addressing hash table of (marketId hash, record offset, record length)
+#   records  compact JSON of every market record, separated by commas, so all the records
+#            can be decoded at once as a JSON array
+#   indexes  JSON object of the field indexes, the field to field value to marketId maps,
+#            eg. of the short titles, and of the groups, the named lists of the marketIds
+# The file is memory mapped and only the header is read on open, a record is decoded
+# when it's looked up, so opening the snapshot doesn't depend on the number of the markets.
+# The indexes and the groups are decoded on their first use, it's the only part of the file
+# whose decoding depends on the number of the markets.
+MAGIC = b"STXMKTS"
+VERSION = 3
+HEADER = struct.Struct("<7sBdIIQ")
+SLOT = struct.Struct("<QQI")
+
+
+def market_hash(market_id):
+    """
+    This function is returning the 64 bits hash of the market id used by the hash slots,
+    0 marks the empty slot, so it's never returned
+    """
+    digest = hashlib.blake2b(market_id.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "little") or 1
+
+
+class MarketSnapshot(Mapping):
+    """
+    This class is a read only marketId to market record map of the memory mapped snapshot file.
+
+    It's used to start with the markets of the previous run right away, while the fresh
+    markets are fetched in the background, eg.
+
+        snapshot = MarketSnapshot.open(path)
+        market = snapshot["d76112d8-2537-4c20-a376-37c74fbe7977"]
+        market = snapshot.by_field("shortTitle")["BHL @ MPH"]
+        markets = [snapshot[market_id] for market_id in snapshot.group("eligible")]
+        logger.info("The markets are %.0f seconds old.", snapshot.age)
+    """
+
+    def __init__(self, buffer, saved_at, count, slots, indexes_offset, file=None):
+        self.__buffer = buffer
+        self.__file = file
+        self.saved_at = saved_at
+        self.__count = count
+        self.__slots = slots
+        self.__indexes_offset = indexes_offset
+        self.__indexes = None
+
+    @classmethod
+    def open(cls, path):
+        """
+        This function is memory mapping the snapshot file
+        :param path: path of the snapshot file
+        """
+        try:
+            file = open(path, "rb")
+        except OSError as exc:
+            raise SnapshotError(f"Failed to open the snapshot {path}: {exc}")
+        try:
+            buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # an empty file can't be mapped
+            file.close()
+            raise SnapshotError(f"The snapshot {path} is empty.")
+        if len(buffer) < HEADER.size:
+            buffer.close()
+            file.close()
+            raise SnapshotError(f"The snapshot {path} is corrupted.")
+        magic, version, saved_at, count, slots, indexes_offset = HEADER.unpack_from(buffer, 0)
+        records_offset = HEADER.size + slots * SLOT.size
+        if (
+            magic != MAGIC
+            or version != VERSION
+            or not records_offset <= indexes_offset <= len(buffer)
+        ):
+            buffer.close()
+            file.close()
+            raise SnapshotError(f"The snapshot {path} is not supported or corrupted.")
+        return cls(buffer, saved_at, count, slots, indexes_offset, file)
+
+    @staticmethod
+    def save(path, markets, saved_at=None, index_fields=DEFAULT_INDEX_FIELDS, groups=None):
+        """
+        This function is writing the markets to the snapshot file, the file is replaced
+        atomically, so the running readers keep the previous snapshot
+        :param path: path of the snapshot file
+        :param markets: iterable of the marketInfos records
+        :param saved_at: unix time of the markets, the current time by default
+        :param index_fields: fields the markets can be looked up by, checkout by_field
+        :param groups: name to marketIds map of the markets to be looked up together,
+        eg. the eligible ones, checkout group
+        :return: number of the saved markets
+        """
+        records = {market["marketId"]: market for market in markets}
+        indexes = {field: {} for field in index_fields}
+        # keeping the table at most half full, so the lookups need few probes
+        slots = 1
+        while slots < len(records) * 2:
+            slots *= 2
+        table = [(0, 0, 0)] * slots
+        blobs = []
+        offset = HEADER.size + slots * SLOT.size
+        for market_id, market in records.items():
+            blob = json.dumps(market, separators=(",", ":")).encode()
+            hash_value = market_hash(market_id)
+            index = hash_value & (slots - 1)
+            while table[index][0]:
+                index = (index + 1) & (slots - 1)
+            table[index] = (hash_value, offset, len(blob))
+            blobs.append(blob)
+            # the record and its comma separator
+            offset += len(blob) + 1
+            for field, values in indexes.items():
+                if market.get(field) is not None:
+                    values[market[field]] = market_id
+        body = b",".join(blobs)
+        indexes_offset = HEADER.size + slots * SLOT.size + len(body)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as file:
+            file.write(
+                HEADER.pack(
+                    MAGIC, VERSION, saved_at or time.time(), len(records), slots, indexes_offset
+                )
+            )
+            file.write(b"".join(SLOT.pack(*slot) for slot in table))
+            file.write(body)
+            file.write(
+                json.dumps(
+                    {"indexes": indexes, "groups": groups or {}}, separators=(",", ":")
+                ).encode()
+            )
+        os.replace(temp_path, path)
+        return len(records)
+
+    @property
+    def age(self):
+        # seconds since the markets were saved
+        return time.time() - self.saved_at
+
+    def __record(self, offset, length):
+        return json.loads(self.__buffer[offset:offset + length])
+
+    def __slot(self, index):
+        return SLOT.unpack_from(self.__buffer, HEADER.size + index * SLOT.size)
+
+    def __getitem__(self, market_id):
+        if not self.__slots:
+            raise KeyError(market_id)
+        hash_value = market_hash(market_id)
+        index = hash_value & (self.__slots - 1)
+        while True:
+            slot_hash, offset, length = self.__slot(index)
+            if not slot_hash:
+                raise KeyError(market_id)
+            if slot_hash == hash_value:
+                market = self.__record(offset, length)
+                # the different market ids can have the same hash
+                if market["marketId"] == market_id:
+                    return market
+            index = (index + 1) & (self.__slots - 1)
+
+    def values(self):
+        # decoding all the records at once, it's much faster than the lookups by key
+        start = HEADER.size + self.__slots * SLOT.size
+        try:
+            return json.loads(b"[" + self.__buffer[start:self.__indexes_offset] + b"]")
+        except ValueError as exc:
+            raise SnapshotError(f"The snapshot records are corrupted: {exc}")
+
+    def __load_indexes(self):
+        # the field indexes and the groups, decoded on the first use
+        if self.__indexes is None:
+            try:
+                self.__indexes = json.loads(self.__buffer[self.__indexes_offset:])
+            except ValueError as exc:
+                raise SnapshotError(f"The snapshot indexes are corrupted: {exc}")
+        return self.__indexes
+
+    @property
+    def indexes(self):
+        # field to field value to marketId maps of the index fields
+        return self.__load_indexes()["indexes"]
+
+    def group(self, name):
+        """
+        This function is returning the marketIds of the group the snapshot is saved with,
+        the markets are looked up by them, so only the markets of the group are decoded
+        :param name: one of the groups the snapshot is saved with
+        """
+        groups = self.__load_indexes()["groups"]
+        if name not in groups:
+            raise SnapshotError(f"The snapshot has no group {name}.")
+        return groups[name]
+
+    def by_field(self, field):
+        """
+        This function is returning the read only map of the markets by the index field, eg.
+        the markets by their short titles, the markets are decoded when they are looked up
+        :param field: one of the index_fields the snapshot is saved with
+        """
+        if field not in self.indexes:
+            raise SnapshotError(f"The snapshot has no index of {field}.")
+        return LazyMarketIndex(self, field)
+
+    def __iter__(self):
+        return (market["marketId"] for market in self.values())
+
+    def __len__(self):
+        return self.__count
+
+    def close(self):
+        self.__buffer.close()
+        if self.__file is not None:
+            self.__file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def load_snapshot(path=DEFAULT_SNAPSHOT_PATH, max_age=None):
+    """
+    This function is opening the markets snapshot if it's available
+    :param path: path of the snapshot file
+    :param max_age: seconds after which the snapshot is too old to be used, by default any age
+    :return: MarketSnapshot object, or None if the snapshot is missing, corrupted or too old
+    """
+    if not os.path.exists(path):
+        return None
+    try:
+        snapshot = MarketSnapshot.open(path)
+    except SnapshotError as exc:
+        logger.warning(str(exc))
+        return None
+    if max_age is not None and snapshot.age > max_age:
+        logger.info("The snapshot %s is %.0f seconds old, not using it.", path, snapshot.age)
+        snapshot.close()
+        return None
+    return snapshot
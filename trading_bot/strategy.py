@@ -0,0 +1,429 @@
+import asyncio
+import logging
+import random
+import time
+import uuid
+
+from trading_bot.exceptions import OrderCreationFailure, OrderValidationError
+from trading_bot.instrumentation import METRICS
+from trading_bot.market_store import MARKET_UPDATED
+from trading_bot.order_book import OrderBook
+from trading_bot.order_tracker import FILLED, is_open, remaining
+from trading_bot.pricing import PROBABILITY_CAPS, QUANTITIES, compute_price
+from trading_bot.validation import OrderValidator
+
+logger = logging.getLogger(__file__)
+
+
+class MarketStrategy:
+    """
+    This class is trading a single market, the trading bot creates one strategy object
+    for each picked market and every strategy has its own order state.
+     - Compute the price using the market's probability and place an order.
+     - Check if the market price shifts 5% either up down.
+       - Cancel the created order.
+       - Post new order with new price.
+       Both requests are sent together, and while a replacement is in flight
+       the next shifts are coalesced, only the latest price is placed afterwards.
+
+    The market updates are handed to the strategy by the dispatcher and queued, the strategy
+    processes them in its own asyncio task, so the updates of a market are processed in order
+    and a slow market never delays the channel messages or the other markets.
+
+    If the OrderTracker is provided, the order is kept up to date with its fills and
+    external cancellations, a filled order is not replaced, an externally cancelled order
+    is not cancelled again and a partially filled order is replaced with its remaining quantity.
+    The order which failed to be cancelled is kept in pending_cancels, its cancellation is
+    retried before the next replacement and on the stop, and no new order is posted
+    while it can't be cancelled, so the orders are never left live and untracked.
+    Every order is checked by the OrderValidator before it's sent, eg. the orders of the closed
+    market or the orders which the available balance of the AccountState doesn't cover
+    are not sent at all.
+    """
+
+    def __init__(self, market, gateway, book=None, tracker=None, account=None, validator=None):
+        """
+        :param market: market record from the market store, it's kept up to date by the store
+        :param gateway: OrderGateway or OrderBatcher object used for the order requests
+        :param book: OrderBook object of the market, built from the market record if not provided
+        :param tracker: optional OrderTracker object fed by the active orders and trades channels
+        :param account: optional AccountState object fed by the portfolio and positions channels
+        :param validator: OrderValidator object, created with the account if not provided
+        """
+        self.market = market
+        self.gateway = gateway
+        self.book = book if book is not None else OrderBook.from_market(market)
+        self.tracker = tracker
+        self.account = account
+        self.validator = validator if validator is not None else OrderValidator(account)
+        self.order = None
+        # order id to order map of the orders which failed to be cancelled, they are still live
+        self.pending_cancels = {}
+        self.task = None
+        self.updates = None
+        # price of the current order, or of the replacement order if it is in flight
+        self.quoted_price = None
+        # latest requested replacement price which is not sent yet
+        self.target_price = None
+        # time when the latest replacement was requested, used for the requote latency
+        self.target_requested_at = None
+        self.replace_task = None
+
+    @property
+    def market_id(self):
+        return self.market["marketId"]
+
+    def compute_price(self):
+        """
+        This function is computing the price using the market's current probability
+        on which the order would be placed.
+        """
+        # extract the current probability of the market
+        probability = self.market["probability"]
+        logger.debug(
+            "Computing the price for order creation of market %s, "
+            "market current probability is %s",
+            self.market_id,
+            probability,
+        )
+        # get random probability cap between 0 and 10 to add into the market current probability
+        probability_cap = random.choice(PROBABILITY_CAPS)
+        # get the max price of all the bids, the book keeps the bids sorted by price
+        max_market_price = self.book.best_bid
+        # price = integer type (max market price * increased probability),
+        # limited by the market's max price and rounded to its order price rules
+        # checkout trading_bot.pricing for the details and the batch version of it
+        price = compute_price(
+            probability,
+            max_market_price,
+            self.market.get("maxPrice"),
+            self.market.get("orderPriceRules"),
+            probability_cap,
+        )
+        logger.debug("Computed price is %s", price)
+        return price
+
+    @staticmethod
+    def get_quantity():
+        # returns random quantity between 1 and 10
+        return random.choice(QUANTITIES)
+
+    def get_order_params(self, quantity, price):
+        """
+        This function is generating the request params for order creation
+        :param quantity: quantity of the shares to be purchased
+        :param price: the price at which the shares would be purchased
+        """
+        logger.debug(
+            "Initiating to create the order for market id: %s, with price: %s and quantity: %s.",
+            self.market_id,
+            price,
+            quantity,
+        )
+        # used to match the channel updates received before the confirmOrder response
+        client_order_id = uuid.uuid4().hex
+        if self.tracker is not None:
+            self.tracker.expect(client_order_id)
+        return {
+            "userOrder": {
+                "marketId": self.market_id,
+                "orderType": "LIMIT",
+                "action": "BUY",
+                "quantity": quantity,
+                "price": price,
+                "clientOrderId": client_order_id,
+            }
+        }
+
+    def validate_order(self, quantity, price, released=0):
+        """
+        This function is checking the order against the cached market and account data,
+        so the order which would be rejected is not sent to the server
+        :param quantity: quantity of the shares to be purchased
+        :param price: the price at which the shares would be purchased
+        :param released: cost of the order cancelled together with this one
+        :return: tuple of the valid quantity and price
+        """
+        try:
+            return self.validator.validate(self.market, quantity, price, released=released)
+        except OrderValidationError as exc:
+            logger.error("Order of market %s is not valid: %s", self.market_id, exc)
+            raise
+
+    def set_order(self, order_response):
+        """
+        This function is setting the created order to the strategy object
+        :param order_response: response of the confirmOrder API
+        """
+        # if the response is not successful raise the exception
+        if not order_response["success"]:
+            msg = f"Order creating failed with error {order_response['message']}"
+            logger.error(msg)
+            raise OrderCreationFailure(msg)
+        # if order created successfully then set the order data to the strategy object
+        order = order_response["data"]["confirmOrder"]["order"]
+        order_total = order["quantity"] * order["price"]
+        logger.info(
+            "Order is created with id: %s and total price is %s", order["id"], order_total
+        )
+        if self.tracker is not None:
+            order = self.tracker.track(order)
+        if self.account is not None:
+            self.account.reserve(order_total)
+        self.order = order
+        self.quoted_price = order["price"]
+
+    async def create_order(self, quantity, price):
+        """
+        This function is posting a new order with the provided details
+        :param quantity: quantity of the shares to be purchased
+        :param price: the price at which the shares would be purchased
+        """
+        quantity, price = self.validate_order(quantity, price)
+        params = self.get_order_params(quantity, price)
+        order_response = await self.gateway.confirm_order(params)
+        self.set_order(order_response)
+
+    async def cancel_order(self):
+        """
+        This function is cancelling the order using cancelOrder API
+        """
+        # the market is not quoted anymore, so the price shifts are not tracked
+        self.quoted_price = None
+        if not self.order:
+            return
+        order, self.order = self.order, None
+        if self.tracker is not None:
+            self.tracker.forget(order)
+            # the filled or already cancelled order can't be cancelled
+            if not is_open(order):
+                logger.info("The order %s is %s, not cancelling it", order["id"], order["status"])
+                return
+        logger.info("Cancelling the order with id %s", order["id"])
+        response = await self.gateway.cancel_order(order["id"])
+        if not response["success"]:
+            self.__cancel_failed(order, response)
+        elif self.account is not None:
+            self.account.release(remaining(order) * order["price"])
+
+    def __cancel_failed(self, order, response):
+        # the order is still live, it's kept to be cancelled later and followed by the tracker
+        logger.error("Failed to cancel the order %s: %s", order["id"], response["message"])
+        METRICS.increment("orders.cancel_failed")
+        if self.tracker is not None:
+            order = self.tracker.track(order)
+        self.pending_cancels[order["id"]] = order
+
+    async def cancel_pending(self):
+        """
+        This function is retrying the cancellations which failed
+        :return: True if there is no order left to be cancelled
+        """
+        for order_id, order in list(self.pending_cancels.items()):
+            if self.tracker is not None and not is_open(order):
+                # filled or cancelled meanwhile, eg. the cancellation failed because of it
+                logger.info("The order %s is %s, not cancelling it", order_id, order["status"])
+                self.tracker.forget(order)
+                del self.pending_cancels[order_id]
+                continue
+            logger.info("Retrying to cancel the order with id %s", order_id)
+            try:
+                response = await self.gateway.cancel_order(order_id)
+            except Exception as exc:
+                logger.error("Failed to cancel the order %s with exception: %s", order_id, exc)
+                continue
+            if not response["success"]:
+                logger.error("Failed to cancel the order %s: %s", order_id, response["message"])
+                continue
+            del self.pending_cancels[order_id]
+            if self.tracker is not None:
+                self.tracker.forget(order)
+            if self.account is not None:
+                self.account.release(remaining(order) * order["price"])
+        return not self.pending_cancels
+
+    async def replace_order(self, price):
+        """
+        This function is cancelling the current order and posting the new order
+        with the provided price for the same market, both requests are sent together
+        :param price: the price at which the new order would be placed
+        """
+        if self.pending_cancels and not await self.cancel_pending():
+            # the previous orders are still live, the current order is kept as it is
+            logger.warning(
+                "The market %s has orders which can't be cancelled, not replacing the order.",
+                self.market_id,
+            )
+            self.quoted_price = self.order["price"] if self.order else None
+            return
+        order, self.order = self.order, None
+        quantity = self.get_quantity()
+        if order and self.tracker is not None:
+            self.tracker.forget(order)
+            if order.get("status") == FILLED:
+                # the order is completely filled, the market is not quoted anymore
+                logger.info("The order %s is filled, not replacing it", order["id"])
+                self.quoted_price = None
+                return
+            if not is_open(order):
+                # the order is cancelled externally, only the new order is posted
+                logger.info("The order %s is %s, not cancelling it", order["id"], order["status"])
+                order = None
+            elif order.get("filled"):
+                # replacing only the not filled part of the order
+                quantity = remaining(order)
+        # the cancelled order's cost is available for the new order
+        released = remaining(order) * order["price"] if order else 0
+        try:
+            quantity, price = self.validate_order(quantity, price, released)
+        except OrderValidationError:
+            # keeping the current order, so it's cancelled by the caller
+            self.order = order
+            raise
+        logger.debug("Posting the new order with the latest market price.")
+        params = self.get_order_params(quantity, price)
+        if order:
+            logger.info("Cancelling the order with id %s", order["id"])
+        cancel_response, order_response = await self.gateway.cancel_replace(
+            order["id"] if order else None, params
+        )
+        if cancel_response and not cancel_response["success"]:
+            self.__cancel_failed(order, cancel_response)
+        elif cancel_response and self.account is not None:
+            self.account.release(released)
+        self.set_order(order_response)
+
+    def request_replace(self, price):
+        """
+        This function is requesting the order to be replaced with the provided price.
+        At most one replacement is in flight per market, if the replacement is requested
+        again meanwhile, only the latest price is kept and it is placed once the
+        in flight replacement is completed, the prices in between are skipped
+        :param price: the price at which the new order would be placed
+        """
+        self.target_price = self.quoted_price = price
+        self.target_requested_at = time.perf_counter()
+        METRICS.increment("requotes.requested")
+        if self.replace_task is None or self.replace_task.done():
+            self.replace_task = asyncio.create_task(self.__process_replacements())
+
+    async def __process_replacements(self):
+        while self.target_price is not None:
+            price, self.target_price = self.target_price, None
+            requested_at = self.target_requested_at
+            try:
+                await self.replace_order(price)
+                METRICS.observe("latency.requote", time.perf_counter() - requested_at)
+            except Exception as exc:
+                # if any general exception occurs, cancel the order if any posted
+                logger.exception(
+                    "The market %s operation failed with exception: %s", self.market_id, exc
+                )
+                await self.cancel_order()
+
+    async def start(self):
+        """
+        This function is placing the initial order of the market and starts the task
+        which processes the market updates
+        """
+        self.updates = asyncio.Queue()
+        # compute the price on which the order will be placed
+        price = self.compute_price()
+        # get the quantity of the shares for the order
+        quantity = self.get_quantity()
+        # Post the order with the generated quantity and price
+        await self.create_order(quantity, price)
+        self.task = asyncio.create_task(self.__process_updates())
+
+    async def stop(self, cancel=True):
+        """
+        This function is stopping the market updates task and cancels the order if any posted
+        :param cancel: if False, the order is only forgotten by the strategy, it's used when
+                       all the orders are cancelled at once by the caller
+        """
+        if self.task:
+            # dropping the queued updates and letting the task finish the update in process,
+            # cancelling the task in the middle of a request could leave an untracked order
+            while not self.updates.empty():
+                self.updates.get_nowait()
+            self.updates.put_nowait(None)
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+        if self.replace_task:
+            # skipping the pending replacement and waiting for the in flight one
+            self.target_price = None
+            await asyncio.gather(self.replace_task, return_exceptions=True)
+            self.replace_task = None
+        if cancel:
+            await self.cancel_order()
+            if self.pending_cancels and not await self.cancel_pending():
+                logger.error(
+                    "Failed to cancel the orders %s of market %s.",
+                    list(self.pending_cancels),
+                    self.market_id,
+                )
+        else:
+            # the caller cancels all the orders, the ones failed to be cancelled as well
+            self.order = self.quoted_price = None
+            self.pending_cancels.clear()
+
+    async def on_market_update(self, event, market_data):
+        """
+        This function will be called by the dispatcher for every update of the market,
+        the update is queued to be processed by the strategy's task
+        :param event: channel message event, eg. market_updated or market_created
+        :param market_data: market data with only the changed fields
+        """
+        if self.updates is not None:
+            self.updates.put_nowait((event, market_data, time.perf_counter()))
+
+    async def __process_updates(self):
+        while True:
+            update = await self.updates.get()
+            # None is queued by the stop function to finish the task
+            if update is None:
+                break
+            event, market_data, received_at = update
+            try:
+                await self.handle_update(event, market_data)
+                # time from receiving the update till the decision is made on it
+                METRICS.observe("latency.decision", time.perf_counter() - received_at)
+            except Exception as exc:
+                # if any general exception occurs, cancel the order if any posted
+                logger.exception(
+                    "The market %s operation failed with exception: %s", self.market_id, exc
+                )
+                await self.cancel_order()
+
+    async def handle_update(self, event, market_data):
+        """
+        This function checks for the price shift of the market, if the shift is 5% up or down.
+        Cancel the order and post new order with new price.
+        :param event: channel message event, eg. market_updated or market_created
+        :param market_data: market data with only the changed fields
+        """
+        # checking if the server message is for market update
+        if event != MARKET_UPDATED or self.quoted_price is None:
+            return
+        logger.debug("The market %s has been updated.", self.market_id)
+        # market data will only have those fields that are updated
+        market_latest_price = market_data.get("price")
+        # if the market data has price field, it means the market price is shifted
+        if market_latest_price:
+            # comparing with the price of the in flight replacement if there is any,
+            # so the same shift doesn't trigger the replacement again
+            order_price = self.quoted_price
+            logger.debug(
+                "The market price is changed, old price: %s, new price: %s",
+                order_price,
+                market_latest_price,
+            )
+            # get the 5% max and min price cap of the order's price
+            max_shift = order_price + (order_price * 5 / 100)
+            min_shift = order_price - (order_price * 5 / 100)
+            # checking if the latest price is between the price shift cap
+            if max_shift > market_latest_price < min_shift:
+                logger.info("A price shift of 5%% up/down is detected. Replacing the order.")
+                # cancel the order and post the new order with new price for the same market
+                # the replacement runs in the background, so the next updates are not delayed
+                self.request_replace(market_latest_price)
@@ -0,0 +1,173 @@
+import asyncio
+import logging
+import random
+import time
+
+from trading_bot.instrumentation import METRICS
+
+logger = logging.getLogger(__file__)
+
+
+class ChannelSupervisor:
+    """
+    This class is keeping the channel connected, the *_join function of the channel
+    returns as soon as the connection is dropped or fails, the supervisor joins the
+    channel again with the jittered exponential backoff between the attempts.
+
+    The delay before the Nth consecutive attempt is a random value between 0 and
+    min(max_delay, initial_delay * factor ** N), so the many clients dropped by the same
+    server blip don't reconnect all at once. The attempts are counted from the last
+    successful connection, a connection is successful once the server replies to the join.
+
+    The on_reconnect function is called every time the channel is connected again, before
+    any message of the new connection is consumed, so the state missed while the channel
+    was down can be fetched, eg. the marketInfos snapshot for the market_info channel.
+
+    If the channel can't be connected again within max_downtime seconds the supervisor gives up
+    and the run function returns, same as the *_join function does without the supervisor.
+
+    The auth token expires after an hour, if the refresh_auth function is provided the token is
+    refreshed before every attempt, otherwise the channel can't be joined again after a long
+    connection. The supervisors of the same user should share the refresh_auth function,
+    eg. OrderGateway.refresh_auth, so the token is refreshed once at a time.
+    """
+
+    def __init__(
+        self,
+        channel_client,
+        channel_name,
+        on_message,
+        on_reconnect=None,
+        on_close=None,
+        on_error=None,
+        initial_delay=0.5,
+        max_delay=30,
+        factor=2,
+        max_downtime=None,
+        refresh_auth=None,
+        metrics=METRICS,
+    ):
+        """
+        :param channel_client: authenticated StxChannelClient object
+        :param channel_name: name of the channel, eg. market_info
+        :param on_message: consumer of the channel messages
+        :param on_reconnect: optional async function called when the channel is connected again
+        :param on_close: optional consumer called when the connection is closed
+        :param on_error: optional consumer called when the connection fails
+        :param initial_delay: seconds of the maximum delay before the first reconnection
+        :param max_delay: the maximum delay between the attempts can't grow over these seconds
+        :param factor: multiplier of the maximum delay after each failed attempt
+        :param max_downtime: seconds after which the supervisor gives up reconnecting,
+                             by default it never gives up
+        :param refresh_auth: optional async function refreshing the expired auth token,
+                             eg. OrderGateway.refresh_auth
+        :param metrics: Metrics object the reconnection counters are recorded in
+        """
+        self.join = getattr(channel_client, f"{channel_name}_join")
+        self.channel_name = channel_name
+        self.on_message = on_message
+        self.on_reconnect = on_reconnect
+        self.on_close = on_close
+        self.on_error = on_error
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.factor = factor
+        self.max_downtime = max_downtime
+        self.refresh_auth = refresh_auth
+        self.metrics = metrics
+        self.connected = False
+        self.connections = 0
+        self.__attempts = 0
+        self.__stopped = False
+
+    def backoff(self, attempts):
+        """
+        This function is returning the random delay before the next attempt
+        :param attempts: number of the consecutive failed attempts
+        """
+        return random.uniform(0, min(self.max_delay, self.initial_delay * self.factor ** attempts))
+
+    def stop(self):
+        """
+        This function is stopping the reconnections, the run function returns
+        once the current connection is closed
+        """
+        self.__stopped = True
+
+    async def refresh_token(self):
+        """
+        This function is refreshing the expired auth token before the channel is joined
+        """
+        if self.refresh_auth is None:
+            return
+        try:
+            response = await self.refresh_auth()
+        except Exception as exc:
+            logger.exception("Failed to refresh the auth token with exception: %s", exc)
+            return
+        if not response["success"]:
+            logger.error("Failed to refresh the auth token: %s", response["message"])
+
+    async def __on_open(self, response):
+        # the server replies to the join message, so the channel is connected
+        if self.connected:
+            return
+        self.connected = True
+        self.connections += 1
+        self.__attempts = 0
+        logger.info("Channel %s is connected.", self.channel_name)
+        if self.connections > 1:
+            self.metrics.increment(f"reconnects.{self.channel_name}")
+            if self.on_reconnect is not None:
+                try:
+                    await self.on_reconnect()
+                except Exception as exc:
+                    logger.exception(
+                        "Failed to resync the channel %s with exception: %s", self.channel_name, exc
+                    )
+
+    async def __on_close(self, response):
+        self.connected = False
+        if self.on_close is not None:
+            await self.on_close(response)
+
+    async def __on_error(self, response):
+        self.connected = False
+        if self.on_error is not None:
+            await self.on_error(response)
+
+    async def run(self):
+        """
+        This function is joining the channel and joins it again whenever the connection
+        is dropped, until the supervisor is stopped or the max_downtime is exceeded
+        """
+        disconnected_at = None
+        while not self.__stopped:
+            await self.refresh_token()
+            await self.join(
+                on_open=self.__on_open,
+                on_message=self.on_message,
+                on_close=self.__on_close,
+                on_error=self.__on_error,
+            )
+            self.connected = False
+            if self.__stopped:
+                break
+            if self.__attempts == 0:
+                # the connection was up, the downtime starts now
+                disconnected_at = time.monotonic()
+            downtime = time.monotonic() - disconnected_at
+            if self.max_downtime is not None and downtime >= self.max_downtime:
+                logger.error(
+                    "Channel %s is down for %.1f seconds, giving up.", self.channel_name, downtime
+                )
+                break
+            delay = self.backoff(self.__attempts)
+            self.__attempts += 1
+            logger.warning(
+                "Channel %s is disconnected, reconnecting in %.2f seconds (attempt %d).",
+                self.channel_name,
+                delay,
+                self.__attempts,
+            )
+            await asyncio.sleep(delay)
@@ -0,0 +1,152 @@
+import logging
+import os
+import re
+
+import stxsdk.config
+
+from trading_bot.exceptions import OrderValidationError
+from trading_bot.pricing import round_to_rules
+
+logger = logging.getLogger(__file__)
+
+# the schema of the API packaged with the SDK
+SCHEMA_PATH = os.path.join(os.path.dirname(stxsdk.config.__file__), "schema.graphql")
+# the market statuses of the StatusEnum which accept the orders, all the others don't
+OPEN_STATUSES = frozenset(("open", "pre_open"))
+# the StatusEnum values at the time of writing, used if the schema can't be read
+SCHEMA_STATUSES = frozenset(("open", "pre_open", "cancelled", "closed", "resulted", "voided"))
+# the closed status as it's spelled by the market filters of the API
+FILTER_CLOSED_STATUSES = frozenset(("close",))
+
+
+def closed_statuses(schema=None):
+    """
+    This function is returning the statuses of the markets which don't accept the orders,
+    all the values of the schema's StatusEnum except the open ones
+    :param schema: GraphQLSchema object, eg. client.gqlclient.schema, by default the schema
+                   packaged with the SDK is read
+    """
+    if schema is not None:
+        statuses = frozenset(name.lower() for name in schema.type_map["StatusEnum"].values)
+    else:
+        try:
+            with open(SCHEMA_PATH) as file:
+                enum = re.search(r"enum StatusEnum \{(.*?)\}", file.read(), re.S).group(1)
+            # the values are the upper case names, their descriptions are quoted
+            statuses = frozenset(
+                name.lower() for name in re.findall(r"^\s*([A-Z_]+)\s*$", enum, re.M)
+            )
+        except (OSError, AttributeError) as exc:
+            logger.warning("Failed to read the market statuses of the schema: %s", exc)
+            statuses = SCHEMA_STATUSES
+    return statuses - OPEN_STATUSES | FILTER_CLOSED_STATUSES
+
+
+# statuses of the markets which don't accept the orders
+CLOSED_STATUSES = closed_statuses()
+
+
+def to_number(value, field_name):
+    """
+    This function is converting the user provided value, eg. the input() string, to number
+    """
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise OrderValidationError(f"The {field_name} must be a number, got {value!r}.")
+    if not number > 0:
+        raise OrderValidationError(f"The {field_name} must be greater than 0, got {value!r}.")
+    return number
+
+
+class OrderValidator:
+    """
+    This class is checking the order against the cached market and account data before it's
+    sent, so the orders which would be rejected by the server don't cost a round trip, eg.
+
+        validator = OrderValidator(account)
+        quantity, price = validator.validate(market, quantity, price)
+
+    The following orders are rejected with OrderValidationError:
+     - the quantity which is not a positive integer or the price which is not a positive number
+     - the order of a closed market, checkout CLOSED_STATUSES
+     - the order whose cost (price * quantity) is over the available balance of the account
+    and the following prices are snapped to the valid price if snap is True, rejected otherwise:
+     - the fractional price, eg. the market price of the channel, is rounded down to integer
+     - the price over the market's max price is lowered to the max price
+     - the price off the market's orderPriceRules ticks is rounded down to the tick
+
+    The market checks are skipped if the market record or its fields are not available.
+    """
+
+    def __init__(self, account=None, snap=True, closed_statuses=CLOSED_STATUSES):
+        """
+        :param account: optional AccountState object providing the available balance
+        :param snap: whether to snap the invalid prices to the valid ones instead of rejecting
+        :param closed_statuses: statuses of the markets which don't accept the orders
+        """
+        self.account = account
+        self.snap = snap
+        self.closed_statuses = frozenset(status.lower() for status in closed_statuses)
+
+    def __snap(self, price, valid_price, reason):
+        if price == valid_price:
+            return valid_price
+        if not self.snap:
+            raise OrderValidationError(f"The price {price} is {reason}, the valid price is {valid_price}.")
+        logger.debug("The price %s is %s, snapping it to %s.", price, reason, valid_price)
+        return valid_price
+
+    def validate(self, market, quantity, price=None, order_type="LIMIT", released=0):
+        """
+        This function is validating the order
+        :param market: market record having status, maxPrice and orderPriceRules, None if unknown
+        :param quantity: quantity of the shares to be purchased
+        :param price: the price at which the shares would be purchased, None for the market order
+        :param order_type: LIMIT or MARKET, the price is checked for the limit order only
+        :param released: cost of the order cancelled together with this one
+        :return: tuple of the valid quantity and price
+        """
+        number = to_number(quantity, "quantity")
+        if not number.is_integer():
+            raise OrderValidationError(f"The quantity must be an integer, got {quantity!r}.")
+        quantity = int(number)
+        market = market or {}
+        status = market.get("status")
+        if status and status.lower() in self.closed_statuses:
+            raise OrderValidationError(f"The market {market.get('marketId')} is {status}.")
+        if order_type != "LIMIT":
+            return quantity, price
+        number = to_number(price, "price")
+        price = self.__snap(number, int(number), "not an integer")
+        max_price = market.get("maxPrice")
+        if max_price is not None:
+            price = self.__snap(price, min(price, int(max_price)), "over the max price")
+        price_rules = market.get("orderPriceRules")
+        if price_rules:
+            price = self.__snap(price, round_to_rules(price, price_rules), "off the price ticks")
+        if self.account is not None and not self.account.can_afford(quantity * price - released):
+            raise OrderValidationError(
+                f"The order costing {quantity * price} is over "
+                f"the available balance {self.account.available_balance}."
+            )
+        return quantity, price
+
+    def validate_params(self, params, market=None):
+        """
+        This function is validating the params of the confirmOrder API
+        :param params: confirmOrder params having the userOrder
+        :param market: market record of the order, None if unknown
+        :return: params with the valid quantity and price
+        """
+        user_order = dict(params["userOrder"])
+        quantity, price = self.validate(
+            market,
+            user_order.get("quantity"),
+            user_order.get("price"),
+            user_order.get("orderType", "LIMIT"),
+        )
+        user_order["quantity"] = quantity
+        if price is not None:
+            user_order["price"] = price
+        return {**params, "userOrder": user_order}